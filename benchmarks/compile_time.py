@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""Times each compiler stage on generated programs across size sweeps and saves the results."""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import math
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from programs import SHAPE_STAGES, SHAPES, generate
+from src.backend.codegen import write_assembly
+from src.backend.elf import build_elf_object
+from src.backend.encoder import encode_program
+from src.backend.tacky2asm import convert_TACKY_to_assembly
+from src.frontend.lexer import lex
+from src.frontend.parser import parse_program
+from src.middle.tacky import convert_AST_to_TACKY, reset_counters
+from src.semantic.resolver import resolve_program
+
+
+def _tacky(ast: Any) -> Any:
+    reset_counters()
+    return convert_AST_to_TACKY(ast)
+
+
+# (stage, stage whose output it consumes, function). A stage that fails only
+# stops the stages that need its output, as in the driver, where validation
+# does not feed TACKY generation.
+STAGES: List[Tuple[str, str, Callable[[Any], Any]]] = [
+    ("lex", "source", lex),
+    # The parser consumes its token list.
+    ("parse", "lex", lambda tokens: parse_program(list(tokens))),
+    ("validate", "parse", resolve_program),
+    ("tacky", "parse", _tacky),
+    ("codegen", "tacky", convert_TACKY_to_assembly),
+    ("emit", "codegen", lambda asm: write_assembly(asm, io.StringIO())),
+    ("encode", "codegen", lambda asm: build_elf_object(encode_program(asm))),
+]
+_STAGE_NAMES = [name for name, _, _ in STAGES]
+
+_ERROR_NAMES = {RecursionError: "recursion", NotImplementedError: "unsupported"}
+
+# Growth exponents above this between two sizes are reported as superlinear.
+SUPERLINEAR = 1.5
+
+
+def _time_stage(fn: Callable[[Any], Any], value: Any, repeat: int, budget: float) -> Tuple[Any, float]:
+    """Best of `repeat` runs in seconds, or a single run if that one already exceeds `budget`."""
+    best = float("inf")
+    result = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = fn(value)
+        best = min(best, time.perf_counter() - start)
+        if i == 0 and best > budget:
+            break
+    return result, best
+
+
+def measure(
+    source: str, repeat: int, budget: float, supported: Tuple[str, ...] = tuple(_STAGE_NAMES)
+) -> Tuple[Dict[str, Dict[str, Any]], float]:
+    """Per-stage results for one program and the slowest stage's time in seconds.
+
+    Stages outside `supported` are not run and are recorded as unsupported.
+    """
+    outputs: Dict[str, Any] = {"source": source}
+    stages: Dict[str, Dict[str, Any]] = {}
+    slowest = 0.0
+    for name, needs, fn in STAGES:
+        if name not in supported:
+            stages[name] = {"skipped": "unsupported"}
+            continue
+        if needs not in outputs:
+            stages[name] = {"skipped": needs}
+            continue
+        try:
+            outputs[name], seconds = _time_stage(fn, outputs[needs], repeat, budget)
+        except Exception as exc:
+            stages[name] = {"error": _ERROR_NAMES.get(type(exc), type(exc).__name__)}
+            continue
+        stages[name] = {"ms": round(seconds * 1000, 3)}
+        slowest = max(slowest, seconds)
+    stages["lex"]["tokens"] = len(outputs.get("lex", ()))
+    return stages, slowest
+
+
+def _cell(stage: Dict[str, Any]) -> str:
+    if "ms" in stage:
+        return f"{stage['ms']:.2f}"
+    return stage.get("error", "-")
+
+
+def growth(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Growth exponent k of time ~ tokens^k for each stage between consecutive sizes of a shape."""
+    rows = []
+    for shape in dict.fromkeys(r["shape"] for r in results):
+        runs = [r for r in results if r["shape"] == shape]
+        for name in _STAGE_NAMES:
+            for small, large in zip(runs, runs[1:]):
+                a, b = small["stages"].get(name, {}), large["stages"].get(name, {})
+                # Sub-millisecond timings are too noisy to extrapolate from.
+                if a.get("ms", 0) < 1 or "ms" not in b or large["tokens"] <= small["tokens"]:
+                    continue
+                exponent = math.log(b["ms"] / a["ms"]) / math.log(large["tokens"] / small["tokens"])
+                rows.append(
+                    {
+                        "shape": shape,
+                        "stage": name,
+                        "from": small["size"],
+                        "to": large["size"],
+                        "exponent": round(exponent, 2),
+                    }
+                )
+    return rows
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Stages at least `threshold` slower than in `baseline`, or failing where they used to run."""
+    old = {(r["shape"], r["size"]): r["stages"] for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        before = old.get((r["shape"], r["size"]))
+        if before is None:
+            continue
+        for name, now in r["stages"].items():
+            was = before.get(name, {})
+            label = f"{r['shape']}/{r['size']}/{name}"
+            if "ms" in was and "ms" not in now:
+                regressions.append(f"{label}: {_cell(now)} (was {was['ms']:.2f} ms)")
+            elif "ms" in was and "ms" in now and was["ms"] >= 1 and now["ms"] > was["ms"] * (1 + threshold):
+                regressions.append(f"{label}: {now['ms']:.2f} ms (was {was['ms']:.2f} ms, x{now['ms'] / was['ms']:.2f})")
+    return regressions
+
+
+def _git_revision() -> str | None:
+    try:
+        run = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return run.stdout.strip()
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--shapes", nargs="+", choices=list(SHAPES), default=list(SHAPES))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 300, 1_000, 3_000, 10_000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=5.0,
+        help="seconds; once a stage takes longer, larger sizes of that shape are skipped",
+    )
+    parser.add_argument("--recursion-limit", type=int, default=sys.getrecursionlimit())
+    parser.add_argument("-o", "--output", help="results file (default benchmarks/results/compile-time-<time>.json)")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="slowdown reported as a regression")
+    args = parser.parse_args(argv)
+    sys.setrecursionlimit(args.recursion_limit)
+
+    results: List[Dict[str, Any]] = []
+    print(f"{'shape':<15}{'size':>8}{'tokens':>9}" + "".join(f"{name:>12}" for name in _STAGE_NAMES) + "   (ms)")
+    for shape in args.shapes:
+        for size in sorted(args.sizes):
+            source = generate(shape, size, args.seed)
+            supported = SHAPE_STAGES.get(shape, tuple(_STAGE_NAMES))
+            stages, slowest = measure(source, args.repeat, args.budget, supported)
+            tokens = stages["lex"].pop("tokens")
+            results.append(
+                {
+                    "shape": shape,
+                    "size": size,
+                    "bytes": len(source),
+                    "tokens": tokens,
+                    "supported_stages": list(supported),
+                    "stages": stages,
+                }
+            )
+            print(f"{shape:<15}{size:>8}{tokens:>9}" + "".join(f"{_cell(stages[name]):>12}" for name in _STAGE_NAMES))
+            if slowest > args.budget:
+                print(f"{'':<15}larger sizes skipped: a stage took {slowest:.1f}s")
+                break
+
+    rows = growth(results)
+    superlinear = [row for row in rows if row["exponent"] > SUPERLINEAR]
+    if superlinear:
+        print(f"\nsuperlinear stages (time ~ tokens^k, k > {SUPERLINEAR}):")
+        for row in superlinear:
+            print(f"  {row['shape']:<15}{row['stage']:<10}{row['from']:>7} -> {row['to']:<7} k = {row['exponent']:.2f}")
+
+    if args.output:
+        output = Path(args.output)
+    else:
+        output = PROJECT_ROOT / "benchmarks" / "results" / time.strftime("compile-time-%Y%m%d-%H%M%S.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    report = {
+        "meta": {
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "recursion_limit": args.recursion_limit,
+        },
+        "results": results,
+        "growth": rows,
+    }
+    output.write_text(json.dumps(report, indent=1) + "\n")
+    print(f"\nresults saved to {output}")
+
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.threshold)
+        print(f"{len(regressions)} regression(s) against {args.baseline}")
+        for line in regressions:
+            print(f"  {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
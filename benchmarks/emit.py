@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Times assembly emission for functions with 10^5 to 10^6 instructions."""
+
+from __future__ import annotations
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.backend.assembly_ir import *
+from src.backend.codegen import emit_assembly, write_assembly
+
+
+def _function(size: int) -> AssemblyProgram:
+    """A function whose instruction mix matches what tacky2asm produces for expressions."""
+    ax, r10, r11 = AssemblyRegister.AX, AssemblyRegister.R10, AssemblyRegister.R11
+    pattern: List[Any] = []
+    for i in range(8):
+        slot = AssemblyStack(-4 * (i + 1))
+        pattern += [
+            AssemblyMov(AssemblyImmediate(i), slot),
+            AssemblyMov(slot, r10),
+            AssemblyBinaryOp(list(AssemblyBinaryOpType)[i], AssemblyImmediate(i + 1), r10),
+            AssemblyCompare(AssemblyImmediate(0), slot),
+            AssemblyJumpConditionCode(list(AssemblyConditionCode)[i % 6], f"and_false{i}"),
+            AssemblySetConditionCode(AssemblyConditionCode.NE, slot),
+            AssemblyUnary(AssemblyUnaryOpType.NEGATION, slot),
+            AssemblyMov(slot, ax),
+            AssemblyCdq(),
+            AssemblyIDiv(r11),
+            AssemblyJump(f"end{i}"),
+            AssemblyLabel(f"end{i}"),
+        ]
+    instructions = [AssemblyAllocateStack(-32)]
+    while len(instructions) < size - 1:
+        instructions.extend(pattern[: size - 1 - len(instructions)])
+    instructions.append(AssemblyRet())
+    return AssemblyProgram(AssemblyFunction("main", instructions, OffsetAllocator()))
+
+
+def _best_ms(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 300_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    fd, path = tempfile.mkstemp(suffix=".s")
+    os.close(fd)
+
+    def to_file(program: AssemblyProgram) -> None:
+        with open(path, "w") as out:
+            write_assembly(program, out)
+
+    def lines_to_file(program: AssemblyProgram) -> None:
+        # How the driver used to write assembly: a list of lines, written one by one.
+        with open(path, "w") as out:
+            for line in emit_assembly(program):
+                out.write(line + "\n")
+
+    print(f"{'instrs':>9}{'stream ms':>11}{'file ms':>10}{'lines ms':>10}{'Minstr/s':>10}{'MB':>7}")
+    try:
+        for size in args.sizes:
+            program = _function(size)
+            file_ms = _best_ms(lambda: to_file(program), args.repeat)
+            print(
+                f"{size:>9}"
+                f"{_best_ms(lambda: write_assembly(program, io.StringIO()), args.repeat):>11.1f}"
+                f"{file_ms:>10.1f}"
+                f"{_best_ms(lambda: lines_to_file(program), args.repeat):>10.1f}"
+                f"{size / file_ms / 1000:>10.2f}"
+                f"{os.path.getsize(path) / 1e6:>7.1f}"
+            )
+    finally:
+        os.unlink(path)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
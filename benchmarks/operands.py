@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Measures allocations in the backend passes and how many operand objects they share."""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.backend.assembly_ir import AssemblyImmediate, AssemblyPseudoRegister, AssemblyStack
+from src.backend.tacky2asm import convert_TACKY_to_assembly
+from src.frontend.ast_ir import *
+from src.middle.tacky import convert_AST_to_TACKY, reset_counters
+
+_OPERAND_TYPES = (AssemblyStack, AssemblyImmediate, AssemblyPseudoRegister)
+
+
+def _program(terms: int) -> Program:
+    """A long expression over a few dozen distinct constants, like unrolled arithmetic."""
+    ops = [BinaryOpType.ADD, BinaryOpType.MULTIPLY, BinaryOpType.LESS_THAN, BinaryOpType.LOGICAL_AND]
+    expr: Any = Constant(1)
+    for i in range(terms):
+        operand: Any = Constant(i % 32)
+        if i % 5 == 0:
+            operand = UnaryOp(UnaryOpType.NOT, operand)
+        expr = BinaryOp(ops[i % len(ops)], expr, operand)
+    return Program(Function(Identifier("main"), [Return(expr)]))
+
+
+def _operand_counts(asm_ir: Any) -> tuple[int, int]:
+    references = Counter()
+    for instruction in asm_ir.function_definition.instructions:
+        for field in instruction:
+            if isinstance(field, _OPERAND_TYPES):
+                references[id(field)] += 1
+    return sum(references.values()), len(references)
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--terms", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args(argv)
+
+    print(f"{'terms':>8}{'instrs':>9}{'traced ms':>11}{'peak KiB':>10}{'blocks':>10}{'operand refs':>14}{'objects':>9}")
+    for terms in args.terms:
+        reset_counters()
+        tacky = convert_AST_to_TACKY(_program(terms))
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        asm_ir = convert_TACKY_to_assembly(tacky)
+        elapsed = time.perf_counter() - start
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        blocks = sum(stat.count for stat in snapshot.statistics("filename"))
+        refs, objects = _operand_counts(asm_ir)
+        print(
+            f"{terms:>8}{len(asm_ir.function_definition.instructions):>9}{elapsed * 1000:>11.1f}"
+            f"{peak / 1024:>10.0f}{blocks:>10}{refs:>14}{objects:>9}"
+        )
+        del asm_ir, snapshot
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""Generates valid C programs of a chosen shape and size for the compile-time benchmarks."""
+
+from __future__ import annotations
+
+import argparse
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+# Every program is a single `int main(void)` in the subset the frontend parses:
+# int declarations, a return statement, and the unary, binary and logical
+# operators. Values stay far inside the int range and divisors and shift counts
+# are nonzero constants, so the programs have no undefined behavior and gcc can
+# serve as a reference for them. `size` counts the unit each shape scales:
+# operators, nesting levels, declarations or comparisons.
+
+_COMPARISONS = ("<", "<=", ">", ">=", "==", "!=")
+_BITWISE = ("&", "|", "^")
+
+
+def _constant(rng: random.Random) -> str:
+    return str(rng.randrange(100))
+
+
+def _term(rng: random.Random) -> str:
+    """A small self-contained operand, at most 99 << 3 in magnitude."""
+    kind = rng.randrange(8)
+    a, b = _constant(rng), _constant(rng)
+    if kind == 0:
+        return f"({a} {rng.choice(_COMPARISONS)} {b})"
+    if kind == 1:
+        return f"({a} {rng.choice(_BITWISE)} {b})"
+    if kind == 2:
+        return f"({rng.randrange(10)} * {rng.randrange(10)})"
+    if kind == 3:
+        return f"({a} {rng.choice('/%')} {rng.randrange(1, 10)})"
+    if kind == 4:
+        return f"({rng.randrange(100)} << {rng.randrange(4)})"
+    if kind == 5:
+        return f"{rng.choice('-~!')}{a}"
+    return a
+
+
+def _wide(rng: random.Random, size: int) -> List[str]:
+    """One flat expression with `size` additive operators between small terms."""
+    parts = [_term(rng)]
+    for _ in range(size):
+        parts.append(rng.choice("+-"))
+        parts.append(_term(rng))
+    return [f"return {' '.join(parts)};"]
+
+
+def _deep(rng: random.Random, size: int) -> List[str]:
+    """An expression nested `size` levels deep, each level wrapping the one inside it."""
+    # Built as matching lists of openers and closers so generation stays linear.
+    opens: List[str] = []
+    closes: List[str] = []
+    for _ in range(size):
+        kind = rng.randrange(5)
+        if kind == 0:
+            opens.append(f"{rng.choice('-~!')}(")
+            closes.append(")")
+        elif kind == 1:
+            opens.append("(")
+            closes.append(f" {rng.choice('/%')} {rng.randrange(1, 10)})")
+        elif kind == 2:
+            opens.append(f"({_constant(rng)} {rng.choice('+-')} ")
+            closes.append(")")
+        else:
+            opens.append("(")
+            closes.append(f" {rng.choice('+-&|^')} {_constant(rng)})")
+    return [f"return {''.join(reversed(opens))}{_constant(rng)}{''.join(closes)};"]
+
+
+def _declarations(rng: random.Random, size: int) -> List[str]:
+    """`size` declarations, most of them initialized from earlier variables.
+
+    TACKY generation does not lower declarations yet, so the compiler only lexes
+    and parses these programs; see SHAPE_STAGES.
+    """
+    lines: List[str] = []
+    readable: List[str] = []
+    for i in range(size):
+        name = f"v{i}"
+        if rng.randrange(8) == 0:
+            # Never read, so never read uninitialized.
+            lines.append(f"int {name};")
+            continue
+        if not readable:
+            init = _term(rng)
+        else:
+            a, b = rng.choice(readable), rng.choice(readable)
+            init = rng.choice(
+                (
+                    f"{a} % 97 + {_constant(rng)}",
+                    f"({a} ^ {b}) & 255",
+                    f"{a} {rng.choice(_COMPARISONS)} {b}",
+                    f"{a} / {rng.randrange(1, 10)} - {b} % 31",
+                    f"!{a} || {b} > {_constant(rng)}",
+                )
+            )
+        lines.append(f"int {name} = {init};")
+        readable.append(name)
+    result = " + ".join(rng.sample(readable, min(4, len(readable)))) if readable else "0"
+    lines.append(f"return {result};")
+    return lines
+
+
+def _comparison(rng: random.Random) -> str:
+    if rng.randrange(6) == 0:
+        return _term(rng)
+    return f"{_term(rng)} {rng.choice(_COMPARISONS)} {_term(rng)}"
+
+
+def _short_circuit(rng: random.Random, size: int) -> List[str]:
+    """`size` comparisons joined by && and ||, in groups of up to four."""
+    groups: List[str] = []
+    remaining = size
+    while remaining > 0:
+        count = min(remaining, rng.randrange(1, 5))
+        remaining -= count
+        group = " && ".join(_comparison(rng) for _ in range(count))
+        if count > 1:
+            group = f"{'!' if rng.randrange(4) == 0 else ''}({group})"
+        groups.append(group)
+    return [f"return {' || '.join(groups) if groups else '0'};"]
+
+
+SHAPES: Dict[str, Callable[[random.Random, int], List[str]]] = {
+    "wide": _wide,
+    "deep": _deep,
+    "declarations": _declarations,
+    "short_circuit": _short_circuit,
+}
+
+# The compiler stages (see compile_time.STAGES) that can run on programs of a
+# shape, for the shapes that cannot go through all of them.
+SHAPE_STAGES: Dict[str, Tuple[str, ...]] = {
+    "declarations": ("lex", "parse"),
+}
+
+
+def supports(shape: str, stage: str) -> bool:
+    """Whether the compiler can run `stage` on programs of `shape`."""
+    stages = SHAPE_STAGES.get(shape)
+    return stages is None or stage in stages
+
+
+def generate(shape: str, size: int, seed: int = 0) -> str:
+    """C source for a `shape` program of `size` units. The same arguments always give the same text."""
+    try:
+        body = SHAPES[shape]
+    except KeyError:
+        raise ValueError(f"Unknown shape '{shape}' (expected one of {', '.join(SHAPES)})") from None
+    # Seeding with the shape too keeps the shapes independent of each other.
+    rng = random.Random(f"{shape}:{size}:{seed}")
+    lines = body(rng, size)
+    return "int main(void) {\n" + "".join(f"    {line}\n" for line in lines) + "}\n"
+
+
+def check_with_gcc(source: str) -> int:
+    """Builds `source` with UBSan and runs it; returns main's exit status."""
+    gcc = shutil.which("gcc")
+    if gcc is None:
+        raise RuntimeError("gcc is required for --check")
+    with tempfile.TemporaryDirectory() as tmp:
+        exe = Path(tmp) / "prog"
+        subprocess.run(
+            [gcc, "-std=c99", "-fsanitize=undefined", "-fno-sanitize-recover=all", "-x", "c", "-", "-o", str(exe)],
+            input=source,
+            text=True,
+            check=True,
+        )
+        run = subprocess.run([str(exe)], stderr=subprocess.PIPE, text=True)
+        if run.stderr:
+            raise RuntimeError(run.stderr.strip())
+        return run.returncode
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("shape", choices=list(SHAPES))
+    parser.add_argument("size", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write the program here instead of stdout")
+    parser.add_argument("--check", action="store_true", help="build and run the program with gcc -fsanitize=undefined")
+    args = parser.parse_args(argv)
+
+    source = generate(args.shape, args.size, args.seed)
+    if args.output:
+        Path(args.output).write_text(source)
+    else:
+        sys.stdout.write(source)
+    if args.check:
+        print(f"gcc: main returned {check_with_gcc(source)}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
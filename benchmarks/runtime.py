@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""Compares the run time of code generated by mycc with gcc -O0 and gcc -O2 on the same kernels."""
+
+from __future__ import annotations
+
+import argparse
+import ctypes
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+MYCC = PROJECT_ROOT / "src" / "mycc"
+
+from programs import generate, supports
+
+# The supported subset has no loops or calls, so a kernel is one long
+# straight-line main(), and a single run of a kernel executable would mostly
+# time process startup. Every build is instead linked as a shared library whose
+# main() is called in-process through ctypes, many times per sample. The cost
+# of the call itself is measured on an empty main() and subtracted.
+#
+# Kernels only contain constants, so gcc folds most of them to a single mov
+# even at -O0, and gcc -O2 folds all of them. A reference build whose main() is
+# no longer than the empty one's takes nothing but the call overhead, so no
+# ratio is given against it. The declarations kernel is the one gcc -O0
+# computes at run time, but mycc cannot compile it until TACKY generation lowers
+# declarations (see programs.SHAPE_STAGES), so only the gcc builds run it.
+
+
+class Kernel(NamedTuple):
+    shape: str
+    size: int
+
+
+KERNELS: Dict[str, Kernel] = {
+    "wide": Kernel("wide", 4_000),
+    "deep": Kernel("deep", 250),
+    "short_circuit": Kernel("short_circuit", 2_000),
+    "declarations": Kernel("declarations", 1_000),
+}
+
+_EMPTY_KERNEL = "int main(void) {\n    return 0;\n}\n"
+
+
+class Config(NamedTuple):
+    compiler: str  # "mycc" or "gcc"
+    flags: Tuple[str, ...]
+
+
+# mycc accepts the book's optimization flags; until the passes exist they do not
+# change the output, but they are benchmarked so that they show up once they do.
+CONFIGS: Dict[str, Config] = {
+    "mycc": Config("mycc", ()),
+    "mycc-opt": Config(
+        "mycc", ("--fold-constants", "--propagate-copies", "--eliminate-unreachable-code", "--eliminate-dead-stores")
+    ),
+    "mycc-eval": Config("mycc", ("--evaluate",)),
+    "gcc-O0": Config("gcc", ("-O0",)),
+    "gcc-O2": Config("gcc", ("-O2",)),
+}
+REFERENCE = "gcc-O2"
+
+
+class BuildError(Exception):
+    pass
+
+
+def build(config: Config, source: Path, workdir: Path) -> Path:
+    """Builds `source` as a shared library with `config` and returns its path."""
+    library = workdir / f"{source.stem}.so"
+    if config.compiler == "mycc":
+        assembly = workdir / f"{source.stem}.s"
+        run = subprocess.run(
+            [sys.executable, str(MYCC), "-S", *config.flags, str(source)], capture_output=True, text=True
+        )
+        if run.returncode != 0:
+            last = (run.stderr.strip().splitlines() or ["mycc failed"])[-1]
+            raise BuildError(last)
+        # mycc writes the assembly next to its input.
+        shutil.move(str(source.with_suffix(".s")), assembly)
+        inputs = [str(assembly)]
+    else:
+        inputs = [*config.flags, str(source)]
+    run = subprocess.run(["gcc", "-shared", "-fPIC", *inputs, "-o", str(library)], capture_output=True, text=True)
+    if run.returncode != 0:
+        raise BuildError(run.stderr.strip())
+    return library
+
+
+def time_calls(library: Path, runs: int, min_sample: float) -> Tuple[int, float]:
+    """main()'s return value and the median time of one call in nanoseconds."""
+    main = ctypes.CDLL(str(library)).main
+    main.restype = ctypes.c_int
+    main.argtypes = []
+    value = main()
+
+    # Calls per sample, grown until one sample takes at least `min_sample` seconds.
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            main()
+        if time.perf_counter() - start >= min_sample:
+            break
+        calls *= 2
+
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter_ns()
+        for _ in range(calls):
+            main()
+        samples.append((time.perf_counter_ns() - start) / calls)
+    return value, statistics.median(samples)
+
+
+def static_instructions(library: Path) -> int | None:
+    """Number of instructions in main(), from objdump."""
+    objdump = shutil.which("objdump")
+    if objdump is None:
+        return None
+    run = subprocess.run(
+        [objdump, "-d", "--no-show-raw-insn", "--disassemble=main", str(library)], capture_output=True, text=True
+    )
+    if run.returncode != 0:
+        return None
+    # Instruction lines look like "  1139:\tmov    %edi,%eax".
+    return sum(1 for line in run.stdout.splitlines() if line.startswith(" ") and ":\t" in line)
+
+
+def retired_instructions(library: Path, workdir: Path, runs: int) -> int | None:
+    """User-space instructions retired by one run of an executable built from `library`, if perf is available."""
+    perf = shutil.which("perf")
+    if perf is None:
+        return None
+    exe = workdir / f"{library.stem}.exe"
+    if subprocess.run(["gcc", "-o", str(exe), f"-Wl,-rpath,{workdir}", str(library)], capture_output=True).returncode:
+        return None
+    counts = []
+    for _ in range(runs):
+        run = subprocess.run(
+            [perf, "stat", "-x", ",", "-e", "instructions:u", str(exe)], capture_output=True, text=True
+        )
+        fields = (run.stderr.strip().splitlines() or [""])[-1].split(",")
+        if not fields[0].isdigit():
+            return None
+        counts.append(int(fields[0]))
+    return int(statistics.median(counts))
+
+
+def measure(config: Config, shape: str, source: Path, workdir: Path, args: argparse.Namespace) -> Dict[str, Any]:
+    if config.compiler == "mycc" and not supports(shape, "emit"):
+        return {"skipped": "unsupported"}
+    try:
+        library = build(config, source, workdir)
+    except BuildError as exc:
+        return {"error": str(exc)}
+    value, ns = time_calls(library, args.runs, args.min_sample)
+    return {
+        "value": value,
+        "ns": round(ns, 2),
+        "instructions": static_instructions(library),
+        "retired": retired_instructions(library, workdir, 5) if args.perf else None,
+    }
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--kernels", nargs="+", choices=list(KERNELS), default=list(KERNELS))
+    parser.add_argument("--configs", nargs="+", choices=list(CONFIGS), default=list(CONFIGS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--runs", type=int, default=21, help="timed samples per build")
+    parser.add_argument("--min-sample", type=float, default=0.005, help="seconds each sample runs for at least")
+    parser.add_argument("--perf", action="store_true", help="also count retired instructions with perf stat")
+    parser.add_argument("-o", "--output", help="results file (default benchmarks/results/runtime-<time>.json)")
+    args = parser.parse_args(argv)
+
+    if shutil.which("gcc") is None:
+        print("gcc is required to link the kernels", file=sys.stderr)
+        return 1
+
+    results: List[Dict[str, Any]] = []
+    mismatches = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        # The cost of calling through ctypes, subtracted from every kernel's time.
+        (workdir / "empty.c").write_text(_EMPTY_KERNEL)
+        empty = build(CONFIGS[REFERENCE], workdir / "empty.c", workdir)
+        _, overhead = time_calls(empty, args.runs, args.min_sample)
+        empty_instructions = static_instructions(empty)
+        print(f"call overhead: {overhead:.1f} ns (subtracted)\n")
+        print(
+            f"{'kernel':<15}{'config':<10}{'median ns':>12}{f'vs {REFERENCE}':>12}{'instrs':>9}"
+            + (f"{'retired':>10}" if args.perf else "")
+        )
+
+        for name in args.kernels:
+            kernel = KERNELS[name]
+            kernel_dir = workdir / name
+            kernel_dir.mkdir()
+            rows: Dict[str, Dict[str, Any]] = {}
+            for config_name in dict.fromkeys([REFERENCE, *args.configs]):
+                config_dir = kernel_dir / config_name
+                config_dir.mkdir()
+                source = config_dir / f"{name}.c"
+                source.write_text(generate(kernel.shape, kernel.size, args.seed))
+                rows[config_name] = measure(CONFIGS[config_name], kernel.shape, source, config_dir, args)
+                if "ns" in rows[config_name]:
+                    rows[config_name]["ns"] = round(max(0.0, rows[config_name]["ns"] - overhead), 2)
+
+            reference = rows[REFERENCE]
+            if empty_instructions is not None and reference.get("instructions") is not None:
+                timed = reference["instructions"] > empty_instructions
+            else:
+                # Below a nanosecond the reference is within the noise of the call overhead.
+                timed = reference.get("ns", 0) >= 1
+            for config_name in args.configs:
+                row = rows[config_name]
+                results.append({"kernel": name, "config": config_name, **row})
+                if "error" in row:
+                    print(f"{name:<15}{config_name:<10}  {row['error'][:60]}")
+                    continue
+                if "skipped" in row:
+                    print(f"{name:<15}{config_name:<10}  skipped: {row['skipped']}")
+                    continue
+                ratio = f"x{row['ns'] / reference['ns']:.1f}" if timed and reference["ns"] > 0 else "-"
+                mark = ""
+                if row["value"] != reference.get("value"):
+                    mismatches += 1
+                    mark = f"  returned {row['value']}, {REFERENCE} returned {reference.get('value')}"
+                print(
+                    f"{name:<15}{config_name:<10}{row['ns']:>12.1f}{ratio:>12}"
+                    f"{row['instructions'] if row['instructions'] is not None else '-':>9}"
+                    + (f"{row['retired'] if row['retired'] is not None else '-':>10}" if args.perf else "")
+                    + mark
+                )
+
+    if args.output:
+        output = Path(args.output)
+    else:
+        output = PROJECT_ROOT / "benchmarks" / "results" / time.strftime("runtime-%Y%m%d-%H%M%S.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "runs": args.runs,
+            "call_overhead_ns": round(overhead, 2),
+            "kernels": {name: KERNELS[name]._asdict() for name in args.kernels},
+            "configs": {name: CONFIGS[name]._asdict() for name in args.configs},
+        },
+        "results": results,
+    }
+    output.write_text(json.dumps(report, indent=1) + "\n")
+    print(f"\nresults saved to {output}")
+    if mismatches:
+        print(f"{mismatches} build(s) returned a different value than {REFERENCE}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
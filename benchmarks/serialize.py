@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Compares the binary IR format with pickle and with re-running the stages that produce each IR."""
+
+from __future__ import annotations
+
+import argparse
+import pickle
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.backend.tacky2asm import convert_TACKY_to_assembly
+from src.frontend.lexer import lex
+from src.frontend.parser import parse_program
+from src.middle.tacky import convert_AST_to_TACKY
+from src.utils.serialize import dumps, loads
+
+
+def _program(terms: int) -> str:
+    expr = "1"
+    for i in range(terms):
+        op = "+-*&|^"[i % 6]
+        expr = f"({expr} {op} ({i % 97} && {i % 13} || {i % 7} < {i % 5}))"
+    return f"int main(void) {{\n    return {expr};\n}}\n"
+
+
+def _best_ms(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--terms", type=int, default=400, help="binary operators in the generated expression")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    source = _program(args.terms)
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20 * args.terms))
+
+    stages = {
+        "tokens": lambda: lex(source),
+        "ast": lambda: parse_program(lex(source)),
+        "tacky": lambda: convert_AST_to_TACKY(parse_program(lex(source))),
+        "asm": lambda: convert_TACKY_to_assembly(convert_AST_to_TACKY(parse_program(lex(source)))),
+    }
+
+    print(f"{'IR':<8}{'binary B':>10}{'pickle B':>10}{'loads ms':>10}{'pickle ms':>10}{'stages ms':>10}")
+    for name, produce in stages.items():
+        ir = produce()
+        binary = dumps(ir)
+        pickled = pickle.dumps(ir, protocol=pickle.HIGHEST_PROTOCOL)
+        if loads(binary) != ir:
+            print(f"FAIL: {name} does not round-trip", file=sys.stderr)
+            return 1
+        print(
+            f"{name:<8}{len(binary):>10}{len(pickled):>10}"
+            f"{_best_ms(lambda: loads(binary), args.repeat):>10.2f}"
+            f"{_best_ms(lambda: pickle.loads(pickled), args.repeat):>10.2f}"
+            f"{_best_ms(produce, args.repeat):>10.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
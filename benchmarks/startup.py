@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Cold-start regression benchmark for `mycc --lex` on a trivial file.
+
+Startup is measured relative to a bare `python -c pass` so the budget holds on
+slow and fast machines alike. Exits non-zero when the budget is exceeded or
+when --lex imports modules from a later stage.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+MYCC = PROJECT_ROOT / "src" / "mycc"
+
+TRIVIAL_PROGRAM = "int main(void) {\n    return 2;\n}\n"
+
+# Nothing past the lexer may be imported for --lex.
+ALLOWED_SRC_MODULES = {
+    "src",
+    "src.frontend",
+    "src.frontend.lexer",
+    "src.frontend.tokens",
+    # Pass-timing hooks; a no-op unless --time-passes/--mem-report is given.
+    "src.utils",
+    "src.utils.instrument",
+}
+
+
+def _time_command(cmd: list[str], runs: int) -> float:
+    env = {k: v for k, v in os.environ.items() if k != "MYCC_SERVER"}
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, env=env)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def _imported_src_modules(source: Path) -> set[str]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", str(MYCC), "--lex", str(source)],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    names = set()
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            name = line.rsplit("|", 1)[1].strip()
+            if name == "src" or name.startswith("src."):
+                names.add(name)
+    return names
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=40.0,
+        help="allowed median startup on top of the bare interpreter (default: 40)",
+    )
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "trivial.c"
+        source.write_text(TRIVIAL_PROGRAM)
+
+        baseline = _time_command([sys.executable, "-c", "pass"], args.runs)
+        mycc = _time_command([sys.executable, str(MYCC), "--lex", str(source)], args.runs)
+        unexpected = _imported_src_modules(source) - ALLOWED_SRC_MODULES
+
+    overhead_ms = (mycc - baseline) * 1000
+    print(f"python -c pass:  {baseline * 1000:7.1f} ms (median of {args.runs})")
+    print(f"mycc --lex:      {mycc * 1000:7.1f} ms (median of {args.runs})")
+    print(f"mycc overhead:   {overhead_ms:7.1f} ms (budget {args.budget_ms:.1f} ms)")
+
+    failed = False
+    if overhead_ms > args.budget_ms:
+        print("FAIL: mycc --lex startup exceeds its budget", file=sys.stderr)
+        failed = True
+    if unexpected:
+        print(f"FAIL: --lex imported later stages: {', '.join(sorted(unexpected))}", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
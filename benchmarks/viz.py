@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Times --viz svg, --viz html and --viz dot on ASTs of 10^4 to 10^6 nodes."""
+
+from __future__ import annotations
+
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from programs import generate
+
+from src.frontend.ast_ir import *
+from src.frontend.lexer import lex
+from src.frontend.parser import parse_program
+from src.utils.viz import _build_tree, _Drawing, write_dot, write_html, write_svg
+from src.utils.walker import preorder
+
+# The wide shape is a generated program: one long sum of small terms, which the
+# parser turns into a left-leaning tree about a fifth as deep as it is large.
+# The deep shape is built directly, since the parser recurses on nesting: every
+# node but the last holds the next one, like the unary chains in
+# benchmarks/walker.py. Sizes are in boxes drawn, one per AST node and list.
+
+
+def _wide(nodes: int, seed: int) -> Any:
+    # Nodes per unit of size, measured on a smaller program.
+    sample = parse_program(lex(generate("wide", 1_000, seed)))
+    per_unit = sum(1 for _ in preorder(sample)) / 1_000
+    return parse_program(lex(generate("wide", max(1, round(nodes / per_unit)), seed)))
+
+
+def _deep(nodes: int, seed: int) -> Any:
+    expr: Any = Constant(seed)
+    # Program, Function, its body list and Return hold the expression.
+    for i in range(nodes - 5):
+        expr = UnaryOp(UnaryOpType.NEGATION if i % 2 else UnaryOpType.COMPLEMENT, expr)
+    return Program(Function(Identifier("main"), [Return(expr)]))
+
+
+SHAPES = {"wide": _wide, "deep": _deep}
+
+
+def _timed(fn: Callable[[], Any]) -> tuple[Any, float]:
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def _peak_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20 if sys.platform == "darwin" else 1 << 10)
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--shapes", nargs="+", choices=list(SHAPES), default=["wide"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    print(
+        f"{'shape':<7}{'boxes':>9}{'build ms':>10}{'layout ms':>11}{'svg ms':>9}{'svg MB':>8}"
+        f"{'html ms':>9}{'html MB':>9}{'dot ms':>9}{'peak MB':>9}"
+    )
+    try:
+        # Peak memory only grows, so smaller trees go first.
+        for size in sorted(args.sizes):
+            for shape in args.shapes:
+                ast = SHAPES[shape](size, args.seed)
+                tree, build_ms = _timed(lambda: _build_tree(ast))
+                _, layout_ms = _timed(lambda: _Drawing(tree))
+                del tree
+                with open(path, "w", encoding="utf-8") as out:
+                    _, svg_ms = _timed(lambda: write_svg(ast, out))
+                svg_mb = os.path.getsize(path) / 1e6
+                with open(path, "w", encoding="utf-8") as out:
+                    _, html_ms = _timed(lambda: write_html(ast, out))
+                html_mb = os.path.getsize(path) / 1e6
+                with open(path, "w", encoding="utf-8") as out:
+                    _, dot_ms = _timed(lambda: write_dot(ast, out))
+                boxes = sum(1 for _ in preorder(ast))
+                print(
+                    f"{shape:<7}{boxes:>9}{build_ms:>10.0f}{layout_ms:>11.0f}{svg_ms:>9.0f}{svg_mb:>8.1f}"
+                    f"{html_ms:>9.0f}{html_mb:>9.1f}{dot_ms:>9.0f}{_peak_mb():>9.0f}"
+                )
+    finally:
+        os.unlink(path)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
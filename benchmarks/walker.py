@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Times the passes built on src.utils.walker and checks how deep a tree they survive."""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.frontend.ast_ir import *
+from src.middle.tacky import convert_AST_to_TACKY, reset_counters
+from src.semantic.resolver import VariableMap, _resolve_expression
+from src.utils.pretty import pretty_print_tree
+from src.utils.viz import ast_to_dot, ast_to_svg
+from src.utils.walker import preorder
+
+
+def _chain(depth: int) -> Any:
+    """((1 + 1) + -1) + ... nested `depth` operators deep."""
+    expr: Any = Constant(1)
+    for i in range(depth):
+        if i % 2:
+            expr = UnaryOp(UnaryOpType.NEGATION, expr)
+        else:
+            expr = BinaryOp(BinaryOpType.ADD if i % 3 else BinaryOpType.LOGICAL_OR, expr, Constant(i))
+    return expr
+
+
+def _assignments(depth: int) -> Any:
+    """a = a = ... = 1, `depth` assignments deep."""
+    expr: Any = Constant(1)
+    for _ in range(depth):
+        expr = Assignment(Variable(Identifier("a")), expr)
+    return expr
+
+
+def _balanced(levels: int) -> Any:
+    if levels == 0:
+        return Constant(levels)
+    child = _balanced(levels - 1)
+    return BinaryOp(BinaryOpType.LOGICAL_AND if levels % 3 == 0 else BinaryOpType.ADD, child, UnaryOp(UnaryOpType.NOT, child))
+
+
+def _program(expr: Any) -> Program:
+    return Program(Function(Identifier("main"), [Return(expr)]))
+
+
+def _tacky(expr: Any) -> Any:
+    reset_counters()
+    return convert_AST_to_TACKY(_program(expr))
+
+
+def _resolve(expr: Any) -> Any:
+    env = VariableMap()
+    env[Identifier("a")] = Identifier("a.0")
+    return _resolve_expression(expr, env)
+
+
+def _timed(fn: Callable[[], Any]) -> str:
+    start = time.perf_counter()
+    try:
+        fn()
+    except RecursionError:
+        return "RecursionError"
+    return f"{(time.perf_counter() - start) * 1000:.1f}ms"
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--depths", type=int, nargs="+", default=[100, 1_000, 10_000, 100_000])
+    parser.add_argument("--levels", type=int, default=15, help="levels of the balanced tree timed for speed")
+    parser.add_argument(
+        "--pretty-max-depth",
+        type=int,
+        default=2_000,
+        help="deepest tree pretty-printed (its indentation grows with depth)",
+    )
+    args = parser.parse_args(argv)
+
+    print(f"recursion limit: {sys.getrecursionlimit()}")
+    print(f"{'depth':>8}{'tacky':>16}{'resolve':>16}{'pretty':>16}{'dot':>16}{'svg':>16}")
+    for depth in args.depths:
+        chain = _chain(depth)
+        program = _program(chain)
+        text = depth <= args.pretty_max_depth
+        print(
+            f"{depth:>8}"
+            f"{_timed(lambda: _tacky(chain)):>16}"
+            f"{_timed(lambda: _resolve(_assignments(depth))):>16}"
+            f"{_timed(lambda: pretty_print_tree(program)) if text else 'skipped':>16}"
+            f"{_timed(lambda: ast_to_dot(program)):>16}"
+            f"{_timed(lambda: ast_to_svg(program)):>16}"
+        )
+
+    tree = _balanced(args.levels)
+    nodes = sum(1 for _ in preorder(tree))
+    print(f"\nbalanced tree, {nodes} nodes:")
+    print(f"  tacky   {_timed(lambda: _tacky(tree))}")
+    print(f"  pretty  {_timed(lambda: pretty_print_tree(_program(_balanced(min(args.levels, 11)))))} (11 levels)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
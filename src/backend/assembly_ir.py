@@ -1,18 +1,20 @@
 from __future__ import annotations
 
-import itertools
 from enum import Enum, auto
-from typing import Any, List, Literal, NamedTuple, TypeAlias
+from typing import Any, Dict, List, Literal, NamedTuple, TypeAlias
 
 
 class OffsetAllocator(dict):
     def __init__(self, start=-4, step=-4) -> None:
         super().__init__()
-        self.counter = itertools.count(start, step)
+        # The offset the next new variable gets.
+        self.next_offset = start
+        self.step = step
         self.max_offset = start
 
     def __missing__(self, var_name: str) -> int:
-        offset = next(self.counter)
+        offset = self.next_offset
+        self.next_offset += self.step
         self[var_name] = offset
         self.max_offset = offset
         return offset
@@ -26,6 +28,8 @@ class AssemblyFunction(NamedTuple):
 
 class AssemblyProgram(NamedTuple):
     function_definition: AssemblyFunction
+    # The TACKYProfileHeader of an --instrument build, for the exit-time writer.
+    profile: Any = None
 
 
 class AssemblyImmediate(NamedTuple):
@@ -135,3 +139,53 @@ class AssemblyCdq(NamedTuple):
 
 class AssemblyAllocateStack(NamedTuple):
     val: int
+
+
+class AssemblyIncrementCounter(NamedTuple):
+    index: int
+
+
+# Pads to a multiple of 2**power bytes (.p2align); placed by src.backend.layout.
+class AssemblyAlign(NamedTuple):
+    power: int
+
+
+# Interned like TACKY values; see make_constant in src.middle.tacky_ir.
+_stack_operands: Dict[int, AssemblyStack] = {}
+_immediates: Dict[int | str, AssemblyImmediate] = {}
+_pseudo_registers: Dict[str, AssemblyPseudoRegister] = {}
+
+
+def make_stack(offset: int) -> AssemblyStack:
+    operand = _stack_operands.get(offset)
+    if operand is None:
+        operand = _stack_operands[offset] = AssemblyStack(offset)
+    return operand
+
+
+def make_immediate(value: int | str) -> AssemblyImmediate:
+    operand = _immediates.get(value)
+    if operand is None:
+        operand = _immediates[value] = AssemblyImmediate(value)
+    return operand
+
+
+def make_pseudo_register(identifier: str) -> AssemblyPseudoRegister:
+    operand = _pseudo_registers.get(identifier)
+    if operand is None:
+        operand = _pseudo_registers[identifier] = AssemblyPseudoRegister(identifier)
+    return operand
+
+
+def clear_interned_operands() -> None:
+    _stack_operands.clear()
+    _immediates.clear()
+    _pseudo_registers.clear()
+
+
+# As tacky_ir.INTERNED.
+INTERNED = {
+    AssemblyStack: make_stack,
+    AssemblyImmediate: make_immediate,
+    AssemblyPseudoRegister: make_pseudo_register,
+}
@@ -1,6 +1,9 @@
-from typing import List
+import io
+from typing import Callable, Dict, List, TextIO
 
 from src.backend.assembly_ir import *
+from src.backend.target import HOST_TARGET, Target
+from src.middle.tacky_ir import PROFILE_HEADER, PROFILE_MAGIC, PROFILE_VERSION
 
 CONDITION_CODE_SUFFIXES = {
     AssemblyConditionCode.E: "e",
@@ -25,107 +28,143 @@ REG8 = {
     AssemblyRegister.DX: r"%dl",
 }
 
-def _emit_register(reg: AssemblyRegister, byte: bool = False) -> str:
-    return REG8[reg] if byte else REG32[reg]
-
-def emit_assembly(node: AssemblyProgram | AssemblyFunction) -> List[str]:
-    match node:
-        case AssemblyProgram(func):
-            return emit_assembly(func)
-
-        case AssemblyFunction(name, instructions):
-            lines = [
-                f"\t.globl _{name}",
-                f"_{name}:",
-                "\tpushq\t%rbp",
-                "\tmovq\t%rsp, %rbp",
-            ]
-            for instr in instructions:
-                lines.extend(emit_assembly(instr))
-            return lines
-
-        case AssemblyMov(exp, register):
-            return [f"\tmovl\t{emit_assembly(exp)[0]}, {emit_assembly(register)[0]}"]
-
-        case AssemblyRet():
-            return ["\tmovq\t%rbp, %rsp", "\tpopq\t%rbp", "\tret"]
-
-        case AssemblyUnary(uop, operand):
-            operand_assembly = emit_assembly(operand)[0]
-            match uop:
-                case AssemblyUnaryOpType.NEGATION:
-                    return [f"\tnegl\t{operand_assembly}"]
-                case AssemblyUnaryOpType.COMPLEMENT:
-                    return [f"\tnotl\t{operand_assembly}"]
-
-        case AssemblyBinaryOp(op, src, dst):
-            src_assembly = emit_assembly(src)[0]
-            dst_assembly = emit_assembly(dst)[0]
-            match op:
-                case AssemblyBinaryOpType.ADD:
-                    return [f"\taddl\t{src_assembly}, {dst_assembly}"]
-
-                case AssemblyBinaryOpType.SUBTRACT:
-                    return [f"\tsubl\t{src_assembly}, {dst_assembly}"]
-
-                case AssemblyBinaryOpType.MULTIPLY:
-                    return [f"\timull\t{src_assembly}, {dst_assembly}"]
-
-                case AssemblyBinaryOpType.BITWISE_AND:
-                    return [f"\tandl\t{src_assembly}, {dst_assembly}"]
-
-                case AssemblyBinaryOpType.BITWISE_OR:
-                    return [f"\torl\t\t{src_assembly}, {dst_assembly}"]
-
-                case AssemblyBinaryOpType.BITWISE_XOR:
-                    return [f"\txorl\t{src_assembly}, {dst_assembly}"]
-
-                case AssemblyBinaryOpType.L_SHIFT:
-                    return [f"\tsall\t{src_assembly}, {dst_assembly}"]
-
-                case AssemblyBinaryOpType.R_SHIFT:
-                    return [f"\tsarl\t{src_assembly}, {dst_assembly}"]
-
-        case AssemblyIDiv(operand):
-            return [f"\tidivl\t{emit_assembly(operand)[0]}"]
-
-        case AssemblyCdq():
-            return ["\tcdq"]
-
-        case AssemblyAllocateStack(v):
-            return [f"\tsubq\t${abs(v)}, %rsp"]
-
-        case AssemblyRegister() as reg:
-            return [_emit_register(reg, byte=False)]
-
-        case AssemblyStack(offset):
-            return [f"{offset}(%rbp)"]
-
-        case AssemblyImmediate(val):
-            return [f"${val}"]
-
-        case AssemblyCompare(operand_1, operand_2):
-            operand_1_assembly = emit_assembly(operand_1)[0]
-            operand_2_assembly = emit_assembly(operand_2)[0]
-            return [f"\tcmpl\t{operand_1_assembly}, {operand_2_assembly}"]
-
-        case AssemblyJump(label):
-            return [f"\tjmp\t.L{label}"]
-
-        case AssemblyJumpConditionCode(cond_code, label):
-            suffix = CONDITION_CODE_SUFFIXES[cond_code]
-            return [f"\tj{suffix}\t.L{label}"]
+# Operand text by operand class.
+_OPERAND_FORMATTERS: Dict[type, Callable[[Any], str]] = {
+    AssemblyRegister: REG32.__getitem__,
+    AssemblyStack: lambda operand: f"{operand[0]}(%rbp)",
+    AssemblyImmediate: lambda operand: f"${operand[0]}",
+}
 
-        case AssemblySetConditionCode(cond_code, operand):
-            suffix = CONDITION_CODE_SUFFIXES[cond_code]
-            if isinstance(operand, AssemblyRegister):
-                operand_assembly = _emit_register(operand, byte=True)
-            else:
-                operand_assembly = emit_assembly(operand)[0]
-            return [f"\tset{suffix}\t{operand_assembly}"]
+# Opcode templates for the source, destination instruction forms.
+UNARY_TEMPLATES = {
+    AssemblyUnaryOpType.NEGATION: "\tnegl\t{}\n",
+    AssemblyUnaryOpType.COMPLEMENT: "\tnotl\t{}\n",
+}
 
-        case AssemblyLabel(label):
-            return [f".L{label}:"]
+BINARY_TEMPLATES = {
+    AssemblyBinaryOpType.ADD: "\taddl\t{}, {}\n",
+    AssemblyBinaryOpType.SUBTRACT: "\tsubl\t{}, {}\n",
+    AssemblyBinaryOpType.MULTIPLY: "\timull\t{}, {}\n",
+    AssemblyBinaryOpType.BITWISE_AND: "\tandl\t{}, {}\n",
+    AssemblyBinaryOpType.BITWISE_OR: "\torl\t\t{}, {}\n",
+    AssemblyBinaryOpType.BITWISE_XOR: "\txorl\t{}, {}\n",
+    AssemblyBinaryOpType.L_SHIFT: "\tsall\t{}, {}\n",
+    AssemblyBinaryOpType.R_SHIFT: "\tsarl\t{}, {}\n",
+}
 
-        case _:
-            raise NotImplementedError(f"No emit logic for {node}")
+_RET = "\tmovq\t%rbp, %rsp\n\tpopq\t%rbp\n\tret\n"
+
+# Data label of an --instrument build's profile; its counters follow the header.
+_PROFILE_LABEL = "mycc_profile"
+
+
+def _instruction_formatters(target: Target) -> Dict[type, Callable[[Any], str]]:
+    """Builds the per-class formatters. Each returns the instruction's full text."""
+    operand = _OPERAND_FORMATTERS
+    label = target.local_label_prefix
+    jumps = {cc: f"\tj{suffix}\t{label}" for cc, suffix in CONDITION_CODE_SUFFIXES.items()}
+    sets = {cc: f"\tset{suffix}\t" for cc, suffix in CONDITION_CODE_SUFFIXES.items()}
+    unary = {op: template.format for op, template in UNARY_TEMPLATES.items()}
+    binary = {op: template.format for op, template in BINARY_TEMPLATES.items()}
+
+    def set_condition_code(instr) -> str:
+        cc, dst = instr
+        text = REG8[dst] if type(dst) is AssemblyRegister else operand[type(dst)](dst)
+        return f"{sets[cc]}{text}\n"
+
+    return {
+        AssemblyMov: lambda i: f"\tmovl\t{operand[type(i[0])](i[0])}, {operand[type(i[1])](i[1])}\n",
+        AssemblyRet: lambda i: _RET,
+        AssemblyUnary: lambda i: unary[i[0]](operand[type(i[1])](i[1])),
+        AssemblyBinaryOp: lambda i: binary[i[0]](operand[type(i[1])](i[1]), operand[type(i[2])](i[2])),
+        AssemblyIDiv: lambda i: f"\tidivl\t{operand[type(i[0])](i[0])}\n",
+        AssemblyCdq: lambda i: "\tcdq\n",
+        AssemblyAllocateStack: lambda i: f"\tsubq\t${abs(i[0])}, %rsp\n",
+        AssemblyCompare: lambda i: f"\tcmpl\t{operand[type(i[0])](i[0])}, {operand[type(i[1])](i[1])}\n",
+        AssemblyJump: lambda i: f"\tjmp\t{label}{i[0]}\n",
+        AssemblyJumpConditionCode: lambda i: f"{jumps[i[0]]}{i[1]}\n",
+        AssemblySetConditionCode: set_condition_code,
+        AssemblyLabel: lambda i: f"{label}{i[0]}:\n",
+        AssemblyAlign: lambda i: f"\t.p2align {i[0]}\n",
+        AssemblyIncrementCounter: lambda i: (
+            f"\tincq\t{label}{_PROFILE_LABEL}+{PROFILE_HEADER.size + 8 * i[0]}(%rip)\n"
+        ),
+    }
+
+
+_formatters_by_target: Dict[Target, Dict[type, Callable[[Any], str]]] = {}
+
+
+def _formatters_for(target: Target) -> Dict[type, Callable[[Any], str]]:
+    formatters = _formatters_by_target.get(target)
+    if formatters is None:
+        formatters = _formatters_by_target[target] = _instruction_formatters(target)
+    return formatters
+
+
+def format_instruction(instr: Any, target: Target = HOST_TARGET) -> str:
+    """The text write_assembly writes for `instr`, newline included."""
+    return _formatters_for(target)[type(instr)](instr)
+
+
+def _write_profile_runtime(header, out: TextIO, target: Target) -> None:
+    """The counters of an --instrument build and an exit-time function that writes them to the profile.
+
+    The profile is written with raw Linux system calls (open, write, close) from
+    .fini_array, so instrumented programs need no runtime library.
+    """
+    if target.name != "elf":
+        raise NotImplementedError(f"--instrument needs an ELF target, not {target.name}")
+    data = f"{target.local_label_prefix}{_PROFILE_LABEL}"
+    size = PROFILE_HEADER.size + 8 * header.counters
+    path = ", ".join(str(byte) for byte in header.path.encode() + b"\0")
+    magic = PROFILE_MAGIC.decode()
+    out.write(
+        f"\t.data\n\t.p2align 3\n{data}:\n"
+        f'\t.ascii\t"{magic}"\n\t.long\t{PROFILE_VERSION}\n\t.long\t{header.counters}\n\t.quad\t{header.checksum}\n'
+        + (f"\t.zero\t{8 * header.counters}\n" if header.counters else "")
+        + f"{data}_path:\n\t.byte\t{path}\n"
+        f"\t{target.text_section}\n{data}_write:\n"
+        # fd = open(path, O_WRONLY | O_CREAT | O_TRUNC, 0644)
+        f"\tmovl\t$2, %eax\n\tleaq\t{data}_path(%rip), %rdi\n\tmovl\t$577, %esi\n\tmovl\t$420, %edx\n\tsyscall\n"
+        f"\ttestq\t%rax, %rax\n\tjs\t{data}_done\n"
+        # write(fd, data, size) until everything is written or it fails
+        f"\tmovl\t%eax, %edi\n\tleaq\t{data}(%rip), %rsi\n\tmovl\t${size}, %edx\n"
+        f"{data}_loop:\n\tmovl\t$1, %eax\n\tsyscall\n\ttestq\t%rax, %rax\n\tjle\t{data}_close\n"
+        f"\taddq\t%rax, %rsi\n\tsubq\t%rax, %rdx\n\tjnz\t{data}_loop\n"
+        f"{data}_close:\n\tmovl\t$3, %eax\n\tsyscall\n{data}_done:\n\tret\n"
+        f'\t.section\t.fini_array,"aw"\n\t.p2align 3\n\t.quad\t{data}_write\n'
+    )
+
+
+def write_assembly(node: AssemblyProgram | AssemblyFunction, out: TextIO, target: Target = HOST_TARGET) -> None:
+    """Writes the assembly for `node` to `out` in a single pass, one table lookup per instruction."""
+    func = node.function_definition if isinstance(node, AssemblyProgram) else node
+    if func is not node:
+        out.write(f"\t{target.text_section}\n")
+
+    symbol = f"{target.symbol_prefix}{func.name}"
+    out.write(f"\t.globl {symbol}\n{symbol}:\n\tpushq\t%rbp\n\tmovq\t%rsp, %rbp\n")
+
+    formatters = _formatters_for(target)
+    try:
+        out.writelines(formatters[type(instr)](instr) for instr in func.instructions)
+    except KeyError:
+        # Either an instruction or an operand (e.g. a pseudoregister) without emit logic.
+        for instr in func.instructions:
+            try:
+                formatters[type(instr)](instr)
+            except KeyError:
+                raise NotImplementedError(f"No emit logic for {instr}") from None
+        raise
+
+    if func is not node and node.profile is not None:
+        _write_profile_runtime(node.profile, out, target)
+    if func is not node and target.note_gnu_stack:
+        out.write('\t.section\t.note.GNU-stack,"",@progbits\n')
+
+
+def emit_assembly(node: AssemblyProgram | AssemblyFunction, target: Target = HOST_TARGET) -> List[str]:
+    out = io.StringIO()
+    write_assembly(node, out, target)
+    return out.getvalue().splitlines()
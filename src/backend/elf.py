@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import struct
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+from src.backend.encoder import EncodedFunction
+
+# Everything here mirrors the section order and file layout GNU as produces for a
+# single .text function, so objects written directly compare byte-for-byte with `gcc -c`.
+
+ELF_HEADER_SIZE = 64
+SECTION_HEADER_SIZE = 64
+SYMBOL_SIZE = 24
+RELA_SIZE = 24
+
+EM_X86_64 = 62
+ET_REL = 1
+
+SHT_PROGBITS = 1
+SHT_SYMTAB = 2
+SHT_STRTAB = 3
+SHT_RELA = 4
+SHT_NOBITS = 8
+
+SHF_WRITE = 0x1
+SHF_ALLOC = 0x2
+SHF_EXECINSTR = 0x4
+SHF_INFO_LINK = 0x40
+
+STB_GLOBAL = 1
+STT_NOTYPE = 0
+SHN_UNDEF = 0
+
+
+class _Section(NamedTuple):
+    name: str
+    type: int
+    flags: int
+    data: bytes
+    link: int = 0
+    info: int = 0
+    align: int = 1
+    entsize: int = 0
+
+
+class _StringTable:
+    def __init__(self) -> None:
+        self.data = bytearray(b"\0")
+        self.offsets: Dict[str, int] = {}
+
+    def add(self, name: str) -> int:
+        if name not in self.offsets:
+            self.offsets[name] = len(self.data)
+            self.data += name.encode() + b"\0"
+        return self.offsets[name]
+
+    def find(self, name: str) -> int:
+        """Offset of an already added string, or of a string ending with it."""
+        if name in self.offsets:
+            return self.offsets[name]
+        return bytes(self.data).index(name.encode() + b"\0")
+
+
+def _align(value: int, alignment: int) -> int:
+    return (value + alignment - 1) // alignment * alignment
+
+
+def _symbol(name: int, info: int, shndx: int, value: int = 0) -> bytes:
+    return struct.pack("<IBBHQQ", name, info, 0, shndx, value, 0)
+
+
+def build_elf_object(func: EncodedFunction, note_gnu_stack: bool = False) -> bytes:
+    strtab = _StringTable()
+    text_index = 1
+
+    # Local symbols first (only the null symbol), then the defined function, then
+    # undefined targets in order of first reference.
+    symbols = [_symbol(0, 0, SHN_UNDEF)]
+    symbols.append(_symbol(strtab.add(func.name), (STB_GLOBAL << 4) | STT_NOTYPE, text_index))
+    symbol_indices: Dict[str, int] = {func.name: 1}
+    for reloc in func.relocations:
+        if reloc.symbol not in symbol_indices:
+            symbol_indices[reloc.symbol] = len(symbols)
+            symbols.append(_symbol(strtab.add(reloc.symbol), (STB_GLOBAL << 4) | STT_NOTYPE, SHN_UNDEF))
+
+    rela = b"".join(
+        struct.pack("<QQq", r.offset, (symbol_indices[r.symbol] << 32) | r.type, r.addend)
+        for r in func.relocations
+    )
+
+    sections: List[_Section] = [
+        _Section(".text", SHT_PROGBITS, SHF_ALLOC | SHF_EXECINSTR, func.code, align=func.alignment)
+    ]
+    if rela:
+        sections.append(_Section(".rela.text", SHT_RELA, SHF_INFO_LINK, rela, align=8, entsize=RELA_SIZE))
+    sections.append(_Section(".data", SHT_PROGBITS, SHF_WRITE | SHF_ALLOC, b""))
+    sections.append(_Section(".bss", SHT_NOBITS, SHF_WRITE | SHF_ALLOC, b""))
+    if note_gnu_stack:
+        sections.append(_Section(".note.GNU-stack", SHT_PROGBITS, 0, b""))
+
+    symtab_index = len(sections) + 1
+    sections.append(
+        _Section(".symtab", SHT_SYMTAB, 0, b"".join(symbols), link=symtab_index + 1, info=1, align=8, entsize=SYMBOL_SIZE)
+    )
+    sections.append(_Section(".strtab", SHT_STRTAB, 0, bytes(strtab.data)))
+    sections.append(_Section(".shstrtab", SHT_STRTAB, 0, b""))
+
+    if rela:
+        sections[1] = sections[1]._replace(link=symtab_index, info=text_index)
+
+    shstrtab = _StringTable()
+    for name in (".symtab", ".strtab", ".shstrtab"):
+        shstrtab.add(name)
+    for section in sections:
+        if section.name in (".symtab", ".strtab", ".shstrtab") or (rela and section.name == ".text"):
+            continue
+        shstrtab.add(section.name)
+    sections[-1] = sections[-1]._replace(data=bytes(shstrtab.data))
+
+    # GNU as writes section contents in header order, except that relocation
+    # sections follow the string table and precede .shstrtab.
+    layout = [s for s in sections if s.type != SHT_RELA and s.name != ".shstrtab"]
+    layout += [s for s in sections if s.type == SHT_RELA]
+    layout.append(sections[-1])
+
+    body = bytearray()
+    offsets: Dict[str, int] = {}
+    for section in layout:
+        offset = _align(ELF_HEADER_SIZE + len(body), section.align)
+        body += b"\0" * (offset - ELF_HEADER_SIZE - len(body))
+        offsets[section.name] = offset
+        if section.type != SHT_NOBITS:
+            body += section.data
+
+    shoff = _align(ELF_HEADER_SIZE + len(body), 8)
+    body += b"\0" * (shoff - ELF_HEADER_SIZE - len(body))
+
+    headers = [b"\0" * SECTION_HEADER_SIZE]
+    for section in sections:
+        headers.append(
+            struct.pack(
+                "<IIQQQQIIQQ",
+                shstrtab.find(section.name),
+                section.type,
+                section.flags,
+                0,
+                offsets[section.name],
+                len(section.data),
+                section.link,
+                section.info,
+                section.align,
+                section.entsize,
+            )
+        )
+
+    ident = b"\x7fELF" + bytes([2, 1, 1, 0]) + b"\0" * 8
+    header = ident + struct.pack(
+        "<HHIQQQIHHHHHH",
+        ET_REL,
+        EM_X86_64,
+        1,
+        0,
+        0,
+        shoff,
+        0,
+        ELF_HEADER_SIZE,
+        0,
+        0,
+        SECTION_HEADER_SIZE,
+        len(sections) + 1,
+        len(sections),
+    )
+    return header + bytes(body) + b"".join(headers)
+
+
+def write_elf_object(path: str | Path, func: EncodedFunction, note_gnu_stack: bool = False) -> Path:
+    path = Path(path)
+    path.write_bytes(build_elf_object(func, note_gnu_stack))
+    return path
@@ -0,0 +1,340 @@
+from __future__ import annotations
+
+import struct
+from typing import Any, Dict, List, NamedTuple
+
+from src.backend.assembly_ir import *
+
+# Hardware register numbers. Bit 3 goes into the REX prefix, bits 0-2 into ModRM/SIB.
+RAX, RCX, RDX, RBX, RSP, RBP, RSI, RDI = range(8)
+R10, R11, R12, R13 = 10, 11, 12, 13
+
+REGISTER_NUMBERS = {
+    AssemblyRegister.AX: RAX,
+    AssemblyRegister.DX: RDX,
+    AssemblyRegister.R10: R10,
+    AssemblyRegister.R11: R11,
+}
+
+# Second opcode byte of jcc rel32 (0F 8x) / setcc (0F 9x); jcc rel8 is 7x.
+CONDITION_CODE_NIBBLES = {
+    AssemblyConditionCode.E: 0x4,
+    AssemblyConditionCode.NE: 0x5,
+    AssemblyConditionCode.L: 0xC,
+    AssemblyConditionCode.GE: 0xD,
+    AssemblyConditionCode.LE: 0xE,
+    AssemblyConditionCode.G: 0xF,
+}
+
+# (r/m <- reg, reg <- r/m, /digit for the 0x81/0x83 immediate group, eax short form)
+_ALU_OPCODES = {
+    AssemblyBinaryOpType.ADD: (0x01, 0x03, 0, 0x05),
+    AssemblyBinaryOpType.BITWISE_OR: (0x09, 0x0B, 1, 0x0D),
+    AssemblyBinaryOpType.BITWISE_AND: (0x21, 0x23, 4, 0x25),
+    AssemblyBinaryOpType.SUBTRACT: (0x29, 0x2B, 5, 0x2D),
+    AssemblyBinaryOpType.BITWISE_XOR: (0x31, 0x33, 6, 0x35),
+}
+_CMP_OPCODES = (0x39, 0x3B, 7, 0x3D)
+
+_SHIFT_DIGITS = {
+    AssemblyBinaryOpType.L_SHIFT: 4,
+    AssemblyBinaryOpType.R_SHIFT: 7,
+}
+
+R_X86_64_PLT32 = 4
+
+_SHORT_JUMP_SIZE = 2
+_NEAR_JUMP_SIZE = 5
+_NEAR_JCC_SIZE = 6
+
+
+class Relocation(NamedTuple):
+    offset: int
+    symbol: str
+    type: int
+    addend: int
+
+
+class EncodedFunction(NamedTuple):
+    name: str
+    code: bytes
+    relocations: List[Relocation]
+    # Alignment the code needs in memory, from AssemblyAlign.
+    alignment: int = 1
+
+
+# The NOPs GNU as pads code with on x86-64, by length; longer padding repeats the longest.
+_NOPS = (
+    b"",
+    b"\x90",
+    b"\x66\x90",
+    b"\x0F\x1F\x00",
+    b"\x0F\x1F\x40\x00",
+    b"\x0F\x1F\x44\x00\x00",
+    b"\x66\x0F\x1F\x44\x00\x00",
+    b"\x0F\x1F\x80\x00\x00\x00\x00",
+    b"\x0F\x1F\x84\x00\x00\x00\x00\x00",
+    b"\x66\x0F\x1F\x84\x00\x00\x00\x00\x00",
+    b"\x66\x2E\x0F\x1F\x84\x00\x00\x00\x00\x00",
+    b"\x66\x66\x2E\x0F\x1F\x84\x00\x00\x00\x00\x00",
+)
+
+
+def _padding(pc: int, alignment: int) -> int:
+    return -pc % alignment
+
+
+def _nops(size: int) -> bytes:
+    longest = len(_NOPS) - 1
+    return _NOPS[longest] * (size // longest) + _NOPS[size % longest]
+
+
+class _Branch(NamedTuple):
+    """A jmp/jcc whose size is decided by relaxation."""
+
+    cond_code: AssemblyConditionCode | None
+    target: str
+
+
+class _Align(NamedTuple):
+    """Padding up to the next multiple of `alignment`, which depends on where relaxation puts it."""
+
+    alignment: int
+
+
+def _fits_i8(value: int) -> bool:
+    return -128 <= value <= 127
+
+
+def _imm32(value: int | str) -> int:
+    if not isinstance(value, int):
+        raise NotImplementedError(f"Cannot encode symbolic immediate {value!r}")
+    if not -(2**31) <= value < 2**32:
+        raise NotImplementedError(f"Immediate {value} does not fit in 32 bits")
+    return value - 2**32 if value >= 2**31 else value
+
+
+def _rex(w: bool, reg: int, index: int, base: int, force: bool = False) -> bytes:
+    bits = (w << 3) | ((reg >> 3) << 2) | ((index >> 3) << 1) | (base >> 3)
+    return bytes([0x40 | bits]) if bits or force else b""
+
+
+def _modrm_sib(reg: int, rm: Operand) -> tuple[int, int, bytes]:
+    """Returns the registers feeding REX.X/REX.B and the ModRM [+ SIB] + displacement bytes."""
+    if isinstance(rm, AssemblyRegister):
+        base = REGISTER_NUMBERS[rm]
+        return 0, base, bytes([0xC0 | ((reg & 7) << 3) | (base & 7)])
+
+    if isinstance(rm, AssemblyStack):
+        return 0, RBP, _memory_operand(reg, RBP, rm.offset)
+
+    raise NotImplementedError(f"Cannot encode operand {rm!r}")
+
+
+def _memory_operand(reg: int, base: int, disp: int) -> bytes:
+    # rbp/r13 as a base have no disp-less form; rsp/r12 always need a SIB byte.
+    if disp == 0 and base & 7 != RBP:
+        mod, disp_bytes = 0b00, b""
+    elif _fits_i8(disp):
+        mod, disp_bytes = 0b01, struct.pack("<b", disp)
+    else:
+        mod, disp_bytes = 0b10, struct.pack("<i", disp)
+
+    if base & 7 == RSP:
+        return bytes([(mod << 6) | ((reg & 7) << 3) | 0b100, 0x24]) + disp_bytes
+    return bytes([(mod << 6) | ((reg & 7) << 3) | (base & 7)]) + disp_bytes
+
+
+def _op_rm(opcode: bytes, reg: int, rm: Operand, w: bool = False, byte: bool = False) -> bytes:
+    index, base, modrm = _modrm_sib(reg, rm)
+    # spl/bpl/sil/dil need an empty REX prefix to avoid aliasing ah/ch/dh/bh.
+    force = byte and isinstance(rm, AssemblyRegister) and 4 <= base <= 7
+    return _rex(w, reg, index, base, force) + opcode + modrm
+
+
+def _reg(operand: Operand) -> int:
+    if not isinstance(operand, AssemblyRegister):
+        raise NotImplementedError(f"Expected a register, got {operand!r}")
+    return REGISTER_NUMBERS[operand]
+
+
+def _encode_alu(opcodes: tuple[int, int, int, int], src: Operand, dst: Operand) -> bytes:
+    store, load, digit, eax_short = opcodes
+    if isinstance(src, AssemblyImmediate):
+        imm = _imm32(src.value)
+        if _fits_i8(imm):
+            return _op_rm(b"\x83", digit, dst) + struct.pack("<b", imm)
+        if dst is AssemblyRegister.AX:
+            return bytes([eax_short]) + struct.pack("<i", imm)
+        return _op_rm(b"\x81", digit, dst) + struct.pack("<i", imm)
+    if isinstance(src, AssemblyRegister):
+        return _op_rm(bytes([store]), _reg(src), dst)
+    if isinstance(dst, AssemblyRegister):
+        return _op_rm(bytes([load]), _reg(dst), src)
+    raise NotImplementedError(f"No encoding for memory-to-memory operands {src!r}, {dst!r}")
+
+
+def _encode_mov(src: Operand, dst: Operand) -> bytes:
+    if isinstance(src, AssemblyImmediate):
+        imm = struct.pack("<i", _imm32(src.value))
+        if isinstance(dst, AssemblyRegister):
+            reg = _reg(dst)
+            return _rex(False, 0, 0, reg) + bytes([0xB8 + (reg & 7)]) + imm
+        return _op_rm(b"\xC7", 0, dst) + imm
+    return _encode_alu((0x89, 0x8B, 0, 0), src, dst)
+
+
+def _encode_binary(op: AssemblyBinaryOpType, src: Operand, dst: Operand) -> bytes:
+    if op in _ALU_OPCODES:
+        return _encode_alu(_ALU_OPCODES[op], src, dst)
+
+    if op is AssemblyBinaryOpType.MULTIPLY:
+        reg = _reg(dst)
+        if isinstance(src, AssemblyImmediate):
+            imm = _imm32(src.value)
+            if _fits_i8(imm):
+                return _op_rm(b"\x6B", reg, dst) + struct.pack("<b", imm)
+            return _op_rm(b"\x69", reg, dst) + struct.pack("<i", imm)
+        return _op_rm(b"\x0F\xAF", reg, src)
+
+    if op in _SHIFT_DIGITS:
+        if not isinstance(src, AssemblyImmediate):
+            raise NotImplementedError(f"Shift count must be an immediate, got {src!r}")
+        count = _imm32(src.value) & 0xFF
+        if count == 1:
+            return _op_rm(b"\xD1", _SHIFT_DIGITS[op], dst)
+        return _op_rm(b"\xC1", _SHIFT_DIGITS[op], dst) + bytes([count])
+
+    raise NotImplementedError(f"No encoding for binary operator {op}")
+
+
+def _encode_instruction(instr: Any) -> bytes | _Branch | _Align | None:
+    match instr:
+        case AssemblyMov(src, dst):
+            return _encode_mov(src, dst)
+
+        case AssemblyRet():
+            # movq %rbp, %rsp; popq %rbp; ret
+            return b"\x48\x89\xEC\x5D\xC3"
+
+        case AssemblyUnary(uop, operand):
+            digit = 2 if uop is AssemblyUnaryOpType.COMPLEMENT else 3
+            return _op_rm(b"\xF7", digit, operand)
+
+        case AssemblyBinaryOp(op, src, dst):
+            return _encode_binary(op, src, dst)
+
+        case AssemblyIDiv(operand):
+            return _op_rm(b"\xF7", 7, operand)
+
+        case AssemblyCdq():
+            return b"\x99"
+
+        case AssemblyAllocateStack(v):
+            size = abs(v)
+            if _fits_i8(size):
+                return b"\x48\x83\xEC" + struct.pack("<b", size)
+            return b"\x48\x81\xEC" + struct.pack("<i", _imm32(size))
+
+        case AssemblyCompare(operand_1, operand_2):
+            return _encode_alu(_CMP_OPCODES, operand_1, operand_2)
+
+        case AssemblySetConditionCode(cond_code, operand):
+            opcode = bytes([0x0F, 0x90 | CONDITION_CODE_NIBBLES[cond_code]])
+            return _op_rm(opcode, 0, operand, byte=True)
+
+        case AssemblyJump(label):
+            return _Branch(None, label)
+
+        case AssemblyJumpConditionCode(cond_code, label):
+            return _Branch(cond_code, label)
+
+        case AssemblyLabel():
+            return None
+
+        case AssemblyAlign(power):
+            return _Align(1 << power)
+
+        case _:
+            raise NotImplementedError(f"No encode logic for {instr}")
+
+
+def _branch_size(branch: _Branch, short: bool) -> int:
+    if short:
+        return _SHORT_JUMP_SIZE
+    return _NEAR_JUMP_SIZE if branch.cond_code is None else _NEAR_JCC_SIZE
+
+
+def _relax(items: List[bytes | _Branch | _Align | str], labels: set[str]) -> tuple[Dict[str, int], Dict[int, bool]]:
+    """Starts every local branch short and grows the ones whose rel8 overflows, like GAS."""
+    short = {i: item.target in labels for i, item in enumerate(items) if isinstance(item, _Branch)}
+
+    while True:
+        offsets: Dict[str, int] = {}
+        ends: Dict[int, int] = {}
+        pc = 0
+        for i, item in enumerate(items):
+            if isinstance(item, str):
+                offsets[item] = pc
+            elif isinstance(item, _Branch):
+                pc += _branch_size(item, short[i])
+                ends[i] = pc
+            elif isinstance(item, _Align):
+                pc += _padding(pc, item.alignment)
+            else:
+                pc += len(item)
+
+        grown = False
+        for i, is_short in short.items():
+            if is_short and not _fits_i8(offsets[items[i].target] - ends[i]):
+                short[i] = False
+                grown = True
+        if not grown:
+            return offsets, short
+
+
+def encode_function(func: AssemblyFunction, label_prefix: str = ".L") -> EncodedFunction:
+    # pushq %rbp; movq %rsp, %rbp
+    items: List[bytes | _Branch | _Align | str] = [b"\x55\x48\x89\xE5"]
+    for instr in func.instructions:
+        encoded = _encode_instruction(instr)
+        if encoded is None:
+            items.append(instr.identifier)
+        else:
+            items.append(encoded)
+    alignment = max((item.alignment for item in items if isinstance(item, _Align)), default=1)
+
+    labels = {item for item in items if isinstance(item, str)}
+    offsets, short = _relax(items, labels)
+
+    code = bytearray()
+    relocations: List[Relocation] = []
+    for i, item in enumerate(items):
+        if isinstance(item, str):
+            continue
+        if isinstance(item, _Align):
+            code += _nops(_padding(len(code), item.alignment))
+            continue
+        if not isinstance(item, _Branch):
+            code += item
+            continue
+
+        end = len(code) + _branch_size(item, short[i])
+        if short[i]:
+            opcode = b"\xEB" if item.cond_code is None else bytes([0x70 | CONDITION_CODE_NIBBLES[item.cond_code]])
+            code += opcode + struct.pack("<b", offsets[item.target] - end)
+            continue
+
+        opcode = b"\xE9" if item.cond_code is None else bytes([0x0F, 0x80 | CONDITION_CODE_NIBBLES[item.cond_code]])
+        code += opcode
+        if item.target in offsets:
+            code += struct.pack("<i", offsets[item.target] - end)
+        else:
+            relocations.append(Relocation(len(code), f"{label_prefix}{item.target}", R_X86_64_PLT32, -4))
+            code += b"\x00\x00\x00\x00"
+
+    return EncodedFunction(func.name, bytes(code), relocations, alignment)
+
+
+def encode_program(prog: AssemblyProgram, label_prefix: str = ".L") -> EncodedFunction:
+    return encode_function(prog.function_definition, label_prefix)
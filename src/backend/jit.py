@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import mmap
+import os
+import platform
+import sys
+
+from src.backend.assembly_ir import AssemblyFunction, AssemblyIDiv
+from src.backend.encoder import EncodedFunction
+
+PROT_READ = 0x1
+PROT_WRITE = 0x2
+PROT_EXEC = 0x4
+MAP_PRIVATE = 0x02
+MAP_ANONYMOUS = 0x20 if sys.platform == "linux" else 0x1000
+MAP_FAILED = ctypes.c_void_p(-1).value
+
+JIT_SUPPORTED = sys.platform in {"linux", "darwin"} and platform.machine() == "x86_64"
+
+_libc = None
+
+
+def _load_libc() -> ctypes.CDLL:
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        _libc.mmap.restype = ctypes.c_void_p
+        _libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long]
+        _libc.mprotect.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int]
+        _libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+    return _libc
+
+
+def _call(code: bytes) -> int:
+    libc = _load_libc()
+    size = max(len(code), 1)
+    size = (size + mmap.PAGESIZE - 1) // mmap.PAGESIZE * mmap.PAGESIZE
+
+    # Map writable, copy the code in, then flip to executable so the page is never W+X.
+    addr = libc.mmap(None, size, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_ANONYMOUS, -1, 0)
+    if addr in (None, MAP_FAILED):
+        raise OSError(ctypes.get_errno(), "mmap failed")
+    try:
+        ctypes.memmove(addr, code, len(code))
+        if libc.mprotect(addr, size, PROT_READ | PROT_EXEC) != 0:
+            raise OSError(ctypes.get_errno(), "mprotect failed")
+        return ctypes.CFUNCTYPE(ctypes.c_int)(addr)()
+    finally:
+        libc.munmap(addr, size)
+
+
+def _call_in_child(code: bytes) -> int:
+    """Runs code that may trap (e.g. idiv by zero) in a forked child instead of this process."""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            status = _call(code) & 0xFF
+        except BaseException:
+            status = 255
+        os._exit(status)
+
+    _, wait_status = os.waitpid(pid, 0)
+    if os.WIFSIGNALED(wait_status):
+        # Same convention as a shell reporting a killed process.
+        return 128 + os.WTERMSIG(wait_status)
+    return os.WEXITSTATUS(wait_status)
+
+
+def run_encoded(func: EncodedFunction, may_trap: bool = False) -> int:
+    """Executes an encoded `int f(void)` and returns its value as a process exit status."""
+    if not JIT_SUPPORTED:
+        raise NotImplementedError(f"JIT execution is not supported on {sys.platform}/{platform.machine()}")
+    if func.relocations:
+        raise NotImplementedError(f"{func.name} references unresolved symbols")
+
+    if may_trap:
+        if not hasattr(os, "fork"):
+            raise NotImplementedError("Trapping code needs fork() to run safely")
+        return _call_in_child(func.code)
+    return _call(func.code) & 0xFF
+
+
+def function_may_trap(func: AssemblyFunction) -> bool:
+    return any(isinstance(instr, AssemblyIDiv) for instr in func.instructions)
@@ -0,0 +1,336 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, NamedTuple
+
+from src.backend.assembly_ir import *
+
+# Basic block layout. Runs on the fixed-up assembly of a function and
+#   - folds conditional jumps on a constant (a TACKY JumpIfZero of a constant
+#     lowers to mov $c, %r11d; cmpl $0, %r11d; j<cc>) into a jmp or nothing,
+#   - threads jumps through blocks that only pass control on, and drops the
+#     blocks that are no longer reachable,
+#   - chains blocks bottom-up by edge frequency so that the most frequent
+#     edges fall through (Pettis and Hansen),
+#   - rewrites the jumps for the new order: a jump to the next block is
+#     removed, and a conditional jump over the next block is inverted,
+#   - optionally aligns hot jump targets that are never fallen into, so the
+#     padding is never executed.
+#
+# Block frequencies come from a profile where it names a block's label, and
+# are otherwise estimated by propagating the entry frequency along the edges,
+# with both sides of a conditional jump equally likely.
+
+INVERTED_CONDITION_CODES = {
+    AssemblyConditionCode.E: AssemblyConditionCode.NE,
+    AssemblyConditionCode.NE: AssemblyConditionCode.E,
+    AssemblyConditionCode.G: AssemblyConditionCode.LE,
+    AssemblyConditionCode.LE: AssemblyConditionCode.G,
+    AssemblyConditionCode.L: AssemblyConditionCode.GE,
+    AssemblyConditionCode.GE: AssemblyConditionCode.L,
+}
+
+# `cmpl src, dst` compares dst with src.
+_CONDITIONS = {
+    AssemblyConditionCode.E: lambda dst, src: dst == src,
+    AssemblyConditionCode.NE: lambda dst, src: dst != src,
+    AssemblyConditionCode.G: lambda dst, src: dst > src,
+    AssemblyConditionCode.GE: lambda dst, src: dst >= src,
+    AssemblyConditionCode.L: lambda dst, src: dst < src,
+    AssemblyConditionCode.LE: lambda dst, src: dst <= src,
+}
+
+# .p2align power of aligned jump targets (16 bytes, one instruction fetch block).
+ALIGN_POWER = 4
+# Blocks that run at least this often per call of the function are hot.
+HOT_FRACTION = 0.5
+
+
+class LayoutOptions(NamedTuple):
+    # Execution counts by label from a profile; the function's name stands for its entry block.
+    label_counts: Dict[str, int] | None = None
+    # Emit .p2align before hot jump targets that are never fallen into.
+    align_targets: bool = False
+
+
+class _Blocks:
+    """The blocks of one function, as parallel lists indexed by block number."""
+
+    def __init__(self) -> None:
+        self.labels: List[str | None] = []
+        # Everything except the label and a closing jmp or j<cc>.
+        self.bodies: List[List[Any]] = []
+        # Block a closing jmp or j<cc> goes to.
+        self.targets: List[int | None] = []
+        # Condition of a closing j<cc>; None for jmp or no jump.
+        self.cond_codes: List[AssemblyConditionCode | None] = []
+        # Block reached by falling through; None after jmp or ret.
+        self.falls: List[int | None] = []
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def successors(self, i: int) -> List[int]:
+        return [s for s in (self.falls[i], self.targets[i]) if s is not None]
+
+
+def _signed32(value: int) -> int:
+    return ((value + 2**31) & 0xFFFFFFFF) - 2**31
+
+
+def _fold_constant_condition(body: List[Any], cond_code: AssemblyConditionCode) -> bool | None:
+    """Whether a j<cc> after `body` is always taken, if its operands are constants.
+
+    The mov and cmp that set the flags are then removed from `body`; the
+    register they use is scratch and dead after the jump.
+    """
+    if len(body) < 2:
+        return None
+    mov, compare = body[-2], body[-1]
+    if not (type(mov) is AssemblyMov and type(compare) is AssemblyCompare):
+        return None
+    if not (type(mov.register) is AssemblyRegister and compare.operand_2 is mov.register):
+        return None
+    dst, src = mov.exp, compare.operand_1
+    if not (type(dst) is AssemblyImmediate and type(src) is AssemblyImmediate):
+        return None
+    if not (isinstance(dst.value, int) and isinstance(src.value, int)):
+        return None
+    del body[-2:]
+    return _CONDITIONS[cond_code](_signed32(dst.value), _signed32(src.value))
+
+
+def _split(instructions: List[Any]) -> tuple[_Blocks, bool]:
+    """The basic blocks of `instructions`, and whether the last one falls off the end."""
+    blocks = _Blocks()
+    target_labels: List[str | None] = []
+    # Whether each block falls through to the next one in instruction order.
+    falls: List[bool] = []
+    label: str | None = None
+    body: List[Any] = []
+
+    def close(target: str | None, cond_code: AssemblyConditionCode | None, falls_through: bool) -> None:
+        nonlocal label, body
+        blocks.labels.append(label)
+        blocks.bodies.append(body)
+        target_labels.append(target)
+        blocks.cond_codes.append(cond_code)
+        falls.append(falls_through)
+        label, body = None, []
+
+    for instr in instructions:
+        kind = type(instr)
+        if kind is AssemblyLabel:
+            if label is not None or body:
+                close(None, None, True)
+            label = instr.identifier
+        elif kind is AssemblyJump:
+            close(instr.identifier, None, False)
+        elif kind is AssemblyJumpConditionCode:
+            taken = _fold_constant_condition(body, instr.cond_code)
+            if taken is None:
+                close(instr.identifier, instr.cond_code, True)
+            elif taken:
+                close(instr.identifier, None, False)
+            else:
+                close(None, None, True)
+        elif kind is AssemblyRet:
+            body.append(instr)
+            close(None, None, False)
+        else:
+            body.append(instr)
+    if label is not None or body:
+        close(None, None, True)
+
+    index_of = {label: i for i, label in enumerate(blocks.labels) if label is not None}
+    blocks.targets = [None if target is None else index_of[target] for target in target_labels]
+    last = len(blocks) - 1
+    blocks.falls = [i + 1 if falls_through and i < last else None for i, falls_through in enumerate(falls)]
+    return blocks, bool(falls) and falls[-1]
+
+
+def _thread(blocks: _Blocks) -> None:
+    """Points jumps and fall-throughs past blocks that only pass control on."""
+
+    def passes_to(i: int) -> int | None:
+        if blocks.bodies[i] or blocks.cond_codes[i] is not None:
+            return None
+        return blocks.targets[i] if blocks.targets[i] is not None else blocks.falls[i]
+
+    def final(i: int | None) -> int | None:
+        seen = set()
+        while i is not None and i not in seen and (next_block := passes_to(i)) is not None:
+            seen.add(i)
+            i = next_block
+        return i
+
+    for i in range(len(blocks)):
+        blocks.targets[i] = final(blocks.targets[i])
+        blocks.falls[i] = final(blocks.falls[i])
+        if blocks.cond_codes[i] is not None and blocks.targets[i] == blocks.falls[i]:
+            # Both ways lead to the same block.
+            blocks.cond_codes[i] = blocks.targets[i] = None
+
+
+def _topological_order(successors: List[List[int]]) -> tuple[List[int], set]:
+    """The blocks reachable from the entry in topological order, and the edges that close loops."""
+    order: List[int] = []
+    back_edges = set()
+    state = [0] * len(successors)  # 0 unvisited, 1 on the DFS stack, 2 finished
+    # Index of the next successor to visit, per block; the stack holds only block numbers.
+    position = [0] * len(successors)
+    state[0] = 1
+    stack = [0]
+    while stack:
+        i = stack[-1]
+        if position[i] == len(successors[i]):
+            stack.pop()
+            state[i] = 2
+            order.append(i)
+            continue
+        s = successors[i][position[i]]
+        position[i] += 1
+        if state[s] == 0:
+            state[s] = 1
+            stack.append(s)
+        elif state[s] == 1:
+            back_edges.add((i, s))
+    order.reverse()
+    return order, back_edges
+
+
+def _frequencies(
+    blocks: _Blocks,
+    successors: List[List[int]],
+    order: List[int],
+    back_edges: set,
+    counts: Dict[str, int],
+    entry: str,
+) -> tuple[List[float], Dict[tuple, float]]:
+    """How often each block and each edge runs: per call, or in profile counts when there are some."""
+    predecessors: Dict[int, List[int]] = {}
+    for i in order:
+        for s in successors[i]:
+            predecessors.setdefault(s, []).append(i)
+
+    def known(i: int | None) -> int | None:
+        label = blocks.labels[i] if i is not None else None
+        return counts.get(label) if label is not None else None
+
+    block_freq = [0.0] * len(blocks)
+    block_freq[0] = float(counts.get(entry, 1))
+    edge_freq: Dict[tuple, float] = {}
+    for i in order:
+        if known(i) is not None:
+            block_freq[i] = float(known(i))
+        freq = block_freq[i]
+        target, fall = blocks.targets[i], blocks.falls[i]
+        if blocks.cond_codes[i] is None:
+            shares = [(s, freq) for s in (target, fall) if s is not None]
+        else:
+            taken = 0.5
+            # A successor with a count and no other way in shows how often the jump is taken.
+            if freq > 0 and known(target) is not None and predecessors[target] == [i]:
+                taken = min(1.0, known(target) / freq)
+            elif freq > 0 and known(fall) is not None and predecessors[fall] == [i]:
+                taken = 1.0 - min(1.0, known(fall) / freq)
+            shares = [(target, freq * taken), (fall, freq * (1.0 - taken))]
+        for s, share in shares:
+            edge_freq[(i, s)] = share
+            if (i, s) not in back_edges:
+                block_freq[s] += share
+    return block_freq, edge_freq
+
+
+def _chain(blocks: _Blocks, order: List[int], edge_freq: Dict[tuple, float]) -> tuple[List[int], Dict[int, int]]:
+    """Chains of blocks along the most frequent edges: the first block of each and the links between them."""
+    next_in_chain: Dict[int, int] = {}
+    prev_in_chain: Dict[int, int] = {}
+    chain_of = {i: i for i in order}
+
+    def find(i: int) -> int:
+        while chain_of[i] != i:
+            chain_of[i] = chain_of[chain_of[i]]
+            i = chain_of[i]
+        return i
+
+    # Heaviest first; on ties the edge to the nearest block after the source in
+    # the original order, which keeps the code as emitted where nothing is known.
+    edges = sorted(edge_freq, key=lambda e: (-edge_freq[e], e[1] < e[0], abs(e[1] - e[0]), e[0]))
+    for i, s in edges:
+        if s == 0 or i in next_in_chain or s in prev_in_chain or find(i) == find(s):
+            continue
+        next_in_chain[i] = s
+        prev_in_chain[s] = i
+        chain_of[find(s)] = find(i)
+    return [i for i in range(len(blocks)) if i in chain_of and i not in prev_in_chain], next_in_chain
+
+
+def layout_function(func: AssemblyFunction, options: LayoutOptions = LayoutOptions()) -> AssemblyFunction:
+    """`func` with its blocks reordered and its jumps rewritten for the new order."""
+    blocks, falls_off_end = _split(func.instructions)
+    if len(blocks) < 2 or falls_off_end:
+        # Code that runs off the end of the function has to stay last; leave it alone.
+        return func
+    _thread(blocks)
+    successors = [blocks.successors(i) for i in range(len(blocks))]
+    order, back_edges = _topological_order(successors)
+    block_freq, edge_freq = _frequencies(
+        blocks, successors, order, back_edges, options.label_counts or {}, func.name
+    )
+    heads, next_in_chain = _chain(blocks, order, edge_freq)
+
+    # The entry chain first, then the others from the most to the least frequent.
+    heads.sort(key=lambda head: (head != 0, -block_freq[head], head))
+    placed: List[int] = []
+    for head in heads:
+        i: int | None = head
+        while i is not None:
+            placed.append(i)
+            i = next_in_chain.get(i)
+
+    # Closing jumps for the new order, as (condition or None, target block).
+    jumps: List[List[tuple]] = []
+    for n, i in enumerate(placed):
+        next_block = placed[n + 1] if n + 1 < len(placed) else None
+        target, fall, cond_code = blocks.targets[i], blocks.falls[i], blocks.cond_codes[i]
+        if cond_code is None:
+            successor = target if target is not None else fall
+            jumps.append([] if successor is None or successor == next_block else [(None, successor)])
+        elif fall == next_block:
+            jumps.append([(cond_code, target)])
+        elif target == next_block:
+            jumps.append([(INVERTED_CONDITION_CODES[cond_code], fall)])
+        else:
+            jumps.append([(cond_code, target), (None, fall)])
+
+    jumped_to = {target for block_jumps in jumps for _, target in block_jumps}
+    used_labels = set(label for label in blocks.labels if label is not None)
+    labels = list(blocks.labels)
+    for i in jumped_to:
+        if labels[i] is None:
+            label = f"bb{i}"
+            while label in used_labels:
+                label += "_"
+            labels[i] = label
+            used_labels.add(label)
+
+    hot = HOT_FRACTION * block_freq[0]
+    instructions: List[Any] = []
+    for n, i in enumerate(placed):
+        # Padding in front of a block that is fallen into would be executed.
+        previous = placed[n - 1] if n > 0 else None
+        fallen_into = previous is not None and bool(successors[previous]) and (
+            not jumps[n - 1] or jumps[n - 1][-1][0] is not None
+        )
+        if options.align_targets and i in jumped_to and not fallen_into and block_freq[i] >= hot:
+            instructions.append(AssemblyAlign(ALIGN_POWER))
+        if labels[i] is not None:
+            instructions.append(AssemblyLabel(labels[i]))
+        instructions.extend(blocks.bodies[i])
+        for cond_code, target in jumps[n]:
+            if cond_code is None:
+                instructions.append(AssemblyJump(labels[target]))
+            else:
+                instructions.append(AssemblyJumpConditionCode(cond_code, labels[target]))
+    return AssemblyFunction(func.name, instructions, func.offsets)
+
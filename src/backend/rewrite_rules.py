@@ -0,0 +1,170 @@
+# Generated by tools/superopt.py; rerun it rather than editing by hand.
+#
+# (TACKY operator, position of the constant operand, constant) ->
+#     (cost, cost of the default lowering, instruction templates)
+#
+# The templates compute dst from the other operand x. Each one is
+# ("MOV", src), (binary operator, src), (unary operator,) or
+# ("SET_CC", condition, k) for cmp $k, dst; mov $0, dst; set<cc> dst, where
+# src is "x", "dst" or an immediate.
+
+VERSION = 1
+
+RULES = {
+    # 0 ADD x: MOV x (cost 2, was 3)
+    ('ADD', 1, 0): (2, 3, (('MOV', 'x'),)),
+    # x ADD 0: MOV x (cost 2, was 3)
+    ('ADD', 2, 0): (2, 3, (('MOV', 'x'),)),
+    # -1 BITWISE_AND x: MOV x (cost 2, was 3)
+    ('BITWISE_AND', 1, -1): (2, 3, (('MOV', 'x'),)),
+    # 0 BITWISE_AND x: MOV 0 (cost 1, was 3)
+    ('BITWISE_AND', 1, 0): (1, 3, (('MOV', 0),)),
+    # x BITWISE_AND -1: MOV x (cost 2, was 3)
+    ('BITWISE_AND', 2, -1): (2, 3, (('MOV', 'x'),)),
+    # x BITWISE_AND 0: MOV 0 (cost 1, was 3)
+    ('BITWISE_AND', 2, 0): (1, 3, (('MOV', 0),)),
+    # -1 BITWISE_OR x: MOV -1 (cost 1, was 3)
+    ('BITWISE_OR', 1, -1): (1, 3, (('MOV', -1),)),
+    # 0 BITWISE_OR x: MOV x (cost 2, was 3)
+    ('BITWISE_OR', 1, 0): (2, 3, (('MOV', 'x'),)),
+    # x BITWISE_OR -1: MOV -1 (cost 1, was 3)
+    ('BITWISE_OR', 2, -1): (1, 3, (('MOV', -1),)),
+    # x BITWISE_OR 0: MOV x (cost 2, was 3)
+    ('BITWISE_OR', 2, 0): (2, 3, (('MOV', 'x'),)),
+    # 0 BITWISE_XOR x: MOV x (cost 2, was 3)
+    ('BITWISE_XOR', 1, 0): (2, 3, (('MOV', 'x'),)),
+    # x BITWISE_XOR 0: MOV x (cost 2, was 3)
+    ('BITWISE_XOR', 2, 0): (2, 3, (('MOV', 'x'),)),
+    # x DIVIDE -2147483648: MOV x; ADD -2147483648; SET_CC E 0 (cost 6, was 30)
+    ('DIVIDE', 2, -2147483648): (6, 30, (('MOV', 'x'), ('ADD', -2147483648), ('SET_CC', 'E', 0))),
+    # x DIVIDE 1: MOV x (cost 2, was 30)
+    ('DIVIDE', 2, 1): (2, 30, (('MOV', 'x'),)),
+    # x DIVIDE 2: MOV x; R_SHIFT 31; SUBTRACT x; NEGATION; R_SHIFT 1 (cost 7, was 30)
+    ('DIVIDE', 2, 2): (7, 30, (('MOV', 'x'), ('R_SHIFT', 31), ('SUBTRACT', 'x'), ('NEGATION',), ('R_SHIFT', 1))),
+    # x DIVIDE 4: MOV x; R_SHIFT 31; BITWISE_AND 3; ADD x; R_SHIFT 2 (cost 7, was 30)
+    ('DIVIDE', 2, 4): (7, 30, (('MOV', 'x'), ('R_SHIFT', 31), ('BITWISE_AND', 3), ('ADD', 'x'), ('R_SHIFT', 2))),
+    # x DIVIDE 8: MOV x; R_SHIFT 31; BITWISE_AND 7; ADD x; R_SHIFT 3 (cost 7, was 30)
+    ('DIVIDE', 2, 8): (7, 30, (('MOV', 'x'), ('R_SHIFT', 31), ('BITWISE_AND', 7), ('ADD', 'x'), ('R_SHIFT', 3))),
+    # x DIVIDE 16: MOV x; R_SHIFT 31; BITWISE_AND 15; ADD x; R_SHIFT 4 (cost 7, was 30)
+    ('DIVIDE', 2, 16): (7, 30, (('MOV', 'x'), ('R_SHIFT', 31), ('BITWISE_AND', 15), ('ADD', 'x'), ('R_SHIFT', 4))),
+    # x DIVIDE 32: MOV x; R_SHIFT 31; BITWISE_AND 31; ADD x; R_SHIFT 5 (cost 7, was 30)
+    ('DIVIDE', 2, 32): (7, 30, (('MOV', 'x'), ('R_SHIFT', 31), ('BITWISE_AND', 31), ('ADD', 'x'), ('R_SHIFT', 5))),
+    # x DIVIDE 64: MOV x; R_SHIFT 31; BITWISE_AND 63; ADD x; R_SHIFT 6 (cost 7, was 30)
+    ('DIVIDE', 2, 64): (7, 30, (('MOV', 'x'), ('R_SHIFT', 31), ('BITWISE_AND', 63), ('ADD', 'x'), ('R_SHIFT', 6))),
+    # x DIVIDE 256: MOV x; R_SHIFT 31; BITWISE_AND 255; ADD x; R_SHIFT 8 (cost 7, was 30)
+    ('DIVIDE', 2, 256): (7, 30, (('MOV', 'x'), ('R_SHIFT', 31), ('BITWISE_AND', 255), ('ADD', 'x'), ('R_SHIFT', 8))),
+    # x DIVIDE 1024: MOV x; R_SHIFT 31; BITWISE_AND 1023; ADD x; R_SHIFT 10 (cost 7, was 30)
+    ('DIVIDE', 2, 1024): (7, 30, (('MOV', 'x'), ('R_SHIFT', 31), ('BITWISE_AND', 1023), ('ADD', 'x'), ('R_SHIFT', 10))),
+    # x DIVIDE 65536: MOV x; R_SHIFT 31; BITWISE_AND 65535; ADD x; R_SHIFT 16 (cost 7, was 30)
+    ('DIVIDE', 2, 65536): (7, 30, (('MOV', 'x'), ('R_SHIFT', 31), ('BITWISE_AND', 65535), ('ADD', 'x'), ('R_SHIFT', 16))),
+    # -2147483648 GREATER_THAN x: MOV 0 (cost 1, was 4)
+    ('GREATER_THAN', 1, -2147483648): (1, 4, (('MOV', 0),)),
+    # x GREATER_THAN 2147483647: MOV 0 (cost 1, was 3)
+    ('GREATER_THAN', 2, 2147483647): (1, 3, (('MOV', 0),)),
+    # 2147483647 GREATER_THAN_OR_EQUAL x: MOV 1 (cost 1, was 4)
+    ('GREATER_THAN_OR_EQUAL', 1, 2147483647): (1, 4, (('MOV', 1),)),
+    # x GREATER_THAN_OR_EQUAL -2147483648: MOV 1 (cost 1, was 3)
+    ('GREATER_THAN_OR_EQUAL', 2, -2147483648): (1, 3, (('MOV', 1),)),
+    # 2147483647 LESS_THAN x: MOV 0 (cost 1, was 4)
+    ('LESS_THAN', 1, 2147483647): (1, 4, (('MOV', 0),)),
+    # x LESS_THAN -2147483648: MOV 0 (cost 1, was 3)
+    ('LESS_THAN', 2, -2147483648): (1, 3, (('MOV', 0),)),
+    # -2147483648 LESS_THAN_OR_EQUAL x: MOV 1 (cost 1, was 4)
+    ('LESS_THAN_OR_EQUAL', 1, -2147483648): (1, 4, (('MOV', 1),)),
+    # x LESS_THAN_OR_EQUAL 2147483647: MOV 1 (cost 1, was 3)
+    ('LESS_THAN_OR_EQUAL', 2, 2147483647): (1, 3, (('MOV', 1),)),
+    # x L_SHIFT -2147483648: MOV x (cost 2, was 3)
+    ('L_SHIFT', 2, -2147483648): (2, 3, (('MOV', 'x'),)),
+    # x L_SHIFT 0: MOV x (cost 2, was 3)
+    ('L_SHIFT', 2, 0): (2, 3, (('MOV', 'x'),)),
+    # x L_SHIFT 32: MOV x (cost 2, was 3)
+    ('L_SHIFT', 2, 32): (2, 3, (('MOV', 'x'),)),
+    # x L_SHIFT 64: MOV x (cost 2, was 3)
+    ('L_SHIFT', 2, 64): (2, 3, (('MOV', 'x'),)),
+    # x L_SHIFT 256: MOV x (cost 2, was 3)
+    ('L_SHIFT', 2, 256): (2, 3, (('MOV', 'x'),)),
+    # x L_SHIFT 1024: MOV x (cost 2, was 3)
+    ('L_SHIFT', 2, 1024): (2, 3, (('MOV', 'x'),)),
+    # x L_SHIFT 65536: MOV x (cost 2, was 3)
+    ('L_SHIFT', 2, 65536): (2, 3, (('MOV', 'x'),)),
+    # -2147483648 MULTIPLY x: MOV x; L_SHIFT 31 (cost 3, was 7)
+    ('MULTIPLY', 1, -2147483648): (3, 7, (('MOV', 'x'), ('L_SHIFT', 31))),
+    # -1 MULTIPLY x: MOV x; NEGATION (cost 3, was 7)
+    ('MULTIPLY', 1, -1): (3, 7, (('MOV', 'x'), ('NEGATION',))),
+    # 0 MULTIPLY x: MOV 0 (cost 1, was 7)
+    ('MULTIPLY', 1, 0): (1, 7, (('MOV', 0),)),
+    # 1 MULTIPLY x: MOV x (cost 2, was 7)
+    ('MULTIPLY', 1, 1): (2, 7, (('MOV', 'x'),)),
+    # 2 MULTIPLY x: MOV x; L_SHIFT 1 (cost 3, was 7)
+    ('MULTIPLY', 1, 2): (3, 7, (('MOV', 'x'), ('L_SHIFT', 1))),
+    # 3 MULTIPLY x: MOV x; L_SHIFT 1; ADD x (cost 5, was 7)
+    ('MULTIPLY', 1, 3): (5, 7, (('MOV', 'x'), ('L_SHIFT', 1), ('ADD', 'x'))),
+    # 4 MULTIPLY x: MOV x; L_SHIFT 2 (cost 3, was 7)
+    ('MULTIPLY', 1, 4): (3, 7, (('MOV', 'x'), ('L_SHIFT', 2))),
+    # 8 MULTIPLY x: MOV x; L_SHIFT 3 (cost 3, was 7)
+    ('MULTIPLY', 1, 8): (3, 7, (('MOV', 'x'), ('L_SHIFT', 3))),
+    # 16 MULTIPLY x: MOV x; L_SHIFT 4 (cost 3, was 7)
+    ('MULTIPLY', 1, 16): (3, 7, (('MOV', 'x'), ('L_SHIFT', 4))),
+    # 32 MULTIPLY x: MOV x; L_SHIFT 5 (cost 3, was 7)
+    ('MULTIPLY', 1, 32): (3, 7, (('MOV', 'x'), ('L_SHIFT', 5))),
+    # 64 MULTIPLY x: MOV x; L_SHIFT 6 (cost 3, was 7)
+    ('MULTIPLY', 1, 64): (3, 7, (('MOV', 'x'), ('L_SHIFT', 6))),
+    # 256 MULTIPLY x: MOV x; L_SHIFT 8 (cost 3, was 7)
+    ('MULTIPLY', 1, 256): (3, 7, (('MOV', 'x'), ('L_SHIFT', 8))),
+    # 1024 MULTIPLY x: MOV x; L_SHIFT 10 (cost 3, was 7)
+    ('MULTIPLY', 1, 1024): (3, 7, (('MOV', 'x'), ('L_SHIFT', 10))),
+    # 65536 MULTIPLY x: MOV x; L_SHIFT 16 (cost 3, was 7)
+    ('MULTIPLY', 1, 65536): (3, 7, (('MOV', 'x'), ('L_SHIFT', 16))),
+    # 2147483647 MULTIPLY x: MOV x; L_SHIFT 31; SUBTRACT x (cost 5, was 7)
+    ('MULTIPLY', 1, 2147483647): (5, 7, (('MOV', 'x'), ('L_SHIFT', 31), ('SUBTRACT', 'x'))),
+    # x MULTIPLY -2147483648: MOV x; L_SHIFT 31 (cost 3, was 7)
+    ('MULTIPLY', 2, -2147483648): (3, 7, (('MOV', 'x'), ('L_SHIFT', 31))),
+    # x MULTIPLY -1: MOV x; NEGATION (cost 3, was 7)
+    ('MULTIPLY', 2, -1): (3, 7, (('MOV', 'x'), ('NEGATION',))),
+    # x MULTIPLY 0: MOV 0 (cost 1, was 7)
+    ('MULTIPLY', 2, 0): (1, 7, (('MOV', 0),)),
+    # x MULTIPLY 1: MOV x (cost 2, was 7)
+    ('MULTIPLY', 2, 1): (2, 7, (('MOV', 'x'),)),
+    # x MULTIPLY 2: MOV x; L_SHIFT 1 (cost 3, was 7)
+    ('MULTIPLY', 2, 2): (3, 7, (('MOV', 'x'), ('L_SHIFT', 1))),
+    # x MULTIPLY 3: MOV x; L_SHIFT 1; ADD x (cost 5, was 7)
+    ('MULTIPLY', 2, 3): (5, 7, (('MOV', 'x'), ('L_SHIFT', 1), ('ADD', 'x'))),
+    # x MULTIPLY 4: MOV x; L_SHIFT 2 (cost 3, was 7)
+    ('MULTIPLY', 2, 4): (3, 7, (('MOV', 'x'), ('L_SHIFT', 2))),
+    # x MULTIPLY 8: MOV x; L_SHIFT 3 (cost 3, was 7)
+    ('MULTIPLY', 2, 8): (3, 7, (('MOV', 'x'), ('L_SHIFT', 3))),
+    # x MULTIPLY 16: MOV x; L_SHIFT 4 (cost 3, was 7)
+    ('MULTIPLY', 2, 16): (3, 7, (('MOV', 'x'), ('L_SHIFT', 4))),
+    # x MULTIPLY 32: MOV x; L_SHIFT 5 (cost 3, was 7)
+    ('MULTIPLY', 2, 32): (3, 7, (('MOV', 'x'), ('L_SHIFT', 5))),
+    # x MULTIPLY 64: MOV x; L_SHIFT 6 (cost 3, was 7)
+    ('MULTIPLY', 2, 64): (3, 7, (('MOV', 'x'), ('L_SHIFT', 6))),
+    # x MULTIPLY 256: MOV x; L_SHIFT 8 (cost 3, was 7)
+    ('MULTIPLY', 2, 256): (3, 7, (('MOV', 'x'), ('L_SHIFT', 8))),
+    # x MULTIPLY 1024: MOV x; L_SHIFT 10 (cost 3, was 7)
+    ('MULTIPLY', 2, 1024): (3, 7, (('MOV', 'x'), ('L_SHIFT', 10))),
+    # x MULTIPLY 65536: MOV x; L_SHIFT 16 (cost 3, was 7)
+    ('MULTIPLY', 2, 65536): (3, 7, (('MOV', 'x'), ('L_SHIFT', 16))),
+    # x MULTIPLY 2147483647: MOV x; L_SHIFT 31; SUBTRACT x (cost 5, was 7)
+    ('MULTIPLY', 2, 2147483647): (5, 7, (('MOV', 'x'), ('L_SHIFT', 31), ('SUBTRACT', 'x'))),
+    # x REMAINDER 1: MOV 0 (cost 1, was 30)
+    ('REMAINDER', 2, 1): (1, 30, (('MOV', 0),)),
+    # x REMAINDER 2: MOV x; SET_CC G 0; ADD x; BITWISE_AND -2; SUBTRACT x (cost 10, was 30)
+    ('REMAINDER', 2, 2): (10, 30, (('MOV', 'x'), ('SET_CC', 'G', 0), ('ADD', 'x'), ('BITWISE_AND', -2), ('SUBTRACT', 'x'))),
+    # x R_SHIFT -2147483648: MOV x (cost 2, was 3)
+    ('R_SHIFT', 2, -2147483648): (2, 3, (('MOV', 'x'),)),
+    # x R_SHIFT 0: MOV x (cost 2, was 3)
+    ('R_SHIFT', 2, 0): (2, 3, (('MOV', 'x'),)),
+    # x R_SHIFT 32: MOV x (cost 2, was 3)
+    ('R_SHIFT', 2, 32): (2, 3, (('MOV', 'x'),)),
+    # x R_SHIFT 64: MOV x (cost 2, was 3)
+    ('R_SHIFT', 2, 64): (2, 3, (('MOV', 'x'),)),
+    # x R_SHIFT 256: MOV x (cost 2, was 3)
+    ('R_SHIFT', 2, 256): (2, 3, (('MOV', 'x'),)),
+    # x R_SHIFT 1024: MOV x (cost 2, was 3)
+    ('R_SHIFT', 2, 1024): (2, 3, (('MOV', 'x'),)),
+    # x R_SHIFT 65536: MOV x (cost 2, was 3)
+    ('R_SHIFT', 2, 65536): (2, 3, (('MOV', 'x'),)),
+    # x SUBTRACT 0: MOV x (cost 2, was 3)
+    ('SUBTRACT', 2, 0): (2, 3, (('MOV', 'x'),)),
+}
@@ -1,7 +1,11 @@
-from typing import Any, List, TypeAlias, cast
+from typing import Any, Dict, List, TypeAlias, cast
 
+from src.backend import rewrite_rules
 from src.backend.assembly_ir import *
+from src.backend.layout import INVERTED_CONDITION_CODES, LayoutOptions, layout_function
+from src.middle.ranges import ValueRange, is_boolean
 from src.middle.tacky_ir import *
+from src.utils import instrument
 
 _ALU_BINOPS = {
     TACKYBinaryOpType.ADD: AssemblyBinaryOpType.ADD,
@@ -24,16 +28,75 @@ _CMP_CC = {
 }
 
 
+# Layout of src/backend/rewrite_rules.py that this module understands. A table
+# written for another layout is ignored rather than misread.
+RULE_TABLE_VERSION = 1
+
+
+def _load_rewrites() -> dict:
+    """Rules from tools/superopt.py, keyed by (operator, constant position, constant)."""
+    if rewrite_rules.VERSION != RULE_TABLE_VERSION:
+        return {}
+    return {
+        (TACKYBinaryOpType[op], position, constant): templates
+        for (op, position, constant), (_, _, templates) in rewrite_rules.RULES.items()
+    }
+
+
+_REWRITES = _load_rewrites()
+
+
+def _expand_rewrite(templates: tuple, x: Operand, dst: AssemblyPseudoRegister) -> List:
+    def operand(src):
+        if src == "x":
+            return x
+        if src == "dst":
+            return dst
+        return make_immediate(src)
+
+    instructions: List = []
+    for name, *args in templates:
+        if name == "MOV":
+            instructions.append(AssemblyMov(operand(args[0]), dst))
+        elif name == "SET_CC":
+            cc, k = args
+            instructions.append(AssemblyCompare(make_immediate(k), dst))
+            instructions.append(AssemblyMov(make_immediate(0), dst))
+            instructions.append(AssemblySetConditionCode(AssemblyConditionCode[cc], dst))
+        elif name in AssemblyUnaryOpType.__members__:
+            instructions.append(AssemblyUnary(AssemblyUnaryOpType[name], dst))
+        else:
+            instructions.append(AssemblyBinaryOp(AssemblyBinaryOpType[name], operand(args[0]), dst))
+    return instructions
+
+
+def _rewrite_binary(node: TACKYBinaryOp, dst: AssemblyPseudoRegister) -> List | None:
+    """The rule table's sequence for `node`, if it has one."""
+    op, s1, s2, _ = node
+    if type(s2) is TACKYConstant:
+        templates = _REWRITES.get((op, 2, s2.value))
+        x = s1
+    else:
+        templates = None
+    if templates is None and type(s1) is TACKYConstant:
+        templates = _REWRITES.get((op, 1, s1.value))
+        x = s2
+    # Rules may read x after writing dst.
+    if templates is None or x == node.destination:
+        return None
+    return _expand_rewrite(templates, _visit_value(x), dst)
+
+
 def _visit_value(tacky_value: TACKYValue) -> AssemblyImmediate | AssemblyPseudoRegister:
     if isinstance(tacky_value, TACKYConstant):
-        return AssemblyImmediate(tacky_value.value)
+        return make_immediate(tacky_value.value)
     elif isinstance(tacky_value, TACKYVariable):
-        return AssemblyPseudoRegister(tacky_value.identifier)
+        return make_pseudo_register(tacky_value.identifier)
     raise TypeError(f"Unsupported TACKY value: {type(tacky_value).__name__}")
 
 
-def _visit_unary(node: TACKYUnaryOp) -> List:
-    dst = AssemblyPseudoRegister(node.destination.identifier)
+def _visit_unary(node: TACKYUnaryOp, ranges: Dict[str, ValueRange] | None = None) -> List:
+    dst = make_pseudo_register(node.destination.identifier)
     mov = AssemblyMov(_visit_value(node.source), dst)
 
     match node.unary_operator:
@@ -44,9 +107,13 @@ def _visit_unary(node: TACKYUnaryOp) -> List:
             u = AssemblyUnary(AssemblyUnaryOpType.NEGATION, dst)
 
         case TACKYUnaryOpType.NOT:
+            source = node.source
+            if ranges is not None and type(source) is TACKYVariable and is_boolean(ranges.get(source.identifier)):
+                # !x is x ^ 1 when x is 0 or 1.
+                return [mov, AssemblyBinaryOp(AssemblyBinaryOpType.BITWISE_XOR, make_immediate(1), dst)]
             return [
-                AssemblyCompare(AssemblyImmediate(0), _visit_value(node.source)),
-                AssemblyMov(AssemblyImmediate(0), dst),
+                AssemblyCompare(make_immediate(0), _visit_value(node.source)),
+                AssemblyMov(make_immediate(0), dst),
                 AssemblySetConditionCode(AssemblyConditionCode.E, dst),
             ]
 
@@ -67,9 +134,14 @@ def _emit_alu(s1, s2, dst, op_type) -> List:
 def _visit_binary(node: TACKYBinaryOp) -> List:
     s1 = _visit_value(node.source_1)
     s2 = _visit_value(node.source_2)
-    dst = AssemblyPseudoRegister(node.destination.identifier)
+    dst = make_pseudo_register(node.destination.identifier)
     op = node.binary_operator
 
+    if _REWRITES:
+        rewritten = _rewrite_binary(node, dst)
+        if rewritten is not None:
+            return rewritten
+
     if op in _ALU_BINOPS:
         return _emit_alu(s1, s2, dst, _ALU_BINOPS[op])
 
@@ -91,7 +163,7 @@ def _visit_binary(node: TACKYBinaryOp) -> List:
     if op in _CMP_CC:
         return [
             AssemblyCompare(s2, s1),
-            AssemblyMov(AssemblyImmediate(0), dst),
+            AssemblyMov(make_immediate(0), dst),
             AssemblySetConditionCode(_CMP_CC[op], dst),
         ]
 
@@ -111,13 +183,13 @@ def _visit_jump(
     match tacky_jump:
         case TACKYJumpIfZero(val, target):
             return [
-                AssemblyCompare(AssemblyImmediate(0), _visit_value(val)),
+                AssemblyCompare(make_immediate(0), _visit_value(val)),
                 AssemblyJumpConditionCode(AssemblyConditionCode.E, target),
             ]
 
         case TACKYJumpIfNotZero(val, target):
             return [
-                AssemblyCompare(AssemblyImmediate(0), _visit_value(val)),
+                AssemblyCompare(make_immediate(0), _visit_value(val)),
                 AssemblyJumpConditionCode(AssemblyConditionCode.NE, target),
             ]
 
@@ -136,9 +208,13 @@ def _visit_label(tacky_label: TACKYLabel) -> List:
     return [AssemblyLabel(tacky_label.identifier)]
 
 
-def _visit_instruction(tacky_instr: TACKYInstruction) -> List:
+def _visit_increment_counter(tacky_counter: TACKYIncrementCounter) -> List:
+    return [AssemblyIncrementCounter(tacky_counter.index)]
+
+
+def _visit_instruction(tacky_instr: TACKYInstruction, ranges: Dict[str, ValueRange] | None = None) -> List:
     if isinstance(tacky_instr, TACKYUnaryOp):
-        return _visit_unary(tacky_instr)
+        return _visit_unary(tacky_instr, ranges)
     elif isinstance(tacky_instr, TACKYReturn):
         return _visit_return(tacky_instr)
     elif isinstance(tacky_instr, TACKYBinaryOp):
@@ -152,24 +228,53 @@ def _visit_instruction(tacky_instr: TACKYInstruction) -> List:
         return _visit_copy(tacky_instr)
     elif isinstance(tacky_instr, TACKYLabel):
         return _visit_label(tacky_instr)
+    elif isinstance(tacky_instr, TACKYIncrementCounter):
+        return _visit_increment_counter(tacky_instr)
     else:
         raise NotImplementedError(f"No visit logic in _visit_instruction: {type(tacky_instr).__name__}")
 
 
-def _visit_function(tacky_func: TACKYFunction) -> AssemblyFunction:
+def _fuse_jump(tacky_jump: TACKYInstruction, previous: Any) -> List | None:
+    """A j<cc> on the flags of the comparison that just set the jump's condition, or None.
+
+    A set<cc> leaves the flags of its comparison alone, and the 0 or 1 it
+    stores is nonzero exactly when <cc> holds, so there is no need to compare
+    that value with 0 again.
+    """
+    kind = type(tacky_jump)
+    if kind is not TACKYJumpIfZero and kind is not TACKYJumpIfNotZero:
+        return None
+    if type(previous) is not AssemblySetConditionCode or type(tacky_jump.condition) is not TACKYVariable:
+        return None
+    if previous.operand_1 is not make_pseudo_register(tacky_jump.condition.identifier):
+        return None
+    cond_code = previous.cond_code if kind is TACKYJumpIfNotZero else INVERTED_CONDITION_CODES[previous.cond_code]
+    return [AssemblyJumpConditionCode(cond_code, tacky_jump.target)]
+
+
+def _visit_function(tacky_func: TACKYFunction, ranges: Dict[str, ValueRange] | None = None) -> AssemblyFunction:
     instructions: List = []
     oa = OffsetAllocator()
     for instr in tacky_func.instructions:
-        instructions.extend(_visit_instruction(instr))
+        fused = _fuse_jump(instr, instructions[-1]) if instructions else None
+        instructions.extend(fused or _visit_instruction(instr, ranges))
 
     return AssemblyFunction(tacky_func.identifier, instructions, oa)
 
 
-def _visit_program(tacky_prog: TACKYProgram) -> AssemblyProgram:
-    func = _visit_function(tacky_prog.function_definition)
-    func = _replace_pseudoregisters(func)
-    func = _instruction_fixup(func)
-    return AssemblyProgram(func)
+def _visit_program(
+    tacky_prog: TACKYProgram, layout: LayoutOptions | None = None, ranges: Dict[str, ValueRange] | None = None
+) -> AssemblyProgram:
+    with instrument.stage("select"):
+        func = _visit_function(tacky_prog.function_definition, ranges)
+    with instrument.stage("pseudoregisters"):
+        func = _replace_pseudoregisters(func)
+    with instrument.stage("fixup"):
+        func = _instruction_fixup(func)
+    if layout is not None:
+        with instrument.stage("layout"):
+            func = layout_function(func, layout)
+    return AssemblyProgram(func, tacky_prog.profile)
 
 
 SrcOperand: TypeAlias = AssemblyImmediate | AssemblyRegister | AssemblyStack
@@ -178,7 +283,7 @@ DstOperand: TypeAlias = AssemblyRegister | AssemblyStack
 
 def _stackify(operand: Operand, offsets: OffsetAllocator) -> Operand:
     if isinstance(operand, AssemblyPseudoRegister):
-        return AssemblyStack(offsets[operand.identifier])
+        return make_stack(offsets[operand.identifier])
     return operand
 
 
@@ -248,9 +353,9 @@ def _instruction_fixup(assembly_func: AssemblyFunction) -> AssemblyFunction:
     for instruction in assembly_func.instructions:
         match instruction:
 
-            case AssemblyMov(AssemblyStack(src_off), AssemblyStack(dst_off)):
-                new_instructions.append(AssemblyMov(AssemblyStack(src_off), AssemblyRegister.R10))
-                new_instructions.append(AssemblyMov(AssemblyRegister.R10, AssemblyStack(dst_off)))
+            case AssemblyMov(AssemblyStack() as src, AssemblyStack() as dst):
+                new_instructions.append(AssemblyMov(src, AssemblyRegister.R10))
+                new_instructions.append(AssemblyMov(AssemblyRegister.R10, dst))
 
             case AssemblyIDiv(op) if _is_imm(op):
                 new_instructions.append(AssemblyMov(cast(AssemblyImmediate, op), AssemblyRegister.R10))
@@ -259,8 +364,7 @@ def _instruction_fixup(assembly_func: AssemblyFunction) -> AssemblyFunction:
             case AssemblyBinaryOp(op, src, dst):
                 if op == AssemblyBinaryOpType.MULTIPLY:
                     if _is_mem(dst):
-                        dst_off = cast(AssemblyStack, dst).offset
-                        new_instructions.append(AssemblyMov(AssemblyStack(dst_off), AssemblyRegister.R11))
+                        new_instructions.append(AssemblyMov(dst, AssemblyRegister.R11))
 
                         fixed_src: Operand
                         if _is_mem(src):
@@ -276,7 +380,7 @@ def _instruction_fixup(assembly_func: AssemblyFunction) -> AssemblyFunction:
                                 AssemblyRegister.R11,
                             )
                         )
-                        new_instructions.append(AssemblyMov(AssemblyRegister.R11, AssemblyStack(dst_off)))
+                        new_instructions.append(AssemblyMov(AssemblyRegister.R11, dst))
 
                     else:
                         if _is_mem(src) and _is_mem(dst):
@@ -323,5 +427,12 @@ def _instruction_fixup(assembly_func: AssemblyFunction) -> AssemblyFunction:
     return AssemblyFunction(assembly_func.name, new_instructions, assembly_func.offsets)
 
 
-def convert_TACKY_to_assembly(tacky_prog: TACKYProgram) -> AssemblyProgram:
-    return _visit_program(tacky_prog)
+def convert_TACKY_to_assembly(
+    tacky_prog: TACKYProgram, layout: LayoutOptions | None = None, ranges: Dict[str, ValueRange] | None = None
+) -> AssemblyProgram:
+    """Lowers `tacky_prog`; with `layout`, also reorders its basic blocks (src.backend.layout).
+
+    `ranges` are the value ranges src.middle.ranges found for its variables.
+    With them, !x of a 0 or 1 becomes an xor.
+    """
+    return _visit_program(tacky_prog, layout, ranges)
@@ -0,0 +1,36 @@
+import sys
+from typing import NamedTuple
+
+
+class Target(NamedTuple):
+    """Object-format conventions the emitter needs to write host assembly in one pass."""
+
+    name: str
+    # Prefix of C-level symbols (`main` is `_main` on Mach-O).
+    symbol_prefix: str
+    # Prefix of assembler-local labels, which never reach the symbol table.
+    local_label_prefix: str
+    text_section: str
+    # Emit `.section .note.GNU-stack` so the linker keeps the stack non-executable.
+    note_gnu_stack: bool
+
+
+ELF = Target(
+    name="elf",
+    symbol_prefix="",
+    local_label_prefix=".L",
+    text_section=".text",
+    note_gnu_stack=True,
+)
+
+MACH_O = Target(
+    name="mach-o",
+    symbol_prefix="_",
+    local_label_prefix="L",
+    text_section=".text",
+    note_gnu_stack=False,
+)
+
+TARGETS = {target.name: target for target in (ELF, MACH_O)}
+
+HOST_TARGET = MACH_O if sys.platform == "darwin" else ELF
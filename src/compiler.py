@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+from typing import Any, List, NamedTuple
+
+# In pipeline order. Each stage also runs every stage before it, except that
+# "validate" is only run when requested (the later stages use the parsed AST).
+STAGES = ("lex", "parse", "validate", "tacky", "codegen", "assembly", "object")
+
+
+class CompileOptions(NamedTuple):
+    # Object-format conventions (src.backend.target); None selects the host's.
+    target: Any = None
+    # Replace main() with its result when the TACKY interpreter can compute it
+    # within `step_budget` instructions (None for the interpreter's default).
+    evaluate: bool = False
+    step_budget: int | None = None
+    # Count basic blocks and write them to this file when the program exits.
+    instrument: str | None = None
+    # Lay out branches for the counts in this profile. One that does not match
+    # the program is ignored with a warning, as a build without it.
+    profile: str | None = None
+    # Reorder basic blocks for fall-through (src.backend.layout), using the
+    # profile's counts when there is one; align_targets implies layout_blocks.
+    layout_blocks: bool = False
+    align_targets: bool = False
+    # Simplify main() for the value ranges of its variables (src.middle.ranges)
+    # and let instruction selection use them.
+    value_ranges: bool = False
+
+
+class CompileResult(NamedTuple):
+    stage: str
+    tokens: List[Any] | None = None
+    ast: Any = None
+    resolved_ast: Any = None
+    tacky: Any = None
+    assembly_ir: Any = None
+    assembly: str | None = None
+    object: bytes | None = None
+
+
+def compile_source(text: str, *, stage: str = "assembly", options: CompileOptions | None = None) -> CompileResult:
+    """Compiles C source in memory, stopping after `stage`.
+
+    Returns every intermediate result up to that stage. Errors surface as the
+    exceptions the stages raise (SyntaxError for malformed programs,
+    NotImplementedError for unsupported constructs). The "object" stage raises
+    NotImplementedError if the program needs the external assembler.
+    """
+    if stage not in STAGES:
+        raise ValueError(f"Unknown stage '{stage}' (expected one of {', '.join(STAGES)})")
+    options = options or CompileOptions()
+    if options.target is None:
+        from src.backend.target import HOST_TARGET
+
+        target = HOST_TARGET
+    else:
+        target = options.target
+    last = STAGES.index(stage)
+    fields: dict = {"stage": stage}
+
+    def reached(name: str) -> bool:
+        return last >= STAGES.index(name)
+
+    from src.frontend.lexer import lex
+
+    fields["tokens"] = tokens = list(lex(text))
+    if reached("parse"):
+        from src.frontend.parser import parse_program
+
+        fields["ast"] = ast = parse_program(tokens)
+    if stage == "validate":
+        from src.semantic.resolver import resolve_program
+
+        fields["resolved_ast"] = resolve_program(ast)
+        return CompileResult(**fields)
+    if reached("tacky"):
+        from src.middle.tacky import convert_AST_to_TACKY, reset_counters
+
+        # Number temporaries and labels the same way for every call.
+        reset_counters()
+        tacky = block_counts = None
+        if options.profile is not None and options.instrument is None:
+            from src.middle.profile import ProfileError, convert_with_profile, read_profile
+
+            try:
+                tacky, block_counts = convert_with_profile(ast, read_profile(options.profile))
+            except ProfileError as exc:
+                import warnings
+
+                warnings.warn(f"ignoring profile {options.profile}: {exc}", stacklevel=2)
+                reset_counters()
+        if tacky is None:
+            tacky = convert_AST_to_TACKY(ast)
+        if options.instrument is not None:
+            from src.middle.profile import instrument_program
+
+            tacky = instrument_program(tacky, options.instrument)
+        ranges = None
+        if options.value_ranges:
+            from src.middle.ranges import simplify_program
+
+            tacky, ranges = simplify_program(tacky)
+        fields["tacky"] = tacky
+        if options.evaluate:
+            from src.middle.interpreter import DEFAULT_STEP_BUDGET, evaluate_program
+
+            budget = DEFAULT_STEP_BUDGET if options.step_budget is None else options.step_budget
+            fields["tacky"] = tacky = evaluate_program(tacky, budget)
+    if reached("codegen"):
+        from src.backend.assembly_ir import clear_interned_operands
+        from src.backend.layout import LayoutOptions
+        from src.backend.tacky2asm import convert_TACKY_to_assembly
+
+        # As reset_counters does for TACKY values, so repeated calls do not keep every file's operands.
+        clear_interned_operands()
+
+        layout = None
+        if options.layout_blocks or options.align_targets:
+            layout = LayoutOptions(block_counts, options.align_targets)
+        fields["assembly_ir"] = asm_ir = convert_TACKY_to_assembly(tacky, layout, ranges)
+    if reached("assembly"):
+        fields["assembly"] = emit_assembly_text(asm_ir, target)
+    if reached("object"):
+        from src.backend.elf import build_elf_object
+        from src.backend.encoder import encode_program
+
+        if target.name != "elf":
+            raise NotImplementedError(f"Objects can only be written for ELF, not {target.name}")
+        encoded = encode_program(asm_ir, target.local_label_prefix)
+        fields["object"] = build_elf_object(encoded, note_gnu_stack=target.note_gnu_stack)
+    return CompileResult(**fields)
+
+
+def emit_assembly_text(asm_ir, target) -> str:
+    import io
+
+    from src.backend.codegen import write_assembly
+
+    out = io.StringIO()
+    write_assembly(asm_ir, out, target)
+    return out.getvalue()
+
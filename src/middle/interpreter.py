@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, List
+
+from src.middle.tacky_ir import *
+
+# Executes TACKY directly, with the 32-bit semantics of the code the backend
+# emits for x86-64: arithmetic wraps around, shift counts are masked to five
+# bits as `sall`/`sarl` do, `>>` is arithmetic, and division by zero or
+# INT_MIN / -1 traps (raised here as ZeroDivisionError and OverflowError, both
+# ArithmeticError). Falling off the end of a function returns 0, as main does.
+
+INT_MIN = -(2**31)
+
+# Instructions executed before evaluate_program() gives up and keeps the code.
+DEFAULT_STEP_BUDGET = 1_000_000
+
+
+class StepLimitExceeded(RuntimeError):
+    pass
+
+
+def wrap32(value: int) -> int:
+    """`value` reduced to a signed 32-bit integer."""
+    return ((value - INT_MIN) & 0xFFFFFFFF) + INT_MIN
+
+
+def _divide(a: int, b: int) -> int:
+    if b == 0:
+        raise ZeroDivisionError("integer division by zero")
+    if a == INT_MIN and b == -1:
+        raise OverflowError("INT_MIN / -1 overflows")
+    quotient = abs(a) // abs(b)
+    # C division truncates toward zero.
+    return -quotient if (a < 0) != (b < 0) else quotient
+
+
+def _remainder(a: int, b: int) -> int:
+    return a - b * _divide(a, b)
+
+
+UNARY_OPS: Dict[TACKYUnaryOpType, Callable[[int], int]] = {
+    TACKYUnaryOpType.COMPLEMENT: lambda a: ~a,
+    TACKYUnaryOpType.NEGATION: lambda a: wrap32(-a),
+    TACKYUnaryOpType.NOT: lambda a: int(a == 0),
+}
+
+BINARY_OPS: Dict[TACKYBinaryOpType, Callable[[int, int], int]] = {
+    TACKYBinaryOpType.ADD: lambda a, b: wrap32(a + b),
+    TACKYBinaryOpType.SUBTRACT: lambda a, b: wrap32(a - b),
+    TACKYBinaryOpType.MULTIPLY: lambda a, b: wrap32(a * b),
+    TACKYBinaryOpType.DIVIDE: _divide,
+    TACKYBinaryOpType.REMAINDER: _remainder,
+    TACKYBinaryOpType.BITWISE_AND: lambda a, b: a & b,
+    TACKYBinaryOpType.BITWISE_OR: lambda a, b: a | b,
+    TACKYBinaryOpType.BITWISE_XOR: lambda a, b: a ^ b,
+    TACKYBinaryOpType.L_SHIFT: lambda a, b: wrap32(a << (b & 31)),
+    TACKYBinaryOpType.R_SHIFT: lambda a, b: a >> (b & 31),
+    TACKYBinaryOpType.LOGICAL_AND: lambda a, b: int(a != 0 and b != 0),
+    TACKYBinaryOpType.LOGICAL_OR: lambda a, b: int(a != 0 or b != 0),
+    TACKYBinaryOpType.EQUAL: lambda a, b: int(a == b),
+    TACKYBinaryOpType.NOT_EQUAL: lambda a, b: int(a != b),
+    TACKYBinaryOpType.LESS_THAN: lambda a, b: int(a < b),
+    TACKYBinaryOpType.LESS_THAN_OR_EQUAL: lambda a, b: int(a <= b),
+    TACKYBinaryOpType.GREATER_THAN: lambda a, b: int(a > b),
+    TACKYBinaryOpType.GREATER_THAN_OR_EQUAL: lambda a, b: int(a >= b),
+}
+
+
+def _label_positions(instructions: List[TACKYInstruction]) -> Dict[str, int]:
+    positions = {}
+    for i, instr in enumerate(instructions):
+        if type(instr) is TACKYLabel:
+            if instr.identifier in positions:
+                raise ValueError(f"Duplicate label '{instr.identifier}'")
+            positions[instr.identifier] = i
+    return positions
+
+
+def run_function(func: TACKYFunction, max_steps: int | None = None) -> int:
+    """Executes `func` and returns its result.
+
+    Raises ArithmeticError where the compiled code would trap, NameError when a
+    variable is read before it is written, and StepLimitExceeded after
+    `max_steps` instructions.
+    """
+    instructions = func.instructions
+    labels = _label_positions(instructions)
+    env: Dict[str, int] = {}
+
+    def read(value: TACKYValue) -> int:
+        if type(value) is TACKYConstant:
+            return wrap32(value.value)
+        try:
+            return env[value.identifier]
+        except KeyError:
+            raise NameError(f"TACKY variable '{value.identifier}' read before it was written") from None
+
+    def jump(target: str) -> int:
+        try:
+            return labels[target]
+        except KeyError:
+            raise ValueError(f"Jump to undefined label '{target}'") from None
+
+    pc = 0
+    steps = 0
+    end = len(instructions)
+    while pc < end:
+        if max_steps is not None and steps >= max_steps:
+            raise StepLimitExceeded(f"{func.identifier} did not return within {max_steps} steps")
+        steps += 1
+        instr = instructions[pc]
+        pc += 1
+        kind = type(instr)
+        if kind is TACKYBinaryOp:
+            env[instr.destination.identifier] = BINARY_OPS[instr.binary_operator](
+                read(instr.source_1), read(instr.source_2)
+            )
+        elif kind is TACKYUnaryOp:
+            env[instr.destination.identifier] = UNARY_OPS[instr.unary_operator](read(instr.source))
+        elif kind is TACKYCopy:
+            env[instr.dst.identifier] = read(instr.src)
+        elif kind is TACKYJumpIfZero:
+            if read(instr.condition) == 0:
+                pc = jump(instr.target)
+        elif kind is TACKYJumpIfNotZero:
+            if read(instr.condition) != 0:
+                pc = jump(instr.target)
+        elif kind is TACKYJump:
+            pc = jump(instr.target)
+        elif kind is TACKYReturn:
+            return read(instr.value)
+        elif kind is not TACKYLabel and kind is not TACKYIncrementCounter:
+            raise NotImplementedError(f"No interpreter logic for {kind.__name__}")
+    return 0
+
+
+def run_program(prog: TACKYProgram, max_steps: int | None = None) -> int:
+    """Runs main() and returns its result, like the exit status of the compiled program before truncation."""
+    return run_function(prog.function_definition, max_steps)
+
+
+def evaluate_program(prog: TACKYProgram, max_steps: int = DEFAULT_STEP_BUDGET) -> TACKYProgram:
+    """Collapses main() to `return <constant>` when running it at compile time succeeds.
+
+    main() takes no input, so its result is fixed. Programs that trap, read an
+    uninitialized variable or run past `max_steps` are returned unchanged, so
+    they still behave the same way at run time. So are --instrument builds,
+    whose block counters have to run for the profile to mean anything.
+    """
+    if prog.profile is not None:
+        return prog
+    func = prog.function_definition
+    try:
+        value = run_function(func, max_steps)
+    except (ArithmeticError, NameError, StepLimitExceeded):
+        return prog
+    return prog._replace(function_definition=TACKYFunction(func.identifier, [TACKYReturn(make_constant(value))]))
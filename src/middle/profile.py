@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import struct
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Set, Tuple
+
+from src.middle.tacky_ir import *
+
+# Profile-guided optimization. An --instrument build counts how often each
+# basic block of main() runs and writes the counts to a profile file when the
+# program exits; a --use-profile build reads them back and lowers && and ||
+# so that the usual outcome of their first operand falls through, and passes
+# the counts on to the block layout pass (src.backend.layout) by label.
+#
+# Blocks are numbered in the order of the TACKY that convert_AST_to_TACKY
+# produces without a profile, and the profile records a checksum of that TACKY.
+# A profile taken from a different version of the program (or of the compiler)
+# is rejected rather than applied to the wrong blocks.
+#
+# The file format is defined next to TACKYProfileHeader in src.middle.tacky_ir,
+# which the backend also writes it from.
+
+
+class ProfileError(ValueError):
+    pass
+
+
+class Profile(NamedTuple):
+    checksum: int
+    counts: List[int]
+
+
+def default_profile_path(source: Path) -> Path:
+    """Where a program compiled from `source` writes its profile unless told otherwise."""
+    return source.resolve().with_suffix(".profile")
+
+
+def basic_blocks(instructions: List[TACKYInstruction]) -> List[Tuple[int, int]]:
+    """(start, end) of each basic block, in instruction order.
+
+    A block starts at a label or after a jump or return, so only its first
+    instruction is ever jumped to and all of it runs whenever it is entered.
+    """
+    blocks: List[Tuple[int, int]] = []
+    start = 0
+    for i, instr in enumerate(instructions):
+        kind = type(instr)
+        if kind is TACKYLabel and i > start:
+            blocks.append((start, i))
+            start = i
+        elif kind in (TACKYJump, TACKYJumpIfZero, TACKYJumpIfNotZero, TACKYReturn):
+            blocks.append((start, i + 1))
+            start = i + 1
+    if start < len(instructions):
+        blocks.append((start, len(instructions)))
+    return blocks
+
+
+def checksum(func: TACKYFunction) -> int:
+    """A 64-bit digest of `func`, which identifies the blocks a profile's counts belong to."""
+    import hashlib
+
+    return int.from_bytes(hashlib.blake2b(repr(func).encode(), digest_size=8).digest(), "little")
+
+
+def instrument_program(prog: TACKYProgram, path: str | Path) -> TACKYProgram:
+    """`prog` with a counter at the start of every basic block, written to `path` when the program exits."""
+    func = prog.function_definition
+    instructions: List[TACKYInstruction] = []
+    blocks = basic_blocks(func.instructions)
+    for index, (start, end) in enumerate(blocks):
+        # Labels stay first so that jumps to the block are counted too.
+        if type(func.instructions[start]) is TACKYLabel:
+            instructions.append(func.instructions[start])
+            start += 1
+        instructions.append(TACKYIncrementCounter(index))
+        instructions.extend(func.instructions[start:end])
+    header = TACKYProfileHeader(str(path), checksum(func), len(blocks))
+    return TACKYProgram(TACKYFunction(func.identifier, instructions), header)
+
+
+def read_profile(path: str | Path) -> Profile:
+    """Raises ProfileError if `path` cannot be read or is not a profile."""
+    try:
+        data = Path(path).read_bytes()
+    except OSError as exc:
+        raise ProfileError(f"cannot read it: {exc.strerror}") from None
+    if len(data) < PROFILE_HEADER.size:
+        raise ProfileError("not a profile")
+    magic, version, counters, digest = PROFILE_HEADER.unpack_from(data)
+    if magic != PROFILE_MAGIC:
+        raise ProfileError("not a profile")
+    if version != PROFILE_VERSION:
+        raise ProfileError(f"version {version} profile, expected version {PROFILE_VERSION}")
+    if len(data) != PROFILE_HEADER.size + 8 * counters:
+        raise ProfileError("truncated")
+    return Profile(digest, list(struct.unpack_from(f"<{counters}Q", data, PROFILE_HEADER.size)))
+
+
+def likely_taken(func: TACKYFunction, counts: List[int]) -> Set[str]:
+    """Targets of conditional jumps that the profile shows are taken more often than not.
+
+    Only the first jump to each target is considered; that is the one that
+    decides whether the second operand of && or || runs. The block after a
+    conditional jump is only entered by falling through, so its count is the
+    number of times the jump was not taken.
+    """
+    taken: Set[str] = set()
+    seen: Set[str] = set()
+    blocks = basic_blocks(func.instructions)
+    for index, (_, end) in enumerate(blocks[:-1]):
+        last = func.instructions[end - 1]
+        if type(last) not in (TACKYJumpIfZero, TACKYJumpIfNotZero) or last.target in seen:
+            continue
+        seen.add(last.target)
+        if counts[index + 1] * 2 < counts[index]:
+            taken.add(last.target)
+    return taken
+
+
+def label_counts(func: TACKYFunction, counts: List[int], taken: Set[str]) -> Dict[str, int]:
+    """Counts of the blocks of `func` by label, with the function's name for its entry block.
+
+    Also covers the out-of-line second operands of the && and || that
+    convert_AST_to_TACKY lays out for the branches in `taken`.
+    """
+    from src.middle.tacky import rhs_label
+
+    by_label: Dict[str, int] = {}
+    blocks = basic_blocks(func.instructions)
+    if blocks:
+        by_label[func.identifier] = counts[0]
+    for index, (start, end) in enumerate(blocks):
+        first, last = func.instructions[start], func.instructions[end - 1]
+        if type(first) is TACKYLabel:
+            by_label[first.identifier] = counts[index]
+        if type(last) in (TACKYJumpIfZero, TACKYJumpIfNotZero) and last.target in taken:
+            # The first jump to the target is the one whose fall-through block was moved.
+            by_label.setdefault(rhs_label(last.target), counts[index + 1])
+    return by_label
+
+
+def convert_with_profile(ast: Any, profile: Profile) -> Tuple[TACKYProgram, Dict[str, int]]:
+    """TACKY for `ast` laid out for the branch outcomes recorded in `profile`, and its block counts by label.
+
+    Raises ProfileError if the profile was taken from a different program.
+    """
+    from src.middle.tacky import convert_AST_to_TACKY, reset_counters
+
+    reset_counters()
+    baseline = convert_AST_to_TACKY(ast)
+    func = baseline.function_definition
+    if profile.checksum != checksum(func) or len(profile.counts) != len(basic_blocks(func.instructions)):
+        raise ProfileError("taken from a different program")
+    taken = likely_taken(func, profile.counts)
+    # Same numbering for the second conversion, so the labels the profile names are the same.
+    reset_counters()
+    return convert_AST_to_TACKY(ast, taken), label_counts(func, profile.counts, taken)
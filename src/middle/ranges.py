@@ -0,0 +1,471 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Set, Tuple
+
+from src.middle.interpreter import BINARY_OPS, INT_MIN, UNARY_OPS, wrap32
+from src.middle.profile import basic_blocks
+from src.middle.tacky_ir import *
+
+# Value range analysis. Every variable of main() gets an interval of the
+# signed 32-bit values it can hold and the bits of its two's complement
+# pattern that are known to be 0 or 1. The analysis follows only the branches
+# that can be taken, so the assignments in code it proves unreachable do not
+# widen the ranges.
+#
+# Ranges are per variable, not per program point. TACKY temporaries are
+# assigned once, except that the result of && and || is first set to 0 and
+# then possibly to 1, so little is lost. A variable whose range keeps growing
+# is given up on after WIDEN_AFTER changes, which bounds the work on loops.
+#
+# simplify_program() uses the ranges to drop unreachable blocks, decide
+# conditional jumps and comparisons, and replace variables known to hold a
+# single value by that constant, then drop the instructions whose results are
+# no longer read. Divisions are only rewritten when their
+# ranges show they cannot trap, so a program that divides by zero still does.
+# The ranges are also returned for instruction selection (src.backend.tacky2asm).
+
+INT_MAX = 2**31 - 1
+MASK = 0xFFFFFFFF
+SIGN_BIT = 1 << 31
+
+# Changes to a variable's range before it is assumed to hold any value.
+WIDEN_AFTER = 8
+
+
+class ValueRange(NamedTuple):
+    lo: int
+    hi: int
+    # Bits of the 32-bit pattern known to be 0 and known to be 1.
+    zeros: int = 0
+    ones: int = 0
+
+
+def _normalize(lo: int, hi: int, zeros: int = 0, ones: int = 0) -> ValueRange:
+    """A range with the interval and the known bits each tightened by the other."""
+    # Values of the same sign share the bits above the highest one in which lo and hi differ.
+    if (lo < 0) == (hi < 0):
+        common = MASK & ~((1 << ((lo ^ hi) & MASK).bit_length()) - 1)
+        ones |= lo & common
+        zeros |= ~lo & common
+    zeros &= MASK
+    ones &= MASK
+    # With the sign bit known, the known bits bound the value.
+    if zeros & SIGN_BIT:
+        lo, hi = max(lo, ones), min(hi, MASK & ~zeros)
+    elif ones & SIGN_BIT:
+        lo, hi = max(lo, ones - 2**32), min(hi, (MASK & ~zeros) - 2**32)
+    assert lo <= hi, f"empty range [{lo}, {hi}]"
+    return ValueRange(lo, hi, zeros, ones)
+
+
+FULL = ValueRange(INT_MIN, INT_MAX)
+BOOLEAN = _normalize(0, 1)
+
+
+def constant_range(value: int) -> ValueRange:
+    return _normalize(value, value)
+
+
+def join(a: ValueRange, b: ValueRange) -> ValueRange:
+    """The smallest range holding every value of `a` and of `b`."""
+    return ValueRange(min(a.lo, b.lo), max(a.hi, b.hi), a.zeros & b.zeros, a.ones & b.ones)
+
+
+def contains(r: ValueRange, value: int) -> bool:
+    pattern = value & MASK
+    return r.lo <= value <= r.hi and not (pattern & r.zeros) and not (~pattern & r.ones)
+
+
+def singleton(r: ValueRange | None) -> int | None:
+    """The only value in `r`, if there is just one."""
+    return r.lo if r is not None and r.lo == r.hi else None
+
+
+def is_boolean(r: ValueRange | None) -> bool:
+    return r is not None and 0 <= r.lo and r.hi <= 1
+
+
+def _low_zeros(r: ValueRange) -> int:
+    """Number of low bits known to be 0."""
+    return ((r.zeros ^ (r.zeros + 1)) >> 1).bit_length()
+
+
+def _arithmetic(lo: int, hi: int, low_zeros: int) -> ValueRange:
+    # Wrapping around keeps the low bits but says nothing about the interval.
+    if lo < INT_MIN or hi > INT_MAX:
+        lo, hi = INT_MIN, INT_MAX
+    return _normalize(lo, hi, (1 << min(low_zeros, 32)) - 1)
+
+
+def _truncating_divide(a: int, b: int) -> int:
+    quotient = abs(a) // abs(b)
+    return -quotient if (a < 0) != (b < 0) else quotient
+
+
+def _nonzero_divisors(b: ValueRange) -> List[Tuple[int, int]]:
+    """The negative and positive parts of the divisor range, without 0."""
+    parts = []
+    if b.lo <= -1:
+        parts.append((b.lo, min(b.hi, -1)))
+    if b.hi >= 1:
+        parts.append((max(b.lo, 1), b.hi))
+    return parts
+
+
+def may_trap(op: TACKYBinaryOpType, a: ValueRange, b: ValueRange) -> bool:
+    """Whether `op` can raise a division error for operands in `a` and `b`."""
+    if op not in (TACKYBinaryOpType.DIVIDE, TACKYBinaryOpType.REMAINDER):
+        return False
+    return contains(b, 0) or (contains(a, INT_MIN) and contains(b, -1))
+
+
+def _compare(op: TACKYBinaryOpType, a: ValueRange, b: ValueRange) -> int | None:
+    """The result of comparison `op` when the ranges decide it."""
+    match op:
+        case TACKYBinaryOpType.LESS_THAN:
+            return 1 if a.hi < b.lo else 0 if a.lo >= b.hi else None
+        case TACKYBinaryOpType.LESS_THAN_OR_EQUAL:
+            return 1 if a.hi <= b.lo else 0 if a.lo > b.hi else None
+        case TACKYBinaryOpType.GREATER_THAN:
+            return _compare(TACKYBinaryOpType.LESS_THAN, b, a)
+        case TACKYBinaryOpType.GREATER_THAN_OR_EQUAL:
+            return _compare(TACKYBinaryOpType.LESS_THAN_OR_EQUAL, b, a)
+        case TACKYBinaryOpType.EQUAL:
+            if a.lo == a.hi == b.lo == b.hi:
+                return 1
+            if a.hi < b.lo or b.hi < a.lo or a.ones & b.zeros or a.zeros & b.ones:
+                return 0
+            return None
+        case TACKYBinaryOpType.NOT_EQUAL:
+            equal = _compare(TACKYBinaryOpType.EQUAL, a, b)
+            return None if equal is None else 1 - equal
+    return None
+
+
+def _truth(r: ValueRange) -> int | None:
+    """1 if `r` excludes 0, 0 if it holds only 0."""
+    if not contains(r, 0):
+        return 1
+    return 0 if r.lo == r.hi == 0 else None
+
+
+def unary_range(op: TACKYUnaryOpType, a: ValueRange) -> ValueRange:
+    if a.lo == a.hi:
+        return constant_range(UNARY_OPS[op](a.lo))
+    match op:
+        case TACKYUnaryOpType.COMPLEMENT:
+            return _normalize(~a.hi, ~a.lo, a.ones, a.zeros)
+        case TACKYUnaryOpType.NEGATION:
+            if a.lo == INT_MIN:
+                return _arithmetic(INT_MIN, INT_MAX, _low_zeros(a))
+            return _arithmetic(-a.hi, -a.lo, _low_zeros(a))
+        case TACKYUnaryOpType.NOT:
+            truth = _truth(a)
+            return BOOLEAN if truth is None else constant_range(1 - truth)
+    raise TypeError(f"Unsupported unary operator: {op!r}")
+
+
+def binary_range(op: TACKYBinaryOpType, a: ValueRange, b: ValueRange) -> ValueRange | None:
+    """The range of `a op b`, or None when it always traps."""
+    if a.lo == a.hi and b.lo == b.hi:
+        try:
+            return constant_range(BINARY_OPS[op](a.lo, b.lo))
+        except ArithmeticError:
+            return None
+    match op:
+        case TACKYBinaryOpType.ADD:
+            return _arithmetic(a.lo + b.lo, a.hi + b.hi, min(_low_zeros(a), _low_zeros(b)))
+        case TACKYBinaryOpType.SUBTRACT:
+            return _arithmetic(a.lo - b.hi, a.hi - b.lo, min(_low_zeros(a), _low_zeros(b)))
+        case TACKYBinaryOpType.MULTIPLY:
+            corners = [x * y for x in (a.lo, a.hi) for y in (b.lo, b.hi)]
+            return _arithmetic(min(corners), max(corners), _low_zeros(a) + _low_zeros(b))
+        case TACKYBinaryOpType.DIVIDE:
+            # Monotonic in each operand while the divisor keeps its sign.
+            parts = _nonzero_divisors(b)
+            if not parts:
+                return None
+            corners = [_truncating_divide(x, y) for x in (a.lo, a.hi) for part in parts for y in part]
+            return _arithmetic(min(corners), max(corners), 0)
+        case TACKYBinaryOpType.REMAINDER:
+            parts = _nonzero_divisors(b)
+            if not parts:
+                return None
+            # The result has the dividend's sign and is smaller than the divisor in magnitude.
+            bound = max(abs(y) for part in parts for y in part) - 1
+            return _normalize(max(a.lo, -bound) if a.lo < 0 else 0, min(a.hi, bound) if a.hi > 0 else 0)
+        case TACKYBinaryOpType.BITWISE_AND:
+            lo, hi = INT_MIN, INT_MAX
+            if a.lo >= 0 or b.lo >= 0:
+                lo, hi = 0, min(r.hi for r in (a, b) if r.lo >= 0)
+            return _normalize(lo, hi, a.zeros | b.zeros, a.ones & b.ones)
+        case TACKYBinaryOpType.BITWISE_OR:
+            return _normalize(INT_MIN, INT_MAX, a.zeros & b.zeros, a.ones | b.ones)
+        case TACKYBinaryOpType.BITWISE_XOR:
+            known = (a.zeros | a.ones) & (b.zeros | b.ones)
+            ones = (a.ones ^ b.ones) & known
+            return _normalize(INT_MIN, INT_MAX, known & ~ones, ones)
+        case TACKYBinaryOpType.L_SHIFT:
+            if b.lo != b.hi:
+                # Shifting left only adds zeros at the bottom.
+                return _arithmetic(INT_MIN, INT_MAX, _low_zeros(a))
+            k = b.lo & 31
+            return _normalize(
+                *((a.lo << k, a.hi << k) if INT_MIN <= a.lo << k and a.hi << k <= INT_MAX else (INT_MIN, INT_MAX)),
+                (a.zeros << k) | ((1 << k) - 1),
+                a.ones << k,
+            )
+        case TACKYBinaryOpType.R_SHIFT:
+            # Counts are masked to five bits; >> moves values toward 0 or -1.
+            low, high = (b.lo, b.hi) if 0 <= b.lo and b.hi <= 31 else (0, 31)
+            return _normalize(min(a.lo >> low, a.lo >> high), max(a.hi >> low, a.hi >> high))
+        case TACKYBinaryOpType.LOGICAL_AND | TACKYBinaryOpType.LOGICAL_OR:
+            truths = (_truth(a), _truth(b))
+            if op is TACKYBinaryOpType.LOGICAL_AND:
+                result = 0 if 0 in truths else 1 if truths == (1, 1) else None
+            else:
+                result = 1 if 1 in truths else 0 if truths == (0, 0) else None
+            return BOOLEAN if result is None else constant_range(result)
+    result = _compare(op, a, b)
+    return BOOLEAN if result is None else constant_range(result)
+
+
+class _Function:
+    """main()'s basic blocks, with what jumps where and which blocks read each variable."""
+
+    def __init__(self, func: TACKYFunction) -> None:
+        self.instructions = func.instructions
+        self.blocks = basic_blocks(func.instructions)
+        self.block_of_label: Dict[str, int] = {}
+        self.readers: Dict[str, Set[int]] = defaultdict(set)
+        for index, (start, end) in enumerate(self.blocks):
+            first = func.instructions[start]
+            if type(first) is TACKYLabel:
+                self.block_of_label[first.identifier] = index
+            for instr in func.instructions[start:end]:
+                for value in _sources(instr):
+                    if type(value) is TACKYVariable:
+                        self.readers[value.identifier].add(index)
+
+
+def _sources(instr: TACKYInstruction) -> Tuple[TACKYValue, ...]:
+    kind = type(instr)
+    if kind is TACKYBinaryOp:
+        return instr.source_1, instr.source_2
+    if kind is TACKYUnaryOp:
+        return (instr.source,)
+    if kind is TACKYCopy:
+        return (instr.src,)
+    if kind is TACKYReturn:
+        return (instr.value,)
+    if kind is TACKYJumpIfZero or kind is TACKYJumpIfNotZero:
+        return (instr.condition,)
+    return ()
+
+
+def _read(value: TACKYValue, ranges: Dict[str, ValueRange]) -> ValueRange | None:
+    if type(value) is TACKYConstant:
+        # Constants are reduced to 32 bits as the interpreter and movl do.
+        return constant_range(wrap32(value.value))
+    return ranges.get(value.identifier)
+
+
+def _result(instr: TACKYInstruction, ranges: Dict[str, ValueRange]) -> ValueRange | None:
+    """The range of the value `instr` writes, or None while an operand has no range or when it always traps."""
+    kind = type(instr)
+    if kind is TACKYCopy:
+        return _read(instr.src, ranges)
+    if kind is TACKYUnaryOp:
+        a = _read(instr.source, ranges)
+        return None if a is None else unary_range(instr.unary_operator, a)
+    a, b = _read(instr.source_1, ranges), _read(instr.source_2, ranges)
+    return None if a is None or b is None else binary_range(instr.binary_operator, a, b)
+
+
+def _successors(fn: _Function, index: int, ranges: Dict[str, ValueRange]) -> List[int]:
+    """The blocks control can go to from block `index`."""
+    last = fn.instructions[fn.blocks[index][1] - 1]
+    kind = type(last)
+    fall = [index + 1] if index + 1 < len(fn.blocks) else []
+    if kind is TACKYReturn:
+        return []
+    if kind is TACKYJump:
+        return [fn.block_of_label[last.target]]
+    if kind is TACKYJumpIfZero or kind is TACKYJumpIfNotZero:
+        condition = _read(last.condition, ranges)
+        truth = None if condition is None else _truth(condition)
+        if truth is None:
+            return [fn.block_of_label[last.target], *fall]
+        return [fn.block_of_label[last.target]] if truth == (kind is TACKYJumpIfNotZero) else fall
+    return fall
+
+
+def _analyze(fn: _Function) -> Tuple[Dict[str, ValueRange], List[bool]]:
+    ranges: Dict[str, ValueRange] = {}
+    changes: Dict[str, int] = defaultdict(int)
+    reachable = [False] * len(fn.blocks)
+    queued = [False] * len(fn.blocks)
+    worklist: List[int] = []
+
+    def visit(index: int) -> None:
+        reachable[index] = True
+        if not queued[index]:
+            queued[index] = True
+            worklist.append(index)
+
+    if fn.blocks:
+        visit(0)
+    while worklist:
+        index = worklist.pop()
+        queued[index] = False
+        start, end = fn.blocks[index]
+        for instr in fn.instructions[start:end]:
+            kind = type(instr)
+            if kind is not TACKYBinaryOp and kind is not TACKYUnaryOp and kind is not TACKYCopy:
+                continue
+            result = _result(instr, ranges)
+            if result is None:
+                continue
+            name = instr.dst.identifier if kind is TACKYCopy else instr.destination.identifier
+            old = ranges.get(name)
+            new = result if old is None else join(old, result)
+            if new == old:
+                continue
+            changes[name] += 1
+            ranges[name] = new if changes[name] < WIDEN_AFTER else FULL
+            for reader in fn.readers[name]:
+                if reachable[reader]:
+                    visit(reader)
+        for successor in _successors(fn, index, ranges):
+            if not reachable[successor]:
+                visit(successor)
+    return ranges, reachable
+
+
+def analyze_ranges(func: TACKYFunction) -> Dict[str, ValueRange]:
+    """The range of each variable `func` can assign; variables only assigned in unreachable code are absent."""
+    return _analyze(_Function(func))[0]
+
+
+def _constant_or(value: TACKYValue, ranges: Dict[str, ValueRange]) -> TACKYValue:
+    known = singleton(_read(value, ranges)) if type(value) is TACKYVariable else None
+    return value if known is None else make_constant(known)
+
+
+def _simplify_binary(instr: TACKYBinaryOp, ranges: Dict[str, ValueRange]) -> TACKYInstruction:
+    op, s1, s2, dst = instr
+    s1, s2 = _constant_or(s1, ranges), _constant_or(s2, ranges)
+    a, b = _read(s1, ranges), _read(s2, ranges)
+    if a is None or b is None or may_trap(op, a, b):
+        return TACKYBinaryOp(op, s1, s2, dst)
+    value = singleton(binary_range(op, a, b))
+    if value is not None:
+        return TACKYCopy(make_constant(value), dst)
+    if op in (TACKYBinaryOpType.DIVIDE, TACKYBinaryOpType.REMAINDER) and a.lo >= 0 and type(s2) is TACKYConstant:
+        # Non-negative dividends need no rounding toward zero, so powers of two become shifts and masks.
+        divisor = s2.value
+        if divisor > 0 and divisor & (divisor - 1) == 0:
+            if op is TACKYBinaryOpType.DIVIDE:
+                return TACKYBinaryOp(TACKYBinaryOpType.R_SHIFT, s1, make_constant(divisor.bit_length() - 1), dst)
+            return TACKYBinaryOp(TACKYBinaryOpType.BITWISE_AND, s1, make_constant(divisor - 1), dst)
+    for x, r, k in ((s1, a, s2), (s2, b, s1)):
+        if type(x) is not TACKYVariable or type(k) is not TACKYConstant:
+            continue
+        # Masks that keep every bit x can have set, and ors that only set bits x already has.
+        if op is TACKYBinaryOpType.BITWISE_AND and not ~(r.zeros | k.value) & MASK:
+            return TACKYCopy(x, dst)
+        if op is TACKYBinaryOpType.BITWISE_OR and not k.value & MASK & ~r.ones:
+            return TACKYCopy(x, dst)
+        if is_boolean(r):
+            # A boolean compared with a constant is the boolean or its negation.
+            operands = (0, k.value), (1, k.value)
+            if x is s2:
+                operands = (k.value, 0), (k.value, 1)
+            try:
+                outcomes = tuple(BINARY_OPS[op](*pair) for pair in operands)
+            except ArithmeticError:
+                continue
+            if outcomes == (0, 1):
+                return TACKYCopy(x, dst)
+            if outcomes == (1, 0):
+                return TACKYUnaryOp(TACKYUnaryOpType.NOT, x, dst)
+    return TACKYBinaryOp(op, s1, s2, dst)
+
+
+def _simplify_instruction(instr: TACKYInstruction, ranges: Dict[str, ValueRange]) -> TACKYInstruction | None:
+    """`instr` rewritten for `ranges`, or None when it has no effect."""
+    kind = type(instr)
+    if kind is TACKYBinaryOp:
+        return _simplify_binary(instr, ranges)
+    if kind is TACKYUnaryOp:
+        source = _constant_or(instr.source, ranges)
+        value = singleton(_result(instr, ranges))
+        if value is not None:
+            return TACKYCopy(make_constant(value), instr.destination)
+        return TACKYUnaryOp(instr.unary_operator, source, instr.destination)
+    if kind is TACKYCopy:
+        return TACKYCopy(_constant_or(instr.src, ranges), instr.dst)
+    if kind is TACKYReturn:
+        return TACKYReturn(_constant_or(instr.value, ranges))
+    if kind is TACKYJumpIfZero or kind is TACKYJumpIfNotZero:
+        condition = _read(instr.condition, ranges)
+        truth = None if condition is None else _truth(condition)
+        if truth is None:
+            return kind(_constant_or(instr.condition, ranges), instr.target)
+        return TACKYJump(instr.target) if truth == (kind is TACKYJumpIfNotZero) else None
+    return instr
+
+
+def _unused(instr: TACKYInstruction, read: Set[str], ranges: Dict[str, ValueRange]) -> bool:
+    """Whether `instr` writes a variable that is never read and cannot trap."""
+    kind = type(instr)
+    if kind is TACKYCopy:
+        return instr.dst.identifier not in read
+    if kind is TACKYUnaryOp:
+        return instr.destination.identifier not in read
+    if kind is TACKYBinaryOp and instr.destination.identifier not in read:
+        a, b = _read(instr.source_1, ranges), _read(instr.source_2, ranges)
+        return a is not None and b is not None and not may_trap(instr.binary_operator, a, b)
+    return False
+
+
+def _drop_unused(instructions: List[TACKYInstruction], ranges: Dict[str, ValueRange]) -> List[TACKYInstruction]:
+    """`instructions` without the ones whose results are never read.
+
+    Most of them are left behind by replacing variables with constants.
+    """
+    while True:
+        read = {value.identifier for instr in instructions for value in _sources(instr) if type(value) is TACKYVariable}
+        kept = [instr for instr in instructions if not _unused(instr, read, ranges)]
+        if len(kept) == len(instructions):
+            return kept
+        instructions = kept
+
+
+def simplify_function(func: TACKYFunction) -> Tuple[TACKYFunction, Dict[str, ValueRange]]:
+    """`func` simplified for the ranges of its variables, and those ranges."""
+    fn = _Function(func)
+    ranges, reachable = _analyze(fn)
+    instructions: List[TACKYInstruction] = []
+    for index, (start, end) in enumerate(fn.blocks):
+        if not reachable[index]:
+            continue
+        for instr in func.instructions[start:end]:
+            simplified = _simplify_instruction(instr, ranges)
+            if simplified is None:
+                continue
+            if type(simplified) is TACKYLabel and instructions and instructions[-1] == TACKYJump(simplified.identifier):
+                # The jump only went past blocks that were removed.
+                instructions.pop()
+            instructions.append(simplified)
+    targets = {instr.target for instr in instructions if type(instr) in (TACKYJump, TACKYJumpIfZero, TACKYJumpIfNotZero)}
+    # Labels whose jumps were all decided or removed.
+    instructions = [instr for instr in instructions if type(instr) is not TACKYLabel or instr.identifier in targets]
+    return TACKYFunction(func.identifier, _drop_unused(instructions, ranges)), ranges
+
+
+def simplify_program(prog: TACKYProgram) -> Tuple[TACKYProgram, Dict[str, ValueRange]]:
+    """`prog` simplified for the ranges of main()'s variables, and those ranges for instruction selection."""
+    func, ranges = simplify_function(prog.function_definition)
+    return prog._replace(function_definition=func), ranges
@@ -1,12 +1,30 @@
 from itertools import count
-from typing import Any, Dict, List
+from typing import Any, Collection, Dict, List
 
 from src.frontend.ast_ir import *
 from src.middle.tacky_ir import *
+from src.utils.walker import fold
 
 _temp_counter = count(0)
 _label_counter = count(0)
 
+# Targets of the first branch of && and || that a profile shows is usually
+# taken (src.middle.profile). The second operand of those is moved out of line,
+# after the end of the function, so the usual path falls through.
+_likely_taken: Collection[str] = frozenset()
+_out_of_line: List[TACKYInstruction] = []
+
+
+def reset_counters() -> None:
+    """Restarts temporary and label numbering, e.g. before compiling another file in the same process.
+
+    Also forgets the interned TACKY values of earlier files.
+    """
+    global _temp_counter, _label_counter
+    _temp_counter = count(0)
+    _label_counter = count(0)
+    clear_interned_values()
+
 
 def make_temp():
     return f"tmp_{next(_temp_counter)}"
@@ -16,13 +34,35 @@ def make_label(prefix="L"):
     return f"{prefix}{next(_label_counter)}"
 
 
-def _convert_uop(op: UnaryOpType) -> TACKYUnaryOpType:
-    _UNARY_OP_MAP: Dict[UnaryOpType, TACKYUnaryOpType] = {
-        UnaryOpType.COMPLEMENT: TACKYUnaryOpType.COMPLEMENT,
-        UnaryOpType.NEGATION: TACKYUnaryOpType.NEGATION,
-        UnaryOpType.NOT: TACKYUnaryOpType.NOT,
-    }
+_UNARY_OP_MAP: Dict[UnaryOpType, TACKYUnaryOpType] = {
+    UnaryOpType.COMPLEMENT: TACKYUnaryOpType.COMPLEMENT,
+    UnaryOpType.NEGATION: TACKYUnaryOpType.NEGATION,
+    UnaryOpType.NOT: TACKYUnaryOpType.NOT,
+}
+
+_BINARY_OP_MAP: Dict[BinaryOpType, TACKYBinaryOpType] = {
+    BinaryOpType.ADD: TACKYBinaryOpType.ADD,
+    BinaryOpType.SUBTRACT: TACKYBinaryOpType.SUBTRACT,
+    BinaryOpType.MULTIPLY: TACKYBinaryOpType.MULTIPLY,
+    BinaryOpType.DIVIDE: TACKYBinaryOpType.DIVIDE,
+    BinaryOpType.REMAINDER: TACKYBinaryOpType.REMAINDER,
+    BinaryOpType.BITWISE_AND: TACKYBinaryOpType.BITWISE_AND,
+    BinaryOpType.BITWISE_OR: TACKYBinaryOpType.BITWISE_OR,
+    BinaryOpType.BITWISE_XOR: TACKYBinaryOpType.BITWISE_XOR,
+    BinaryOpType.L_SHIFT: TACKYBinaryOpType.L_SHIFT,
+    BinaryOpType.R_SHIFT: TACKYBinaryOpType.R_SHIFT,
+    BinaryOpType.LOGICAL_AND: TACKYBinaryOpType.LOGICAL_AND,
+    BinaryOpType.LOGICAL_OR: TACKYBinaryOpType.LOGICAL_OR,
+    BinaryOpType.EQUAL: TACKYBinaryOpType.EQUAL,
+    BinaryOpType.NOT_EQUAL: TACKYBinaryOpType.NOT_EQUAL,
+    BinaryOpType.LESS_THAN: TACKYBinaryOpType.LESS_THAN,
+    BinaryOpType.LESS_THAN_OR_EQUAL: TACKYBinaryOpType.LESS_THAN_OR_EQUAL,
+    BinaryOpType.GREATER_THAN: TACKYBinaryOpType.GREATER_THAN,
+    BinaryOpType.GREATER_THAN_OR_EQUAL: TACKYBinaryOpType.GREATER_THAN_OR_EQUAL,
+}
+
 
+def _convert_uop(op: UnaryOpType) -> TACKYUnaryOpType:
     try:
         tacky_op = _UNARY_OP_MAP[op]
     except KeyError:
@@ -31,27 +71,6 @@ def _convert_uop(op: UnaryOpType) -> TACKYUnaryOpType:
 
 
 def _convert_binaryop(op: BinaryOpType) -> TACKYBinaryOpType:
-    _BINARY_OP_MAP: Dict[BinaryOpType, TACKYBinaryOpType] = {
-        BinaryOpType.ADD: TACKYBinaryOpType.ADD,
-        BinaryOpType.SUBTRACT: TACKYBinaryOpType.SUBTRACT,
-        BinaryOpType.MULTIPLY: TACKYBinaryOpType.MULTIPLY,
-        BinaryOpType.DIVIDE: TACKYBinaryOpType.DIVIDE,
-        BinaryOpType.REMAINDER: TACKYBinaryOpType.REMAINDER,
-        BinaryOpType.BITWISE_AND: TACKYBinaryOpType.BITWISE_AND,
-        BinaryOpType.BITWISE_OR: TACKYBinaryOpType.BITWISE_OR,
-        BinaryOpType.BITWISE_XOR: TACKYBinaryOpType.BITWISE_XOR,
-        BinaryOpType.L_SHIFT: TACKYBinaryOpType.L_SHIFT,
-        BinaryOpType.R_SHIFT: TACKYBinaryOpType.R_SHIFT,
-        BinaryOpType.LOGICAL_AND: TACKYBinaryOpType.LOGICAL_AND,
-        BinaryOpType.LOGICAL_OR: TACKYBinaryOpType.LOGICAL_OR,
-        BinaryOpType.EQUAL: TACKYBinaryOpType.EQUAL,
-        BinaryOpType.NOT_EQUAL: TACKYBinaryOpType.NOT_EQUAL,
-        BinaryOpType.LESS_THAN: TACKYBinaryOpType.LESS_THAN,
-        BinaryOpType.LESS_THAN_OR_EQUAL: TACKYBinaryOpType.LESS_THAN_OR_EQUAL,
-        BinaryOpType.GREATER_THAN: TACKYBinaryOpType.GREATER_THAN,
-        BinaryOpType.GREATER_THAN_OR_EQUAL: TACKYBinaryOpType.GREATER_THAN_OR_EQUAL,
-    }
-
     try:
         tacky_op = _BINARY_OP_MAP[op]
     except KeyError:
@@ -59,74 +78,150 @@ def _convert_binaryop(op: BinaryOpType) -> TACKYBinaryOpType:
     return tacky_op
 
 
-def emit_TACKY(expr: Any, instructions: List) -> TACKYValue:
-    match expr:
-        case Constant(val):
-            return TACKYConstant(val)
-
-        case UnaryOp(op, inner_expr):
-            tacky_op = _convert_uop(op)
-            src = emit_TACKY(inner_expr, instructions)
-            dst_name = make_temp()
-            dst = TACKYVariable(dst_name)
-            instructions.append(TACKYUnaryOp(tacky_op, src, dst))
+def _emit_constant(expr: Constant, instructions: List) -> TACKYValue:
+    return make_constant(expr.val)
+
+
+def _emit_unary(expr: UnaryOp, instructions: List):
+    tacky_op = _convert_uop(expr.operator)
+    src = yield expr.inner_exp
+    dst_name = make_temp()
+    dst = make_variable(dst_name)
+    instructions.append(TACKYUnaryOp(tacky_op, src, dst))
+    return dst
+
+
+def rhs_label(branch_target: str) -> str:
+    """Label of the out-of-line second operand of the && or || whose first branch goes to `branch_target`."""
+    return f"sc_rhs{branch_target.removeprefix('sc_end').removeprefix('sc_true')}"
+
+
+def _emit_out_of_line(instructions: List, start: int, label: str, tail: List[TACKYInstruction]) -> None:
+    """Moves instructions[start:] and `tail` after the function body, behind `label`."""
+    _out_of_line.append(TACKYLabel(label))
+    _out_of_line.extend(instructions[start:])
+    _out_of_line.extend(tail)
+    del instructions[start:]
+
+
+def _emit_binary(expr: BinaryOp, instructions: List):
+    op, e1, e2 = expr
+    if op == BinaryOpType.LOGICAL_AND:
+        dst = make_variable(make_temp())
+        end_label = make_label("sc_end")
+        # dst = 0; if (e1 == 0) goto end; if (e2 == 0) goto end; dst = 1; end:
+        instructions.append(TACKYCopy(make_constant(0), dst))
+        v1 = yield e1
+        if end_label in _likely_taken:
+            # e1 is usually 0: dst = 0; if (e1 != 0) goto rhs; end:
+            # with rhs: if (e2 == 0) goto end; dst = 1; goto end;
+            rhs = rhs_label(end_label)
+            instructions.append(TACKYJumpIfNotZero(v1, rhs))
+            start = len(instructions)
+            v2 = yield e2
+            tail = [TACKYJumpIfZero(v2, end_label), TACKYCopy(make_constant(1), dst), TACKYJump(end_label)]
+            _emit_out_of_line(instructions, start, rhs, tail)
+            instructions.append(TACKYLabel(end_label))
             return dst
-
-        case BinaryOp(op, e1, e2) if op in (
-            BinaryOpType.LOGICAL_AND,
-            BinaryOpType.LOGICAL_OR,
-        ):
-            dst = TACKYVariable(make_temp())
-            end_label = make_label("sc_end")
-
-            if op == BinaryOpType.LOGICAL_AND:
-                # dst = 0; if (e1 == 0) goto end; if (e2 == 0) goto end; dst = 1; end:
-                instructions.append(TACKYCopy(TACKYConstant(0), dst))
-                v1 = emit_TACKY(e1, instructions)
-                instructions.append(TACKYJumpIfZero(v1, end_label))
-                v2 = emit_TACKY(e2, instructions)
-                instructions.append(TACKYJumpIfZero(v2, end_label))
-                instructions.append(TACKYCopy(TACKYConstant(1), dst))
-                instructions.append(TACKYLabel(end_label))
-                return dst
-            else:
-                # dst = 0; if (e1 != 0) { dst = 1; goto end; } if (e2 != 0) { dst = 1; } end:
-                instructions.append(TACKYCopy(TACKYConstant(0), dst))
-                v1 = emit_TACKY(e1, instructions)
-                set_true = make_label("sc_true")
-                instructions.append(TACKYJumpIfNotZero(v1, set_true))
-                v2 = emit_TACKY(e2, instructions)
-                instructions.append(TACKYJumpIfNotZero(v2, set_true))
-                instructions.append(TACKYJump(end_label))
-                instructions.append(TACKYLabel(set_true))
-                instructions.append(TACKYCopy(TACKYConstant(1), dst))
-                instructions.append(TACKYLabel(end_label))
-                return dst
-
-        # All binops except && and ||
-        case BinaryOp(op, e1, e2):
-            tacky_binop = _convert_binaryop(op)
-            v1 = emit_TACKY(e1, instructions)
-            v2 = emit_TACKY(e2, instructions)
-            dst_name = make_temp()
-            dst = TACKYVariable(dst_name)
-            instructions.append(TACKYBinaryOp(tacky_binop, v1, v2, dst))
+        instructions.append(TACKYJumpIfZero(v1, end_label))
+        v2 = yield e2
+        instructions.append(TACKYJumpIfZero(v2, end_label))
+        instructions.append(TACKYCopy(make_constant(1), dst))
+        instructions.append(TACKYLabel(end_label))
+        return dst
+
+    if op == BinaryOpType.LOGICAL_OR:
+        dst = make_variable(make_temp())
+        end_label = make_label("sc_end")
+        # dst = 0; if (e1 != 0) { dst = 1; goto end; } if (e2 != 0) { dst = 1; } end:
+        instructions.append(TACKYCopy(make_constant(0), dst))
+        v1 = yield e1
+        set_true = make_label("sc_true")
+        if set_true in _likely_taken:
+            # e1 is usually nonzero: dst = 0; if (e1 == 0) goto rhs; true: dst = 1; end:
+            # with rhs: if (e2 != 0) goto true; goto end;
+            rhs = rhs_label(set_true)
+            instructions.append(TACKYJumpIfZero(v1, rhs))
+            start = len(instructions)
+            v2 = yield e2
+            _emit_out_of_line(instructions, start, rhs, [TACKYJumpIfNotZero(v2, set_true), TACKYJump(end_label)])
+            instructions.append(TACKYLabel(set_true))
+            instructions.append(TACKYCopy(make_constant(1), dst))
+            instructions.append(TACKYLabel(end_label))
             return dst
+        instructions.append(TACKYJumpIfNotZero(v1, set_true))
+        v2 = yield e2
+        instructions.append(TACKYJumpIfNotZero(v2, set_true))
+        instructions.append(TACKYJump(end_label))
+        instructions.append(TACKYLabel(set_true))
+        instructions.append(TACKYCopy(make_constant(1), dst))
+        instructions.append(TACKYLabel(end_label))
+        return dst
+
+    # All binops except && and ||
+    tacky_binop = _convert_binaryop(op)
+    v1 = yield e1
+    v2 = yield e2
+    dst_name = make_temp()
+    dst = make_variable(dst_name)
+    instructions.append(TACKYBinaryOp(tacky_binop, v1, v2, dst))
+    return dst
+
 
-        case _:
-            raise NotImplementedError(f"emit_tacky: {type(expr).__name__}")
+def _emit_unsupported(expr: Any, instructions: List) -> TACKYValue:
+    raise NotImplementedError(f"emit_tacky: {type(expr).__name__}")
 
 
-def convert_AST_to_TACKY(node: Any) -> Any:
-    match node:
-        case Program(main_func):
-            func_def = convert_AST_to_TACKY(main_func)
-            return TACKYProgram(func_def)
+_EMIT_HANDLERS = {
+    Constant: _emit_constant,
+    UnaryOp: _emit_unary,
+    BinaryOp: _emit_binary,
+}
 
-        case Function(n, b):
-            instrs: List[TACKYInstruction] = []
-            instrs.append(TACKYReturn(emit_TACKY(b.return_val, instrs)))
-            return TACKYFunction(n.name, instrs)
 
-        case _:
-            raise NotImplementedError(f"convert_AST_to_TACKY: {type(node).__name__}")
+def emit_TACKY(expr: Any, instructions: List) -> TACKYValue:
+    return fold(expr, _EMIT_HANDLERS, instructions, default=_emit_unsupported)
+
+
+def _convert_program(node: Program):
+    func_def = yield node.function_definition
+    return TACKYProgram(func_def)
+
+
+def _convert_function(node: Function) -> TACKYFunction:
+    n, body = node
+    instrs: List[TACKYInstruction] = []
+    for item in body if isinstance(body, list) else [body]:
+        match item:
+            case Return(return_val):
+                instrs.append(TACKYReturn(emit_TACKY(return_val, instrs)))
+            case _:
+                raise NotImplementedError(f"convert_AST_to_TACKY: {type(item).__name__}")
+    if _out_of_line:
+        # Only reachable through their jumps; main falls off the end with 0.
+        if type(instrs[-1]) not in (TACKYReturn, TACKYJump):
+            instrs.append(TACKYReturn(make_constant(0)))
+        instrs.extend(_out_of_line)
+        _out_of_line.clear()
+    return TACKYFunction(n.name, instrs)
+
+
+def _convert_unsupported(node: Any) -> Any:
+    raise NotImplementedError(f"convert_AST_to_TACKY: {type(node).__name__}")
+
+
+_CONVERT_HANDLERS = {
+    Program: _convert_program,
+    Function: _convert_function,
+}
+
+
+def convert_AST_to_TACKY(node: Any, likely_taken: Collection[str] = ()) -> Any:
+    """Lowers `node` to TACKY. `likely_taken` names the && and || branches to lay out as usually taken."""
+    global _likely_taken
+    _likely_taken = likely_taken
+    try:
+        return fold(node, _CONVERT_HANDLERS, default=_convert_unsupported)
+    finally:
+        _likely_taken = frozenset()
+        _out_of_line.clear()
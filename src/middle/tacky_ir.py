@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import struct
 from enum import Enum, auto
-from typing import List, NamedTuple, TypeAlias
+from typing import Dict, List, NamedTuple, TypeAlias
 
 
 class TACKYConstant(NamedTuple):
@@ -82,6 +83,11 @@ class TACKYLabel(NamedTuple):
     identifier: str
 
 
+# Added at the start of each basic block by an --instrument build (src.middle.profile).
+class TACKYIncrementCounter(NamedTuple):
+    index: int
+
+
 TACKYInstruction: TypeAlias = (
     TACKYReturn
     | TACKYUnaryOp
@@ -91,6 +97,7 @@ TACKYInstruction: TypeAlias = (
     | TACKYJumpIfZero
     | TACKYJumpIfNotZero
     | TACKYLabel
+    | TACKYIncrementCounter
 )
 
 
@@ -99,5 +106,58 @@ class TACKYFunction(NamedTuple):
     instructions: List[TACKYInstruction]
 
 
+# The file an instrumented program writes its block counts to at exit, and the
+# checksum of the TACKY those counts describe.
+class TACKYProfileHeader(NamedTuple):
+    path: str
+    checksum: int
+    counters: int
+
+
+# The profile file is what the instrumented program has in memory: PROFILE_HEADER
+# followed by one little-endian uint64 per block (see src.middle.profile).
+PROFILE_MAGIC = b"MYCCPROF"
+PROFILE_VERSION = 1
+# Magic, version, number of counters, TACKY checksum.
+PROFILE_HEADER = struct.Struct("<8sIIQ")
+
+
 class TACKYProgram(NamedTuple):
     function_definition: TACKYFunction
+    profile: TACKYProfileHeader | None = None
+
+
+# Values are immutable, so identical ones can share a single object. Build them
+# through these constructors so that `a is b` holds whenever `a == b`, for
+# values made since the last clear_interned_values(). src.backend.assembly_ir
+# interns its operands the same way.
+_constants: Dict[int, TACKYConstant] = {}
+_variables: Dict[str, TACKYVariable] = {}
+
+
+def make_constant(value: int) -> TACKYConstant:
+    constant = _constants.get(value)
+    if constant is None:
+        constant = _constants[value] = TACKYConstant(value)
+    return constant
+
+
+def make_variable(identifier: str) -> TACKYVariable:
+    variable = _variables.get(identifier)
+    if variable is None:
+        variable = _variables[identifier] = TACKYVariable(identifier)
+    return variable
+
+
+def clear_interned_values() -> None:
+    """Drops the shared values, so a process compiling many files does not keep all of their names."""
+    _constants.clear()
+    _variables.clear()
+
+
+# Interning constructor per class, for code that rebuilds IR generically (see
+# src.utils.serialize).
+INTERNED = {
+    TACKYConstant: make_constant,
+    TACKYVariable: make_variable,
+}
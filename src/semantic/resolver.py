@@ -1,6 +1,7 @@
 from typing import Dict
 
 from src.frontend.ast_ir import *
+from src.utils.walker import fold
 
 
 # Might have to use the same counter as in the TACKY pass.
@@ -52,19 +53,35 @@ def _resolve_statement(stmt: Statement, env: VariableMap) -> Statement:
             raise SyntaxError(f"Unknown statement type: {stmt}")
 
 
+def _resolve_assignment(exp: Assignment, env: VariableMap):
+    lhs, rhs = exp
+    if not isinstance(lhs, Variable):
+        raise SyntaxError(f"Left-hand side of assignment must be a variable, got {lhs}")
+    resolved_lhs = yield lhs
+    resolved_rhs = yield rhs
+    return Assignment(resolved_lhs, resolved_rhs)
+
+
+def _resolve_variable(exp: Variable, env: VariableMap) -> Expression:
+    identifier = exp.identifier
+    if identifier in env:
+        return Variable(env[identifier].name)
+    else:
+        raise SyntaxError(f"Use of undeclared variable {identifier}")
+
+
+def _resolve_other(exp: Expression, env: VariableMap) -> Expression:
+    return exp
+
+
+_RESOLVE_HANDLERS = {
+    Assignment: _resolve_assignment,
+    Variable: _resolve_variable,
+}
+
+
 def _resolve_expression(exp: Expression, env: VariableMap) -> Expression:
-    match exp:
-        case Assignment(lhs, rhs):
-            if not isinstance(lhs, Variable):
-                raise SyntaxError(f"Left-hand side of assignment must be a variable, got {lhs}")
-            return Assignment(_resolve_expression(lhs, env), _resolve_expression(rhs, env))
-        case Variable(identifier):
-            if identifier in env:
-                return Variable(env[identifier].name)
-            else:
-                raise SyntaxError(f"Use of undeclared variable {identifier}")
-        case _:
-            return exp
+    return fold(exp, _RESOLVE_HANDLERS, env, default=_resolve_other)
 
 
 def resolve_program(prog: Program) -> Program:
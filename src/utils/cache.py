@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+
+try:
+    import fcntl
+except ImportError:  # Windows: counters may lose concurrent updates, artifacts stay atomic.
+    fcntl = None
+
+# Configure the on-disk cache with these, or with --cache-dir/--cache-max-size.
+CACHE_DIR_ENV = "MYCC_CACHE_DIR"
+CACHE_SIZE_ENV = "MYCC_CACHE_MAX_SIZE"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+_STATS_FILE = "stats.json"
+_LOCK_FILE = "stats.lock"
+_ARTIFACT_DIR = "objects"
+_COUNTERS = ("hits", "misses", "evictions")
+
+_compiler_version: str | None = None
+
+
+def compiler_version() -> str:
+    """Digest of the compiler's own sources, so any change to it invalidates the cache."""
+    global _compiler_version
+    if _compiler_version is None:
+        digest = hashlib.sha256()
+        src = PROJECT_ROOT / "src"
+        for path in sorted([src / "mycc", *src.rglob("*.py")]):
+            digest.update(path.relative_to(src).as_posix().encode() + b"\0")
+            digest.update(path.read_bytes())
+        _compiler_version = digest.hexdigest()
+    return _compiler_version
+
+
+def parse_size(text: str) -> int:
+    """Parses sizes like 4096, 64K, 256M or 1G."""
+    units = {"K": 1024, "M": 1024**2, "G": 1024**3}
+    text = text.strip().upper().removesuffix("B")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+class CompilationCache:
+    """Content-addressed store of emitted artifacts (`.s`, `.o`) with LRU eviction.
+
+    Artifacts live at objects/<key[:2]>/<key><suffix>. They are written to a
+    temporary file and renamed into place, so concurrent compilers never see a
+    partial artifact. Recency is tracked through the file mtime.
+    """
+
+    def __init__(self, directory: str | Path, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._objects = self.directory / _ARTIFACT_DIR
+        self._objects.mkdir(parents=True, exist_ok=True)
+        self._pending: Dict[str, int] = dict.fromkeys(_COUNTERS, 0)
+
+    @staticmethod
+    def key(source: bytes, flags: Iterable[str] = ()) -> str:
+        digest = hashlib.sha256()
+        digest.update(compiler_version().encode() + b"\0")
+        digest.update(sys.platform.encode() + b"\0")
+        digest.update(" ".join(sorted(set(flags))).encode() + b"\0")
+        digest.update(source)
+        return digest.hexdigest()
+
+    def _path(self, key: str, suffix: str) -> Path:
+        return self._objects / key[:2] / f"{key}{suffix}"
+
+    def get(self, key: str, suffix: str) -> bytes | None:
+        path = self._path(key, suffix)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            self._pending["misses"] += 1
+            return None
+        self._pending["hits"] += 1
+        return data
+
+    def put(self, key: str, suffix: str, data: bytes) -> None:
+        path = self._path(key, suffix)
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self._evict()
+
+    def _artifacts(self) -> List[tuple[float, int, Path]]:
+        entries = []
+        for path in self._objects.glob("*/*"):
+            if path.name.startswith(".tmp-"):
+                continue
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue  # Evicted by another process meanwhile.
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _evict(self) -> None:
+        entries = self._artifacts()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            self._pending["evictions"] += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    @contextmanager
+    def _locked_stats(self) -> Iterator[Dict[str, int]]:
+        with open(self.directory / _LOCK_FILE, "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            stats_path = self.directory / _STATS_FILE
+            try:
+                stats = json.loads(stats_path.read_text())
+            except (FileNotFoundError, ValueError):
+                stats = {}
+            stats = {name: int(stats.get(name, 0)) for name in _COUNTERS}
+            yield stats
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+            with os.fdopen(fd, "w") as f:
+                json.dump(stats, f)
+            os.replace(tmp, stats_path)
+
+    def flush_stats(self) -> None:
+        """Adds this process's counters to the persistent ones."""
+        if not any(self._pending.values()):
+            return
+        with self._locked_stats() as stats:
+            for name, count in self._pending.items():
+                stats[name] += count
+        self._pending = dict.fromkeys(_COUNTERS, 0)
+
+    def stats(self) -> Dict[str, int]:
+        self.flush_stats()
+        with self._locked_stats() as stats:
+            counters = dict(stats)
+        entries = self._artifacts()
+        counters["entries"] = len(entries)
+        counters["bytes"] = sum(size for _, size, _ in entries)
+        counters["max_bytes"] = self.max_bytes
+        return counters
+
+    def format_stats(self) -> str:
+        stats = self.stats()
+        lookups = stats["hits"] + stats["misses"]
+        ratio = f"{stats['hits'] / lookups:.1%}" if lookups else "n/a"
+        return "\n".join(
+            [
+                f"cache directory: {self.directory}",
+                f"hits:            {stats['hits']} ({ratio})",
+                f"misses:          {stats['misses']}",
+                f"evictions:       {stats['evictions']}",
+                f"entries:         {stats['entries']}",
+                f"size:            {stats['bytes']} / {stats['max_bytes']} bytes",
+            ]
+        )
+
+
+def open_cache(directory: str | None = None, max_size: str | None = None) -> CompilationCache | None:
+    """Opens the configured cache, or returns None when caching is not enabled."""
+    directory = directory or os.environ.get(CACHE_DIR_ENV)
+    if not directory:
+        return None
+    max_size = max_size or os.environ.get(CACHE_SIZE_ENV)
+    return CompilationCache(directory, parse_size(max_size) if max_size else DEFAULT_MAX_BYTES)
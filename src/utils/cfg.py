@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from src.backend.assembly_ir import *
+from src.middle.tacky_ir import *
+
+# Control-flow graphs of TACKY and assembly functions for --viz, one node per
+# basic block, with a rough cost for each block.
+#
+# A block's cycle estimate adds up the latency of each of its instructions on
+# its own, plus MEMORY_CYCLES for every operand in memory; it ignores the
+# overlap an out-of-order core gets, so it is a ceiling for comparing blocks
+# rather than a prediction. Every TACKY variable becomes a stack slot in
+# tacky2asm, so variables are the TACKY block's memory operands.
+
+# Load-to-use latency of an L1 hit.
+MEMORY_CYCLES = 4
+
+# Latencies of instructions with more than one cycle; see also tools/superopt.py.
+IMUL_CYCLES = 3
+IDIV_CYCLES = 26
+# cmp, mov $0 and setcc.
+COMPARISON_CYCLES = 3
+# mov %rbp, %rsp; pop %rbp; ret.
+RET_CYCLES = 3
+
+# Edge kinds.
+FALL_THROUGH = "fall through"
+JUMP = "jump"
+TAKEN = "taken"
+
+
+class Block(NamedTuple):
+    # The block's label; the function's name for the entry block, and "" for a block without one.
+    label: str
+    # Text of its instructions, one per line.
+    lines: List[str]
+    # (block, edge kind) for each block control can go to next.
+    successors: List[Tuple[int, str]]
+    instructions: int
+    memory_operands: int
+    cycles: int
+    # Times the block ran according to the profile passed in, or None.
+    count: int | None
+
+
+_TACKY_COMPARISONS = {
+    TACKYBinaryOpType.EQUAL,
+    TACKYBinaryOpType.NOT_EQUAL,
+    TACKYBinaryOpType.LESS_THAN,
+    TACKYBinaryOpType.LESS_THAN_OR_EQUAL,
+    TACKYBinaryOpType.GREATER_THAN,
+    TACKYBinaryOpType.GREATER_THAN_OR_EQUAL,
+}
+
+
+def _tacky_cycles(instr: Any) -> int:
+    kind = type(instr)
+    if kind is TACKYBinaryOp:
+        op = instr.binary_operator
+        if op in (TACKYBinaryOpType.DIVIDE, TACKYBinaryOpType.REMAINDER):
+            return IDIV_CYCLES
+        if op is TACKYBinaryOpType.MULTIPLY:
+            return IMUL_CYCLES
+        if op in _TACKY_COMPARISONS:
+            return COMPARISON_CYCLES
+        return 1
+    if kind is TACKYUnaryOp and instr.unary_operator is TACKYUnaryOpType.NOT:
+        return COMPARISON_CYCLES
+    if kind is TACKYReturn:
+        return 1 + RET_CYCLES
+    if kind in (TACKYJumpIfZero, TACKYJumpIfNotZero):
+        return 2
+    return 0 if kind is TACKYLabel else 1
+
+
+def _assembly_cycles(instr: Any) -> int:
+    kind = type(instr)
+    if kind is AssemblyBinaryOp and instr.binary_operator is AssemblyBinaryOpType.MULTIPLY:
+        return IMUL_CYCLES
+    if kind is AssemblyIDiv:
+        return IDIV_CYCLES
+    if kind is AssemblyRet:
+        return RET_CYCLES
+    return 0 if kind in (AssemblyLabel, AssemblyAlign) else 1
+
+
+def _assembly_memory_operands(instr: Any) -> int:
+    kind = type(instr)
+    if kind is AssemblyIncrementCounter:
+        return 1
+    if kind is AssemblyRet:
+        # pop %rbp and the return address.
+        return 2
+    return sum(1 for operand in instr if type(operand) in (AssemblyStack, AssemblyPseudoRegister))
+
+
+class _Dialect(NamedTuple):
+    """What the block splitter needs to know about an IR."""
+
+    label: type
+    # Instructions that start a block along with a label right after them.
+    directives: Tuple[type, ...]
+    jump: type
+    conditional_jumps: Tuple[type, ...]
+    exits: Tuple[type, ...]
+    target: Any
+    cycles: Any
+    memory_operands: Any
+    # Text of an instruction; lines are separated by newlines.
+    format: Any
+
+
+def _tacky_dialect() -> _Dialect:
+    from src.utils.pretty import format_tacky_instruction
+
+    return _Dialect(
+        label=TACKYLabel,
+        directives=(),
+        jump=TACKYJump,
+        conditional_jumps=(TACKYJumpIfZero, TACKYJumpIfNotZero),
+        exits=(TACKYReturn,),
+        target=lambda instr: instr.target,
+        cycles=_tacky_cycles,
+        memory_operands=lambda instr: sum(1 for value in instr if type(value) is TACKYVariable),
+        format=format_tacky_instruction,
+    )
+
+
+def _assembly_dialect() -> _Dialect:
+    from src.backend.codegen import format_instruction
+
+    def format_lines(instr: Any) -> str:
+        try:
+            # One line per machine instruction (ret is three), with single spaces.
+            return "\n".join(" ".join(line.split()) for line in format_instruction(instr).splitlines())
+        except KeyError:
+            # Pseudoregisters before fixup have no text of their own.
+            return repr(instr)
+
+    return _Dialect(
+        label=AssemblyLabel,
+        directives=(AssemblyAlign,),
+        jump=AssemblyJump,
+        conditional_jumps=(AssemblyJumpConditionCode,),
+        exits=(AssemblyRet,),
+        target=lambda instr: instr.identifier,
+        cycles=_assembly_cycles,
+        memory_operands=_assembly_memory_operands,
+        format=format_lines,
+    )
+
+
+def _split(instructions: List[Any], dialect: _Dialect) -> List[Tuple[int, int]]:
+    """(start, end) of each basic block of `instructions`, in instruction order.
+
+    A block starts at a label, or at the directives (such as .p2align) just
+    before one, and ends after a jump or return.
+    """
+    blocks: List[Tuple[int, int]] = []
+    start = 0
+    # Whether the current block holds anything but directives so far.
+    started = False
+    ends = (dialect.jump, *dialect.conditional_jumps, *dialect.exits)
+    for i, instr in enumerate(instructions):
+        kind = type(instr)
+        if kind is dialect.label or kind in dialect.directives:
+            if started:
+                blocks.append((start, i))
+                start, started = i, False
+            started = started or kind is dialect.label
+        elif kind in ends:
+            blocks.append((start, i + 1))
+            start, started = i + 1, False
+        else:
+            started = True
+    if start < len(instructions):
+        blocks.append((start, len(instructions)))
+    return blocks
+
+
+def _function_blocks(
+    name: str, instructions: List[Any], dialect: _Dialect, label_counts: Dict[str, int] | None
+) -> List[Block]:
+    spans = _split(instructions, dialect)
+    labels: List[str] = []
+    for index, (start, end) in enumerate(spans):
+        label = next(
+            (instr.identifier for instr in instructions[start:end] if type(instr) is dialect.label),
+            name if index == 0 else "",
+        )
+        labels.append(label)
+    index_of = {label: index for index, label in enumerate(labels) if label}
+
+    bodies: List[List[Any]] = []
+    successors: List[List[Tuple[int, str]]] = []
+    for index, (start, end) in enumerate(spans):
+        body = [instr for instr in instructions[start:end] if type(instr) is not dialect.label]
+        last = body[-1] if body else None
+        kind = type(last)
+        block_successors: List[Tuple[int, str]] = []
+        if kind is dialect.jump:
+            block_successors.append((index_of[dialect.target(last)], JUMP))
+        elif kind in dialect.conditional_jumps:
+            block_successors.append((index_of[dialect.target(last)], TAKEN))
+        if kind is not dialect.jump and kind not in dialect.exits and index + 1 < len(spans):
+            block_successors.append((index + 1, FALL_THROUGH))
+        bodies.append(body)
+        successors.append(block_successors)
+
+    counts: List[int | None] = [None] * len(spans)
+    if label_counts is not None:
+        counts = _infer_counts(successors, [label_counts.get(label) if label else None for label in labels])
+
+    blocks: List[Block] = []
+    for index, body in enumerate(bodies):
+        code = [instr for instr in body if type(instr) not in dialect.directives]
+        blocks.append(
+            Block(
+                labels[index],
+                [line for instr in body for line in dialect.format(instr).split("\n")],
+                successors[index],
+                len(code),
+                sum(dialect.memory_operands(instr) for instr in code),
+                sum(dialect.cycles(instr) + MEMORY_CYCLES * dialect.memory_operands(instr) for instr in code),
+                counts[index],
+            )
+        )
+    return blocks
+
+
+def _infer_counts(successors: List[List[Tuple[int, str]]], counts: List[int | None]) -> List[int | None]:
+    """`counts` with the gaps filled in where the counts around them determine them.
+
+    Profiles only count labelled blocks, which leaves out the blocks entered
+    by falling through a conditional jump. As many runs enter a block as
+    leave it, so a block's count is the sum of its incoming edges' counts and
+    of its outgoing ones; wherever all but one number in such a sum is known,
+    the last one follows. The function's entry and exits are edges from and
+    to outside it, which no sum covers.
+    """
+    counts = list(counts)
+    # (from, to) of every edge, with -1 for outside the function.
+    edges: List[Tuple[int, int]] = [(-1, 0)] if counts else []
+    for block, block_successors in enumerate(successors):
+        edges.extend((block, successor) for successor, _ in block_successors)
+        if not block_successors:
+            edges.append((block, -1))
+    flows: List[int | None] = [None] * len(edges)
+    incoming: List[List[int]] = [[] for _ in counts]
+    outgoing: List[List[int]] = [[] for _ in counts]
+    for edge, (source, target) in enumerate(edges):
+        if source >= 0:
+            outgoing[source].append(edge)
+        if target >= 0:
+            incoming[target].append(edge)
+
+    worklist = list(range(len(counts)))
+    while worklist:
+        block = worklist.pop()
+        for side in (incoming[block], outgoing[block]):
+            unknown = [edge for edge in side if flows[edge] is None]
+            known = sum(flows[edge] for edge in side if flows[edge] is not None)
+            if counts[block] is None and not unknown:
+                counts[block] = known
+                worklist.append(block)
+            elif counts[block] is not None and len(unknown) == 1:
+                edge = unknown[0]
+                # A profile of a different run can make the sums disagree; counts never go below zero.
+                flows[edge] = max(0, counts[block] - known)
+                worklist.extend(end for end in edges[edge] if end >= 0)
+    return counts
+
+
+def is_flat_ir(root: Any) -> bool:
+    """Whether `root` is a TACKY or assembly program or function, which --viz draws as a CFG."""
+    return isinstance(root, (TACKYProgram, TACKYFunction, AssemblyProgram, AssemblyFunction))
+
+
+def function_blocks(root: Any, label_counts: Dict[str, int] | None = None) -> List[Block]:
+    """The basic blocks of the function of a TACKY or assembly program, in instruction order.
+
+    `label_counts` gives profile counts by label, with the function's name
+    for the entry block, as src.middle.profile.label_counts does.
+    """
+    if isinstance(root, (TACKYProgram, AssemblyProgram)):
+        root = root.function_definition
+    if isinstance(root, TACKYFunction):
+        return _function_blocks(root.identifier, root.instructions, _tacky_dialect(), label_counts)
+    if isinstance(root, AssemblyFunction):
+        return _function_blocks(root.name, root.instructions, _assembly_dialect(), label_counts)
+    raise TypeError(f"Not a TACKY or assembly function: {type(root).__name__}")
+
+
+def block_cost(block: Block) -> int:
+    """Estimated cycles spent in `block`: per run, times the runs the profile counted when there is one."""
+    return block.cycles * block.count if block.count is not None else block.cycles
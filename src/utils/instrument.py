@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import sys
+import time
+from typing import Any, Dict, List, TextIO
+
+# Per-pass timing and memory instrumentation (--time-passes, --mem-report).
+#
+# Passes wrap their work in `with instrument.stage("name"):`. Until enable() is
+# called that returns a shared no-op context manager, so the hooks cost one
+# global lookup and a call. Stages nest: a stage entered inside another one is
+# reported as its sub-pass.
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info: Any) -> None:
+        return None
+
+
+_NO_STAGE = _NoStage()
+
+
+class PassRecord:
+    __slots__ = ("name", "depth", "wall", "cpu", "peak")
+
+    def __init__(self, name: str, depth: int) -> None:
+        self.name = name
+        self.depth = depth
+        self.wall = 0.0
+        self.cpu = 0.0
+        # Highest traced memory while the pass ran, in bytes (None without --mem-report).
+        self.peak: int | None = None
+
+
+class _Stage:
+    __slots__ = ("recorder", "record", "wall", "cpu")
+
+    def __init__(self, recorder: PassRecorder, name: str) -> None:
+        self.recorder = recorder
+        self.record = PassRecord(name, len(recorder._open))
+
+    def __enter__(self) -> PassRecord:
+        recorder = self.recorder
+        recorder.records.append(self.record)
+        if recorder._tracemalloc is not None:
+            # The parent's peak so far must be kept before the counter is reset for this pass.
+            if recorder._open:
+                parent = recorder._open[-1]
+                parent.peak = max(parent.peak or 0, recorder._tracemalloc.get_traced_memory()[1])
+            recorder._tracemalloc.reset_peak()
+        recorder._open.append(self.record)
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self.record
+
+    def __exit__(self, *exc_info: Any) -> None:
+        record = self.record
+        record.wall += time.perf_counter() - self.wall
+        record.cpu += time.process_time() - self.cpu
+        recorder = self.recorder
+        recorder._open.pop()
+        if recorder._tracemalloc is not None:
+            record.peak = max(record.peak or 0, recorder._tracemalloc.get_traced_memory()[1])
+            if recorder._open:
+                parent = recorder._open[-1]
+                parent.peak = max(parent.peak or 0, record.peak)
+
+
+class PassRecorder:
+    def __init__(self, track_memory: bool = False) -> None:
+        self.records: List[PassRecord] = []
+        self.sizes: Dict[str, int] = {}
+        self._open: List[PassRecord] = []
+        self._tracemalloc = None
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        if track_memory:
+            import tracemalloc
+
+            tracemalloc.start()
+            self._tracemalloc = tracemalloc
+
+    def stage(self, name: str) -> _Stage:
+        return _Stage(self, name)
+
+    def stop(self) -> None:
+        self.total_wall = time.perf_counter() - self._start_wall
+        self.total_cpu = time.process_time() - self._start_cpu
+        self.total_peak = None
+        if self._tracemalloc is not None:
+            self.total_peak = max([self._tracemalloc.get_traced_memory()[1], *(r.peak or 0 for r in self.records)])
+            self._tracemalloc.stop()
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "passes": [
+                {
+                    "name": r.name,
+                    "depth": r.depth,
+                    "wall_ms": round(r.wall * 1000, 3),
+                    "cpu_ms": round(r.cpu * 1000, 3),
+                    "peak_bytes": r.peak,
+                }
+                for r in self.records
+            ],
+            "total": {
+                "wall_ms": round(self.total_wall * 1000, 3),
+                "cpu_ms": round(self.total_cpu * 1000, 3),
+                "peak_bytes": self.total_peak,
+            },
+            "sizes": dict(self.sizes),
+        }
+
+    def format_table(self) -> str:
+        memory = self._tracemalloc is not None
+        header = f"{'pass':<28}{'wall ms':>10}{'cpu ms':>10}{'wall %':>8}" + (f"{'peak KiB':>11}" if memory else "")
+        lines = [header, "-" * len(header)]
+
+        def row(name: str, wall: float, cpu: float, peak: int | None) -> str:
+            share = 100 * wall / self.total_wall if self.total_wall else 0.0
+            text = f"{name:<28}{wall * 1000:>10.2f}{cpu * 1000:>10.2f}{share:>7.1f}%"
+            if memory and peak is not None:
+                text += f"{peak / 1024:>11.1f}"
+            return text
+
+        for r in self.records:
+            lines.append(row("  " * r.depth + r.name, r.wall, r.cpu, r.peak))
+        # Driver work outside any pass, mostly importing the stages.
+        top = [r for r in self.records if r.depth == 0]
+        lines.append(
+            row(
+                "(other)",
+                max(0.0, self.total_wall - sum(r.wall for r in top)),
+                max(0.0, self.total_cpu - sum(r.cpu for r in top)),
+                None,
+            )
+        )
+        lines.append("-" * len(header))
+        lines.append(row("total", self.total_wall, self.total_cpu, self.total_peak))
+        if self.sizes:
+            lines.append("")
+            lines.extend(f"{name:<28}{value:>10}" for name, value in self.sizes.items())
+        return "\n".join(lines)
+
+    def report(self, fmt: str = "table", stream: TextIO | None = None) -> None:
+        stream = stream or sys.stderr
+        if fmt == "json":
+            import json
+
+            print(json.dumps(self.as_dict()), file=stream)
+        else:
+            print(self.format_table(), file=stream)
+
+
+_active: PassRecorder | None = None
+
+
+def enable(track_memory: bool = False) -> PassRecorder:
+    global _active
+    _active = PassRecorder(track_memory)
+    return _active
+
+
+def disable() -> PassRecorder | None:
+    global _active
+    recorder, _active = _active, None
+    if recorder is not None:
+        recorder.stop()
+    return recorder
+
+
+def enabled() -> bool:
+    return _active is not None
+
+
+def stage(name: str) -> Any:
+    """Context manager timing `name` when instrumentation is on, a no-op otherwise."""
+    if _active is None:
+        return _NO_STAGE
+    return _active.stage(name)
+
+
+def record_size(name: str, value: int) -> None:
+    if _active is not None:
+        _active.sizes[name] = value
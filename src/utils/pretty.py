@@ -1,29 +1,91 @@
-from typing import Dict, List, NamedTuple
+import io
+import sys
+from typing import Any, Callable, Dict, List, NamedTuple, TextIO
 
 from src.middle.tacky_ir import *
+from src.utils.walker import Visit, fold
 
+# Written in place of whatever a depth or size cutoff leaves out.
+ELISION = "..."
 
-def pretty_print_tree(root: NamedTuple, indent=0) -> str:
-    spacer = " " * (indent + 2)
-    if isinstance(root, list):
-        if not root:
-            return "[]"
-        result = "[\n"
-        for item in root:
-            result += spacer + pretty_print_tree(item, indent + 2) + ",\n"
-        result += " " * (indent) + "]"
-        return result
-    elif isinstance(root, tuple) and hasattr(root, "_fields"):
-        result = f"{type(root).__name__}(\n"
+# The printers hand their text to the stream in runs of about this many pieces,
+# or of about _FLUSH_CHARS characters.
+_FLUSH_PARTS = 4096
+_FLUSH_CHARS = 1 << 20
+
+
+class _TreePrinter:
+    def __init__(self, out: TextIO, max_depth: int | None, max_nodes: int | None) -> None:
+        self.out = out
+        self.parts: List[str] = []
+        self.max_depth = sys.maxsize if max_depth is None else max_depth
+        # Nodes and lists that may still be printed in full.
+        self.nodes_left = sys.maxsize if max_nodes is None else max_nodes
+
+    def flush(self) -> None:
+        self.out.write("".join(self.parts))
+        self.parts.clear()
+
+
+def _pretty_node(root: Any, indent: int, depth: int, printer: _TreePrinter):
+    out = printer.parts
+    # Most pieces are indentation, so deep trees flush after fewer of them.
+    if len(out) * (indent + 8) >= _FLUSH_CHARS or len(out) >= _FLUSH_PARTS:
+        printer.flush()
+    is_list = isinstance(root, list)
+    if is_list and not root:
+        out.append("[]")
+        return
+    if not is_list and not (isinstance(root, tuple) and hasattr(root, "_fields")):
+        out.append(repr(root))
+        return
+    if depth >= printer.max_depth or printer.nodes_left <= 0:
+        out.append(f"[{ELISION}]" if is_list else f"{type(root).__name__}({ELISION})")
+        return
+    printer.nodes_left -= 1
+
+    # Indentation is made where it is written: a string kept in every frame on the
+    # walker's stack would take memory quadratic in the depth of the tree.
+    if is_list:
+        out.append("[\n")
+        for i, item in enumerate(root):
+            if printer.nodes_left <= 0:
+                # One line for the rest of the list rather than one per item.
+                out.append(f"{' ' * (indent + 2)}{ELISION} {len(root) - i} more\n")
+                break
+            out.append(" " * (indent + 2))
+            yield Visit(item, indent + 2, depth + 1, printer)
+            out.append(",\n")
+        out.append(" " * (indent) + "]")
+    else:
+        out.append(f"{type(root).__name__}(\n")
         for field in root._fields:
             value = getattr(root, field)
-            result += f"{spacer}{field}="
-            result += pretty_print_tree(value, indent + 2)
-            result += ",\n"
-        result += " " * indent + ")"
-        return result
-    else:
-        return repr(root)
+            out.append(f"{' ' * (indent + 2)}{field}=")
+            yield Visit(value, indent + 2, depth + 1, printer)
+            out.append(",\n")
+        out.append(" " * indent + ")")
+
+
+def write_tree(
+    root: Any, out: TextIO, indent: int = 0, max_depth: int | None = None, max_nodes: int | None = None
+) -> None:
+    """Writes `root` to `out` as pretty_print_tree formats it, as it goes.
+
+    Nodes and lists more than `max_depth` levels below `root`, and all of
+    them after the first `max_nodes`, are written as ELISION.
+    """
+    printer = _TreePrinter(out, max_depth, max_nodes)
+    fold(root, {}, indent, 0, printer, default=_pretty_node)
+    printer.flush()
+
+
+def pretty_print_tree(
+    root: NamedTuple, indent=0, max_depth: int | None = None, max_nodes: int | None = None
+) -> str:
+    out = io.StringIO()
+    write_tree(root, out, indent, max_depth, max_nodes)
+    return out.getvalue()
 
 
 def _val(v: TACKYValue) -> str:
@@ -34,61 +96,90 @@ def _val(v: TACKYValue) -> str:
     raise TypeError(f"Unknown TACKY value: {v!r}")
 
 
-def pretty_tacky(obj: TACKYProgram | TACKYFunction, show_return: bool = True) -> str:
-    _BINARY_OP_MAP: Dict[TACKYBinaryOpType, str] = {
-        TACKYBinaryOpType.ADD: "+",
-        TACKYBinaryOpType.SUBTRACT: "-",
-        TACKYBinaryOpType.MULTIPLY: "*",
-        TACKYBinaryOpType.DIVIDE: "/",
-        TACKYBinaryOpType.REMAINDER: "%",
-        TACKYBinaryOpType.BITWISE_AND: "&",
-        TACKYBinaryOpType.BITWISE_OR: "|",
-        TACKYBinaryOpType.BITWISE_XOR: "^",
-        TACKYBinaryOpType.L_SHIFT: "<<",
-        TACKYBinaryOpType.R_SHIFT: ">>",
-        # Note: && and || should not generally appear here if you lowered them to Jumpes
-        TACKYBinaryOpType.EQUAL: "==",
-        TACKYBinaryOpType.NOT_EQUAL: "!=",
-        TACKYBinaryOpType.LESS_THAN: "<",
-        TACKYBinaryOpType.LESS_THAN_OR_EQUAL: "<=",
-        TACKYBinaryOpType.GREATER_THAN: ">",
-        TACKYBinaryOpType.GREATER_THAN_OR_EQUAL: ">=",
-    }
-
-    _UNARY_OP_MAP: Dict[TACKYUnaryOpType, str] = {
-        TACKYUnaryOpType.COMPLEMENT: "~",
-        TACKYUnaryOpType.NEGATION: "-",
-        TACKYUnaryOpType.NOT: "!",
-    }
+_BINARY_OP_MAP: Dict[TACKYBinaryOpType, str] = {
+    TACKYBinaryOpType.ADD: "+",
+    TACKYBinaryOpType.SUBTRACT: "-",
+    TACKYBinaryOpType.MULTIPLY: "*",
+    TACKYBinaryOpType.DIVIDE: "/",
+    TACKYBinaryOpType.REMAINDER: "%",
+    TACKYBinaryOpType.BITWISE_AND: "&",
+    TACKYBinaryOpType.BITWISE_OR: "|",
+    TACKYBinaryOpType.BITWISE_XOR: "^",
+    TACKYBinaryOpType.L_SHIFT: "<<",
+    TACKYBinaryOpType.R_SHIFT: ">>",
+    # Note: && and || should not generally appear here if you lowered them to Jumpes
+    TACKYBinaryOpType.EQUAL: "==",
+    TACKYBinaryOpType.NOT_EQUAL: "!=",
+    TACKYBinaryOpType.LESS_THAN: "<",
+    TACKYBinaryOpType.LESS_THAN_OR_EQUAL: "<=",
+    TACKYBinaryOpType.GREATER_THAN: ">",
+    TACKYBinaryOpType.GREATER_THAN_OR_EQUAL: ">=",
+}
+
+_UNARY_OP_MAP: Dict[TACKYUnaryOpType, str] = {
+    TACKYUnaryOpType.COMPLEMENT: "~",
+    TACKYUnaryOpType.NEGATION: "-",
+    TACKYUnaryOpType.NOT: "!",
+}
+
+# One formatter per instruction class; instructions without one are not printed.
+_TACKY_FORMATS: Dict[type, Callable[[Any], str]] = {
+    TACKYLabel: lambda instr: f"{instr.identifier}:",
+    TACKYCopy: lambda instr: f"{_val(instr.dst)} = {_val(instr.src)}",
+    TACKYJump: lambda instr: f"goto {instr.target}",
+    TACKYJumpIfZero: lambda instr: f"ifz {_val(instr.condition)} -> {instr.target}",
+    TACKYJumpIfNotZero: lambda instr: f"ifnz {_val(instr.condition)} -> {instr.target}",
+    TACKYUnaryOp: lambda instr: (
+        f"{_val(instr.destination)} = {_UNARY_OP_MAP[instr.unary_operator]}{_val(instr.source)}"
+    ),
+    TACKYBinaryOp: lambda instr: (
+        f"{_val(instr.destination)} = {_val(instr.source_1)} "
+        f"{_BINARY_OP_MAP[instr.binary_operator]} {_val(instr.source_2)}"
+    ),
+    TACKYIncrementCounter: lambda instr: f"count block {instr.index}",
+    TACKYReturn: lambda instr: f"return {_val(instr.value)}",
+}
 
+
+def format_tacky_instruction(instr: TACKYInstruction) -> str:
+    """The line write_tacky prints for `instr`."""
+    return _TACKY_FORMATS.get(type(instr), repr)(instr)
+
+
+def write_tacky(
+    obj: TACKYProgram | TACKYFunction, out: TextIO, show_return: bool = True, max_lines: int | None = None
+) -> None:
+    """Writes the instructions of `obj` to `out` one per line, as it goes.
+
+    After `max_lines` lines, the rest is summed up in one ELISION line.
+    """
     fn = obj.function_definition if isinstance(obj, TACKYProgram) else obj
+    formats = _TACKY_FORMATS
+    if not show_return:
+        formats = {kind: formatter for kind, formatter in formats.items() if kind is not TACKYReturn}
+    lines_left = sys.maxsize if max_lines is None else max_lines
 
     lines: List[str] = []
-    for instr in fn.instructions:
-        if isinstance(instr, TACKYLabel):
-            lines.append(f"{instr.identifier}:")
-        elif isinstance(instr, TACKYCopy):
-            lines.append(f"{_val(instr.dst)} = {_val(instr.src)}")
-        elif isinstance(instr, TACKYJump):
-            lines.append(f"goto {instr.target}")
-        elif isinstance(instr, TACKYJumpIfZero):
-            lines.append(f"ifz {_val(instr.condition)} -> {instr.target}")
-        elif isinstance(instr, TACKYJumpIfNotZero):
-            lines.append(f"ifnz {_val(instr.condition)} -> {instr.target}")
-        elif isinstance(instr, TACKYUnaryOp):
-            dst = _val(instr.destination)
-            src = _val(instr.source)
-            lines.append(f"{dst} = {_UNARY_OP_MAP[instr.unary_operator]}{src}")
-        elif isinstance(instr, TACKYBinaryOp):
-            dst = _val(instr.destination)
-            s1 = _val(instr.source_1)
-            s2 = _val(instr.source_2)
-            op = _BINARY_OP_MAP[instr.binary_operator]
-            lines.append(f"{dst} = {s1} {op} {s2}")
-        elif isinstance(instr, TACKYReturn) and show_return:
-            lines.append(f"return {_val(instr.value)}")
-        else:
-            # ignore return if show_return=False
+    # Lines are separated, not terminated, by newlines.
+    separator = ""
+    for i, instr in enumerate(fn.instructions):
+        formatter = formats.get(type(instr))
+        if formatter is None:
             continue
+        if lines_left <= 0:
+            lines.append(f"{ELISION} {len(fn.instructions) - i} more instructions")
+            break
+        lines_left -= 1
+        lines.append(formatter(instr))
+        if len(lines) >= _FLUSH_PARTS:
+            out.write(separator + "\n".join(lines))
+            lines.clear()
+            separator = "\n"
+    if lines:
+        out.write(separator + "\n".join(lines))
+
 
-    return "\n".join(lines)
+def pretty_tacky(obj: TACKYProgram | TACKYFunction, show_return: bool = True, max_lines: int | None = None) -> str:
+    out = io.StringIO()
+    write_tacky(obj, out, show_return, max_lines)
+    return out.getvalue()
@@ -0,0 +1,307 @@
+from __future__ import annotations
+
+import hashlib
+import importlib
+import itertools
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Binary format shared by every IR (tokens, AST, TACKY and Assembly IR):
+#
+#   magic "MYIR" | varint version | 8-byte schema digest
+#   varint string count | (varint length, UTF-8 bytes) per string
+#   value
+#
+# The value is written in post-order as varint tags. Scalars carry their payload
+# after the tag (zigzag varint for ints, string-table index for strs). A list
+# tag follows its items and carries the item count. Tags from _FIRST_TYPE_TAG up
+# name a NamedTuple (following its fields) or an Enum (carrying the member's
+# index) from IR_MODULES. The schema digest covers those class, field and member
+# names, so a file written by a compiler with a different IR layout is rejected
+# instead of misread.
+
+MAGIC = b"MYIR"
+FORMAT_VERSION = 1
+
+IR_MODULES = (
+    "src.frontend.tokens",
+    "src.frontend.ast_ir",
+    "src.middle.tacky_ir",
+    "src.backend.assembly_ir",
+)
+
+_NONE = 0
+_INT = 1
+_STR = 2
+_LIST = 3
+_TRUE = 4
+_FALSE = 5
+_OFFSETS = 6
+_FIRST_TYPE_TAG = 16
+
+
+class SerializationError(ValueError):
+    pass
+
+
+class _Schema:
+    def __init__(self) -> None:
+        self.types: List[type] = []
+        self.tags: Dict[type, int] = {}
+        self.members: Dict[type, List[Enum]] = {}
+        self.member_index: Dict[Enum, int] = {}
+        # Interning constructors (see make_stack etc.), so decoded operands are shared too.
+        self.interned: Dict[type, Any] = {}
+
+        digest = hashlib.sha256()
+        for module_name in IR_MODULES:
+            module = importlib.import_module(module_name)
+            self.interned.update(getattr(module, "INTERNED", {}))
+            for name, obj in sorted(vars(module).items()):
+                if not isinstance(obj, type) or obj.__module__ != module_name:
+                    continue
+                if issubclass(obj, Enum):
+                    self.members[obj] = list(obj)
+                    for i, member in enumerate(obj):
+                        self.member_index[member] = i
+                    digest.update(f"{module_name}.{name}:{','.join(m.name for m in obj)};".encode())
+                elif issubclass(obj, tuple) and hasattr(obj, "_fields"):
+                    digest.update(f"{module_name}.{name}({','.join(obj._fields)});".encode())
+                else:
+                    continue
+                self.tags[obj] = _FIRST_TYPE_TAG + len(self.types)
+                self.types.append(obj)
+
+        self.digest = digest.digest()[:8]
+        self.offset_allocator = importlib.import_module("src.backend.assembly_ir").OffsetAllocator
+
+
+_schema: _Schema | None = None
+
+
+def _get_schema() -> _Schema:
+    global _schema
+    if _schema is None:
+        _schema = _Schema()
+    return _schema
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _zigzag(value: int) -> int:
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+class _Close:
+    """Marks where a container's tag is written, after all of its children."""
+
+    __slots__ = ("tag", "extra")
+
+    def __init__(self, tag: int, extra: int) -> None:
+        self.tag = tag
+        self.extra = extra
+
+
+def dumps(root: Any) -> bytes:
+    schema = _get_schema()
+    tags = schema.tags
+    members = schema.members
+    member_index = schema.member_index
+    strings: Dict[str, int] = {}
+    body = bytearray()
+    write = _write_varint
+
+    # Children are written before their parent (post-order), so the decoder can
+    # rebuild the tree with a single value stack. The walk uses an explicit
+    # stack, so deep trees cannot overflow the Python stack.
+    stack: List[Any] = [root]
+    while stack:
+        value = stack.pop()
+        cls = type(value)
+        tag = tags.get(cls)
+
+        if cls is _Close:
+            write(body, value.tag)
+            if value.extra >= 0:
+                write(body, value.extra)
+        elif tag is not None:
+            if cls in members:
+                write(body, tag)
+                write(body, member_index[value])
+            else:
+                stack.append(_Close(tag, -1))
+                stack.extend(reversed(value))
+        elif value is None:
+            body.append(_NONE)
+        elif value is True or value is False:
+            body.append(_TRUE if value else _FALSE)
+        elif cls is int:
+            body.append(_INT)
+            write(body, _zigzag(value))
+        elif cls is str:
+            index = strings.get(value)
+            if index is None:
+                index = strings[value] = len(strings)
+            body.append(_STR)
+            write(body, index)
+        elif cls is list:
+            stack.append(_Close(_LIST, len(value)))
+            stack.extend(reversed(value))
+        elif cls is schema.offset_allocator:
+            # Restore the allocator's next slot too, so later passes can keep allocating.
+            flat = list(itertools.chain.from_iterable(value.items()))
+            stack.append(_Close(_OFFSETS, -1))
+            stack.extend(reversed([value.next_offset, value.step, value.max_offset, flat]))
+        else:
+            raise SerializationError(f"Cannot serialize {cls.__name__}: {value!r}")
+
+    out = bytearray(MAGIC)
+    write(out, FORMAT_VERSION)
+    out += schema.digest
+    write(out, len(strings))
+    for text in strings:
+        encoded = text.encode()
+        write(out, len(encoded))
+        out += encoded
+    out += body
+    return bytes(out)
+
+
+def _constructor(schema: _Schema, cls: type) -> Any:
+    intern = schema.interned.get(cls)
+    if intern is None:
+        return cls._make
+    return lambda args: intern(*args)
+
+
+def loads(data: bytes) -> Any:
+    schema = _get_schema()
+    if data[:4] != MAGIC:
+        raise SerializationError("Not a serialized IR (bad magic)")
+
+    view = memoryview(data)
+    pos = 4
+    end = len(data)
+
+    def read_varint() -> int:
+        nonlocal pos
+        result = shift = 0
+        while True:
+            if pos >= end:
+                raise SerializationError("Truncated IR")
+            byte = data[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    version = read_varint()
+    if version != FORMAT_VERSION:
+        raise SerializationError(f"Unsupported IR format version {version} (expected {FORMAT_VERSION})")
+    if data[pos : pos + 8] != schema.digest:
+        raise SerializationError("IR was written by a compiler with a different IR schema")
+    pos += 8
+
+    strings: List[str] = []
+    for _ in range(read_varint()):
+        length = read_varint()
+        if pos + length > end:
+            raise SerializationError("Truncated IR")
+        try:
+            strings.append(str(view[pos : pos + length], "utf-8"))
+        except UnicodeDecodeError as exc:
+            raise SerializationError(f"Malformed IR: bad string at byte {pos}: {exc}") from None
+        pos += length
+
+    # Per type tag: the enum's members, or (constructor, field count).
+    table = [schema.members.get(cls) or (_constructor(schema, cls), len(cls._fields)) for cls in schema.types]
+    stack: List[Any] = []
+    push = stack.append
+
+    # Indices and counts are only checked where a bad one would not raise on its own.
+    try:
+        while pos < end:
+            tag = data[pos]
+            pos += 1
+            if tag >= 0x80:
+                pos -= 1
+                tag = read_varint()
+
+            if tag >= _FIRST_TYPE_TAG:
+                entry = table[tag - _FIRST_TYPE_TAG]
+                if type(entry) is list:
+                    if pos >= end or data[pos] >= 0x80:
+                        index = read_varint()
+                    else:
+                        index = data[pos]
+                        pos += 1
+                    push(entry[index])
+                    continue
+                make, count = entry
+                if count:
+                    args = stack[-count:]
+                    del stack[-count:]
+                    push(make(args))
+                else:
+                    push(make(()))
+            elif tag == _STR:
+                if pos >= end or data[pos] >= 0x80:
+                    index = read_varint()
+                else:
+                    index = data[pos]
+                    pos += 1
+                push(strings[index])
+            elif tag == _INT:
+                push(_unzigzag(read_varint()))
+            elif tag == _LIST:
+                count = read_varint()
+                if count > len(stack):
+                    raise SerializationError(f"Malformed IR: list of {count} items at byte {pos}")
+                if count:
+                    items = stack[-count:]
+                    del stack[-count:]
+                    push(items)
+                else:
+                    push([])
+            elif tag == _NONE:
+                push(None)
+            elif tag == _TRUE or tag == _FALSE:
+                push(tag == _TRUE)
+            elif tag == _OFFSETS:
+                next_offset, step, max_offset, flat = stack[-4:]
+                del stack[-4:]
+                offsets = schema.offset_allocator(next_offset, step)
+                offsets.update(zip(flat[::2], flat[1::2]))
+                offsets.max_offset = max_offset
+                push(offsets)
+            else:
+                raise SerializationError(f"Unknown tag {tag} at byte {pos - 1}")
+    except SerializationError:
+        raise
+    except (IndexError, TypeError, ValueError) as exc:
+        raise SerializationError(f"Malformed IR near byte {pos}: {exc}") from None
+
+    if len(stack) != 1:
+        raise SerializationError(f"Malformed IR: {len(stack)} values left on the stack")
+    return stack[0]
+
+
+def dump(root: Any, path: str | Path) -> Path:
+    path = Path(path)
+    path.write_bytes(dumps(root))
+    return path
+
+
+def load(path: str | Path) -> Any:
+    return loads(Path(path).read_bytes())
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import traceback
+from pathlib import Path
+from typing import Callable, List
+
+# mycc forwards its argv to the server listening on this socket path when it is set.
+SERVER_ENV = "MYCC_SERVER"
+
+_HEADER = struct.Struct("!I")
+_EXIT = struct.Struct("!i")
+
+
+def default_socket_path() -> Path:
+    import tempfile
+
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return Path(runtime_dir) / f"mycc-{os.getuid()}.sock"
+
+
+def _recv_exact(conn: socket.socket, size: int, initial: bytes = b"") -> bytes:
+    data = bytearray(initial)
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed mid-message")
+        data += chunk
+    return bytes(data)
+
+
+def forward_to_server(socket_path: str | Path, argv: List[str]) -> int | None:
+    """Runs argv on the compile server. Returns None if no server is listening.
+
+    The client's stdin/stdout/stderr are passed to the server over the socket, so
+    output (including from gcc and --run programs) goes straight to the caller.
+    """
+    try:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(str(socket_path))
+    except OSError:
+        return None
+
+    with conn:
+        request = json.dumps({"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)}).encode()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        socket.send_fds(conn, [_HEADER.pack(len(request)) + request], [0, 1, 2])
+        try:
+            (rc,) = _EXIT.unpack(_recv_exact(conn, _EXIT.size))
+        except ConnectionError:
+            print("mycc: compile server closed the connection", file=sys.stderr)
+            return 1
+    return rc
+
+
+def _run_request(conn: socket.socket, handler: Callable[[List[str]], int]) -> int:
+    data, fds, _, _ = socket.recv_fds(conn, 1 << 16, 3)
+    (size,) = _HEADER.unpack(_recv_exact(conn, _HEADER.size, data[: _HEADER.size]))
+    request = json.loads(_recv_exact(conn, size, data[_HEADER.size :]))
+
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    os.environ.clear()
+    os.environ.update(request["env"])
+    os.chdir(request["cwd"])
+
+    # Same exit status the interpreter would give for `raise SystemExit(main(argv))`.
+    try:
+        rc = handler(request["argv"])
+    except SystemExit as exc:
+        if exc.code is None or isinstance(exc.code, int):
+            rc = exc.code
+        else:
+            print(exc.code, file=sys.stderr)
+            rc = 1
+    except BaseException:
+        traceback.print_exc()
+        rc = 1
+    return rc if rc is not None else 0
+
+
+def _serve_connection(conn: socket.socket, handler: Callable[[List[str]], int]) -> None:
+    """Runs in a forked child, so no state leaks from one compilation to the next."""
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    rc = 1
+    try:
+        rc = _run_request(conn, handler)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        conn.sendall(_EXIT.pack(rc))
+    finally:
+        os._exit(rc & 0xFF)
+
+
+def serve(socket_path: str | Path, handler: Callable[[List[str]], int]) -> int:
+    path = Path(socket_path)
+    if path.exists():
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(path))
+        except OSError:
+            path.unlink()  # Stale socket left behind by a server that died.
+        else:
+            probe.close()
+            print(f"Error: a compile server is already listening on {path}", file=sys.stderr)
+            return 1
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(str(path))
+    os.chmod(path, 0o600)
+    listener.listen(128)
+
+    def shutdown(signum, frame):
+        raise KeyboardInterrupt
+
+    # Children are never waited on; let the kernel reap them.
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, shutdown)
+    print(f"mycc: compile server listening on {path}", file=sys.stderr)
+
+    try:
+        while True:
+            conn, _ = listener.accept()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            if os.fork() == 0:
+                listener.close()
+                _serve_connection(conn, handler)
+            conn.close()
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        listener.close()
+        path.unlink(missing_ok=True)
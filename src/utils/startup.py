@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import sys
+import time
+from importlib.abc import Loader, MetaPathFinder
+from typing import Any, List, TextIO
+
+
+class _TimedLoader(Loader):
+    def __init__(self, profiler: ImportProfiler, name: str, loader: Loader) -> None:
+        self._profiler = profiler
+        self._name = name
+        self._loader = loader
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module) -> None:
+        self._profiler._enter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._leave(self._name)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._loader, name)
+
+
+class ImportProfiler(MetaPathFinder):
+    """Times every module executed after `install()`, like `python -X importtime`.
+
+    Each record is (self_us, cumulative_us, depth, name), in completion order, so
+    nested imports are listed before the module that triggered them.
+    """
+
+    def __init__(self) -> None:
+        self.records: List[tuple[int, int, int, str]] = []
+        self._stack: List[List[float]] = []
+        self._finding = False
+
+    def install(self) -> ImportProfiler:
+        sys.meta_path.insert(0, self)
+        return self
+
+    def uninstall(self) -> None:
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        if self._finding:
+            return None
+        self._finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                        spec.loader = _TimedLoader(self, fullname, spec.loader)
+                    return spec
+            return None
+        finally:
+            self._finding = False
+
+    def _enter(self) -> None:
+        # [start time, time spent in nested imports]
+        self._stack.append([time.perf_counter(), 0.0])
+
+    def _leave(self, name: str) -> None:
+        start, nested = self._stack.pop()
+        cumulative = time.perf_counter() - start
+        if self._stack:
+            self._stack[-1][1] += cumulative
+        self.records.append(
+            (int((cumulative - nested) * 1e6), int(cumulative * 1e6), len(self._stack), name)
+        )
+
+    def report(self, stream: TextIO | None = None) -> None:
+        stream = stream or sys.stderr
+        print("import time: self [us] | cumulative | imported package", file=stream)
+        for self_us, cumulative_us, depth, name in self.records:
+            print(f"import time: {self_us:>9} | {cumulative_us:>10} | {'  ' * depth}{name}", file=stream)
+        total = sum(cumulative for _, cumulative, depth, _ in self.records if depth == 0)
+        print(f"import time: total {total} us in {len(self.records)} modules", file=stream)
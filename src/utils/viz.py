@@ -1,11 +1,16 @@
 from __future__ import annotations
 
+import heapq
 import html
+import io
+import json
 import textwrap
-from dataclasses import dataclass, field
 from enum import Enum
 from pathlib import Path
-from typing import Any, Iterable
+from typing import Any, Iterable, TextIO
+
+from src.utils.cfg import FALL_THROUGH, JUMP, TAKEN, Block, block_cost, function_blocks, is_flat_ir
+from src.utils.walker import Visit, fold
 
 
 GRAPHICAL_FORMATS = {"svg", "html", "dot"}
@@ -18,19 +23,6 @@ _LINE_HEIGHT = 17
 _HEADER_HEIGHT = 28
 
 
-@dataclass
-class VizNode:
-    node_id: str
-    title: str
-    fields: list[str] = field(default_factory=list)
-    children: list[tuple[str, VizNode]] = field(default_factory=list)
-    x: float = 0
-    y: float = 0
-    width: float = _NODE_WIDTH
-    height: float = 0
-    subtree_width: float = 0
-
-
 def is_namedtuple_instance(x: Any) -> bool:
     return isinstance(x, tuple) and hasattr(x, "_fields")
 
@@ -83,6 +75,8 @@ def _value_label(x: Any) -> str:
 
 
 def _wrap_line(text: str, width: int = 28) -> list[str]:
+    if len(text) <= width:
+        return [text]
     return textwrap.wrap(text, width=width, break_long_words=False) or [text]
 
 
@@ -98,194 +92,703 @@ def _new_id(counter: list[int]) -> str:
     return f"n{counter[0]}"
 
 
-def _build_tree(root: Any, counter: list[int] | None = None) -> VizNode:
-    if counter is None:
-        counter = [0]
+class _Tree:
+    """The boxes to draw for an IR tree, numbered in pre-order from the root at 0.
 
-    node_id = _new_id(counter)
+    Each attribute holds one entry per box. Lists of plain values take far
+    less memory than an object per box, which matters for trees of a million
+    nodes.
+    """
+
+    def __init__(self, wrap: bool = True) -> None:
+        # Whether long field lines are wrapped to the width of a box.
+        self.wrap = wrap
+        self.titles: list[str] = []
+        self.lines: list[tuple[str, ...]] = []
+        # Label of the edge from the parent; "" for the root.
+        self.edge_labels: list[str] = []
+        self.parents: list[int] = []
+        self.children: list[list[int] | tuple[()]] = []
+        self.depths: list[int] = []
+        # Identical field lines are stored once.
+        self._shared_lines: dict[tuple[str, ...], tuple[str, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def add(self, parent: int, edge_label: str, title: str, fields: list[str]) -> int:
+        index = len(self.titles)
+        lines = tuple(_field_lines(fields) if self.wrap else fields)
+        self.titles.append(title)
+        self.lines.append(self._shared_lines.setdefault(lines, lines))
+        self.edge_labels.append(edge_label)
+        self.parents.append(parent)
+        self.children.append(())
+        if parent < 0:
+            self.depths.append(0)
+        else:
+            if not self.children[parent]:
+                self.children[parent] = []
+            self.children[parent].append(index)
+            self.depths.append(self.depths[parent] + 1)
+        return index
+
+    def node_id(self, index: int) -> str:
+        return f"n{index + 1}"
+
+    def height(self, index: int) -> float:
+        lines = self.lines[index]
+        return _HEADER_HEIGHT + (len(lines) * _LINE_HEIGHT if lines else 0) + _PADDING
 
+
+_INDEX_LABELS = [f"[{i}]" for i in range(64)]
+
+
+def _index_label(i: int) -> str:
+    return _INDEX_LABELS[i] if i < len(_INDEX_LABELS) else f"[{i}]"
+
+
+def _build_node(root: Any, tree: _Tree, parent: int, edge_label: str):
     if isinstance(root, list):
-        node = VizNode(node_id=node_id, title=f"list[{len(root)}]")
-        if not root:
-            node.fields.append("empty")
+        index = tree.add(parent, edge_label, f"list[{len(root)}]", [] if root else ["empty"])
         for i, item in enumerate(root):
-            node.children.append((f"[{i}]", _build_tree(item, counter)))
-        return node
+            yield Visit(item, tree, index, _index_label(i))
+        return index
 
     if is_namedtuple_instance(root):
-        node = VizNode(node_id=node_id, title=root.__class__.__name__)
+        fields: list[str] = []
+        children: list[tuple[str, Any]] = []
         for field_name in root._fields:
             value = getattr(root, field_name)
             if is_leaf_value(value):
-                node.fields.append(f"{field_name} = {_value_label(value)}")
-            elif isinstance(value, list):
-                if value:
-                    node.children.append((field_name, _build_tree(value, counter)))
-                else:
-                    node.fields.append(f"{field_name} = []")
+                fields.append(f"{field_name} = {_value_label(value)}")
+            elif isinstance(value, list) and not value:
+                fields.append(f"{field_name} = []")
             else:
-                node.children.append((field_name, _build_tree(value, counter)))
-        return node
+                children.append((field_name, value))
+        index = tree.add(parent, edge_label, root.__class__.__name__, fields)
+        for field_name, value in children:
+            yield Visit(value, tree, index, field_name)
+        return index
+
+    return tree.add(parent, edge_label, root.__class__.__name__, [_value_label(root)])
+
+
+def _build_tree(root: Any, wrap: bool = True) -> _Tree:
+    tree = _Tree(wrap)
+    fold(root, {}, tree, -1, "", default=_build_node)
+    return tree
+
+
+def _tidy_layout(tree: _Tree) -> list[float]:
+    """The x of the centre of every box, for a tidy drawing of the tree.
+
+    This is Walker's algorithm in the linear-time form of Buchheim, Juenger and
+    Leipert ("Improving Walker's Algorithm to Run in Linear Time", 2002):
+    siblings are placed side by side and each subtree is pushed right until its
+    left contour clears the right contour of the subtrees before it, with the
+    shift spread over the siblings in between. Contours are followed through
+    threads, and shifts are accumulated and applied in one pass per parent.
+
+    Boxes are numbered in pre-order, so going through them backwards finishes
+    every subtree before its parent, and going forwards places every parent
+    before its children; neither walk needs a stack.
+    """
+    n = len(tree)
+    children, parents = tree.children, tree.parents
+    distance = _NODE_WIDTH + _X_GAP
+    prelim = [0.0] * n
+    mod = [0.0] * n
+    shift = [0.0] * n
+    change = [0.0] * n
+    # Where a contour continues past a leaf, or -1.
+    thread = [-1] * n
+    ancestor = list(range(n))
+    # Centre of each box over its children, relative to its subtree.
+    midpoint = [0.0] * n
+    # Position of each box among its siblings.
+    number = [0] * n
+    for kids in children:
+        for i, kid in enumerate(kids):
+            number[kid] = i
+
+    def next_left(v: int) -> int:
+        kids = children[v]
+        return kids[0] if kids else thread[v]
+
+    def next_right(v: int) -> int:
+        kids = children[v]
+        return kids[-1] if kids else thread[v]
+
+    def apportion(v: int, left_sibling: int, leftmost: int, default_ancestor: int) -> int:
+        # Inner and outer contours of the subtree at v and of the subtrees to its left.
+        v_in_right = v_out_right = v
+        v_in_left, v_out_left = left_sibling, leftmost
+        s_in_right = s_out_right = mod[v]
+        s_in_left, s_out_left = mod[v_in_left], mod[v_out_left]
+        while True:
+            right_of_left, left_of_right = next_right(v_in_left), next_left(v_in_right)
+            if right_of_left < 0 or left_of_right < 0:
+                break
+            v_in_left, v_in_right = right_of_left, left_of_right
+            v_out_left, v_out_right = next_left(v_out_left), next_right(v_out_right)
+            ancestor[v_out_right] = v
+            gap = (prelim[v_in_left] + s_in_left) - (prelim[v_in_right] + s_in_right) + distance
+            if gap > 0:
+                a = ancestor[v_in_left]
+                if parents[a] != parents[v]:
+                    a = default_ancestor
+                # Move the subtree at v right by gap, spreading the move over the subtrees between a and v.
+                subtrees = number[v] - number[a]
+                change[v] -= gap / subtrees
+                shift[v] += gap
+                change[a] += gap / subtrees
+                prelim[v] += gap
+                mod[v] += gap
+                s_in_right += gap
+                s_out_right += gap
+            s_in_left += mod[v_in_left]
+            s_in_right += mod[v_in_right]
+            s_out_left += mod[v_out_left]
+            s_out_right += mod[v_out_right]
+        if next_right(v_in_left) >= 0 and next_right(v_out_right) < 0:
+            thread[v_out_right] = next_right(v_in_left)
+            mod[v_out_right] += s_in_left - s_out_right
+        if next_left(v_in_right) >= 0 and next_left(v_out_left) < 0:
+            thread[v_out_left] = next_left(v_in_right)
+            mod[v_out_left] += s_in_right - s_out_left
+            default_ancestor = v
+        return default_ancestor
+
+    for v in range(n - 1, -1, -1):
+        kids = children[v]
+        if not kids:
+            continue
+        default_ancestor = kids[0]
+        for i, kid in enumerate(kids):
+            if i == 0:
+                prelim[kid] = midpoint[kid]
+                continue
+            prelim[kid] = prelim[kids[i - 1]] + distance
+            mod[kid] = prelim[kid] - midpoint[kid]
+            default_ancestor = apportion(kid, kids[i - 1], kids[0], default_ancestor)
+        # Apply the shifts recorded by apportion, right to left.
+        total_shift = total_change = 0.0
+        for kid in reversed(kids):
+            prelim[kid] += total_shift
+            mod[kid] += total_shift
+            total_change += change[kid]
+            total_shift += shift[kid] + total_change
+        midpoint[v] = (prelim[kids[0]] + prelim[kids[-1]]) / 2
+    if n:
+        prelim[0] = midpoint[0]
+
+    # Each box's offset is the sum of its ancestors' mods.
+    x = prelim
+    offset = [0.0] * n
+    for v in range(1, n):
+        p = parents[v]
+        offset[v] = offset[p] + mod[p]
+        x[v] = prelim[v] + offset[v]
+    return x
+
+
+class _Drawing:
+    """Where every box of a tree goes: its left edge, and the top of its row."""
+
+    def __init__(self, tree: _Tree) -> None:
+        self.tree = tree
+        centres = _tidy_layout(tree)
+        left = min(centres, default=0.0) - _NODE_WIDTH / 2
+        self.x = [centre - left - _NODE_WIDTH / 2 + 24 for centre in centres]
+        # Rows are as tall as their tallest box.
+        row_heights: list[float] = []
+        for index, depth in enumerate(tree.depths):
+            if depth == len(row_heights):
+                row_heights.append(0.0)
+            row_heights[depth] = max(row_heights[depth], tree.height(index))
+        self.row_tops: list[float] = []
+        top = 24.0
+        for height in row_heights:
+            self.row_tops.append(top)
+            top += height + _Y_GAP
+        self.row_bottoms = [row_top + height for row_top, height in zip(self.row_tops, row_heights)]
+        self.width = max(self.x, default=0.0) + _NODE_WIDTH + 24
+        self.height = (self.row_bottoms[-1] if self.row_bottoms else 0.0) + 24
 
-    return VizNode(node_id=node_id, title=root.__class__.__name__, fields=[_value_label(root)])
 
+def _svg_text(text: str, x: float, y: float, class_name: str) -> str:
+    return f'<text x="{x:.1f}" y="{y:.1f}" class="{class_name}">{html.escape(text, quote=False)}</text>'
+
+
+_SVG_STYLE = [
+    "<style>",
+    ".edge{fill:none;stroke:#8a94a6;stroke-width:1.4}",
+    ".edge-label{font:12px sans-serif;fill:#566174}",
+    ".node{fill:#ffffff;stroke:#7f8ea3;stroke-width:1.2}",
+    ".header{fill:#edf4ff}",
+    ".title{font:600 13px sans-serif;fill:#172033}",
+    ".field{font:12px ui-monospace,SFMono-Regular,Consolas,monospace;fill:#263142}",
+    "</style>",
+]
+
+
+def _write_svg(tree: _Tree, out: TextIO, xml_declaration: bool = True) -> None:
+    drawing = _Drawing(tree)
+    xs, depths, row_tops, row_bottoms = drawing.x, tree.depths, drawing.row_tops, drawing.row_bottoms
+    width, height = drawing.width, drawing.height
+    if xml_declaration:
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    out.write(
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" '
+        f'height="{height:.0f}" viewBox="0 0 {width:.0f} {height:.0f}">\n'
+    )
+    out.write("\n".join(_SVG_STYLE) + "\n")
+    out.write(
+        f'<defs><path id="header" class="header" d="M 0 6 Q 0 0 6 0 H {_NODE_WIDTH - 6} '
+        f'Q {_NODE_WIDTH} 0 {_NODE_WIDTH} 6 V {_HEADER_HEIGHT} H 0 Z"/></defs>\n'
+    )
 
-def _measure(node: VizNode) -> float:
-    lines = _field_lines(node.fields)
-    node.height = _HEADER_HEIGHT + (len(lines) * _LINE_HEIGHT if lines else 0) + _PADDING
+    half = _NODE_WIDTH / 2
+    for child in range(1, len(tree)):
+        parent = tree.parents[child]
+        start_x = xs[parent] + half
+        start_y = row_tops[depths[parent]] + tree.height(parent)
+        end_x = xs[child] + half
+        end_y = row_tops[depths[child]]
+        mid_y = row_bottoms[depths[parent]] + _Y_GAP / 2
+        out.write(
+            f'<path class="edge" d="M {start_x:.1f} {start_y:.1f} '
+            f"C {start_x:.1f} {mid_y:.1f}, {end_x:.1f} {mid_y:.1f}, "
+            f'{end_x:.1f} {end_y:.1f}"/>\n'
+        )
+        out.write(_svg_text(tree.edge_labels[child], (start_x + end_x) / 2 + 5, mid_y - 6, "edge-label") + "\n")
+
+    # Boxes are drawn in their own coordinates, which keeps the numbers to format per box to two.
+    for index in range(len(tree)):
+        out.write(
+            f'<g transform="translate({xs[index]:.1f} {row_tops[depths[index]]:.1f})">'
+            f'<rect class="node" width="{_NODE_WIDTH}" height="{tree.height(index)}" rx="6"/>'
+            f'<use href="#header"/>{_svg_text(tree.titles[index], _PADDING, 19, "title")}'
+        )
+        line_y = _HEADER_HEIGHT + _LINE_HEIGHT
+        for line in tree.lines[index]:
+            out.write(_svg_text(line, _PADDING, line_y, "field"))
+            line_y += _LINE_HEIGHT
+        out.write("</g>\n")
 
-    if not node.children:
-        node.subtree_width = node.width
-        return node.subtree_width
+    out.write("</svg>")
 
-    children_width = sum(_measure(child) for _, child in node.children)
-    children_width += _X_GAP * (len(node.children) - 1)
-    node.subtree_width = max(node.width, children_width)
-    return node.subtree_width
 
+def write_svg(root: Any, out: TextIO) -> None:
+    """Writes an SVG drawing of the IR tree `root` to `out` as it goes."""
+    _write_svg(_build_tree(root), out)
 
-def _place(node: VizNode, left: float, top: float) -> None:
-    node.x = left + (node.subtree_width - node.width) / 2
-    node.y = top
 
-    child_left = left + max(0, node.subtree_width - _children_width(node)) / 2
-    for _, child in node.children:
-        _place(child, child_left, top + node.height + _Y_GAP)
-        child_left += child.subtree_width + _X_GAP
+def ast_to_svg(root: Any) -> str:
+    out = io.StringIO()
+    write_svg(root, out)
+    return out.getvalue()
+
+
+def _json_string(text: str) -> str:
+    # "<" is escaped so that no string can close the <script> element it is embedded in.
+    return json.dumps(text).replace("<", "\\u003c")
+
+
+def _subtree_sizes(tree: _Tree) -> list[int]:
+    sizes = [1] * len(tree)
+    parents = tree.parents
+    # Pre-order puts every box after its parent, so going backwards finishes each subtree first.
+    for index in range(len(tree) - 1, 0, -1):
+        sizes[parents[index]] += sizes[index]
+    return sizes
+
+
+def _write_tree_json(tree: _Tree, out: TextIO, title: str) -> None:
+    """Writes `tree` to `out` as the JSON that the HTML viewer reads.
+
+    Boxes are in pre-order, four numbers each: its title, its edge label, its
+    field lines and the number of boxes in its subtree. The first child of box
+    i is box i + 1 and each child is followed by its next sibling after its
+    subtree, so the viewer can skip a collapsed subtree without looking at
+    it. Titles, labels and lines are indices into "strings", and field lines
+    into "fields", so each distinct string is written once.
+    """
+    strings: dict[str, int] = {}
+    fields: dict[tuple[str, ...], int] = {(): 0}
+    sizes = _subtree_sizes(tree)
+    titles, edge_labels, lines = tree.titles, tree.edge_labels, tree.lines
+    out.write(f'{{"title":{_json_string(title)},"nodes":[')
+    chunk: list[int] = []
+    for index in range(len(tree)):
+        if len(chunk) >= 4096:
+            out.write(",".join(map(str, chunk)) + ",")
+            chunk.clear()
+        chunk.append(strings.setdefault(titles[index], len(strings)))
+        chunk.append(strings.setdefault(edge_labels[index], len(strings)))
+        field_lines = lines[index]
+        field_id = fields.get(field_lines)
+        if field_id is None:
+            field_id = fields[field_lines] = len(fields)
+            for line in field_lines:
+                strings.setdefault(line, len(strings))
+        chunk.append(field_id)
+        chunk.append(sizes[index])
+    out.write(",".join(map(str, chunk)))
+    out.write('],"strings":[')
+    out.write(",".join(map(_json_string, strings)))
+    out.write('],"fields":[')
+    out.write(",".join("[" + ",".join(str(strings[line]) for line in field_lines) + "]" for field_lines in fields))
+    out.write("]}")
+
+
+_HTML_VIEWER = Path(__file__).with_name("viz_viewer.js")
+
+_HTML_STYLE = [
+    "<style>",
+    "body{margin:0;background:#f6f8fb;color:#172033;font-family:system-ui,sans-serif}",
+    "header{display:flex;gap:8px;align-items:center;padding:12px 24px;"
+    "border-bottom:1px solid #d8dee9;background:white}",
+    "h1{font-size:16px;font-weight:650;margin:0 auto 0 0}",
+    "input{font:13px system-ui,sans-serif;padding:4px 8px;width:240px}",
+    "#status{font-size:12px;color:#566174;min-width:90px;text-align:right}",
+    "#view{position:absolute;top:54px;bottom:0;left:0;right:0;overflow:auto}",
+    "#rows{position:relative}",
+    ".row{position:absolute;left:0;right:0;height:22px;line-height:22px;white-space:pre;"
+    "font:12px ui-monospace,SFMono-Regular,Consolas,monospace;cursor:default}",
+    ".row:hover{background:#edf4ff}",
+    ".row.match{background:#fff3c4}",
+    ".row.current{background:#ffd866}",
+    ".toggle{display:inline-block;width:16px;color:#7f8ea3;cursor:pointer}",
+    ".edge{color:#566174}",
+    ".title{font-weight:600;color:#172033}",
+    ".field{color:#263142}",
+    "</style>",
+]
+
+
+def write_html(root: Any, out: TextIO, title: str = "AST Visualization") -> None:
+    """Writes an HTML page for browsing the IR tree `root` to `out` as it goes.
+
+    The page holds the tree as compact JSON and a small script that shows it
+    as an outline: only expanded boxes are turned into rows, and only the
+    rows in view are in the document, so trees of a million nodes stay usable.
+    Rows can be collapsed and expanded, and searched by title (the node type)
+    or by the text of their fields, such as an identifier.
+    """
+    tree = _build_tree(root, wrap=False)
+    out.write(
+        "\n".join(
+            [
+                "<!doctype html>",
+                '<html lang="en">',
+                "<head>",
+                '<meta charset="utf-8">',
+                f"<title>{html.escape(title)}</title>",
+                *_HTML_STYLE,
+                "</head>",
+                "<body>",
+                "<header>",
+                f"<h1>{html.escape(title)}</h1>",
+                '<input id="search" type="search" placeholder="Search node types and fields">',
+                '<span id="status"></span>',
+                '<button id="prev" title="Previous match">&#8593;</button>',
+                '<button id="next" title="Next match">&#8595;</button>',
+                '<button id="expand">Expand all</button>',
+                '<button id="collapse">Collapse all</button>',
+                "</header>",
+                '<div id="view"><div id="rows"></div></div>',
+                '<script type="application/json" id="tree">',
+            ]
+        )
+    )
+    _write_tree_json(tree, out, title)
+    out.write("</script>\n<script>\n")
+    out.write(_HTML_VIEWER.read_text(encoding="utf-8"))
+    out.write("</script>\n</body>\n</html>")
 
 
-def _children_width(node: VizNode) -> float:
-    if not node.children:
-        return 0
-    return sum(child.subtree_width for _, child in node.children) + _X_GAP * (
-        len(node.children) - 1
-    )
+def ast_to_html(root: Any, title: str = "AST Visualization") -> str:
+    out = io.StringIO()
+    write_html(root, out, title)
+    return out.getvalue()
 
 
-def _iter_nodes(node: VizNode) -> Iterable[VizNode]:
-    yield node
-    for _, child in node.children:
-        yield from _iter_nodes(child)
+def _dot_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("{", "\\{").replace("}", "\\}").replace("|", "\\|")
 
 
-def _svg_text(text: str, x: float, y: float, class_name: str) -> str:
-    return (
-        f'<text x="{x:.1f}" y="{y:.1f}" class="{class_name}">'
-        f"{html.escape(text)}</text>"
+def write_dot(root: Any, out: TextIO) -> None:
+    """Writes the IR tree `root` to `out` as a Graphviz digraph, as it goes."""
+    tree = _build_tree(root)
+    out.write(
+        "\n".join(
+            [
+                "digraph AST {",
+                "  graph [rankdir=TB, bgcolor=\"transparent\", nodesep=0.45, ranksep=0.75];",
+                "  node [shape=record, style=\"rounded,filled\", fillcolor=\"#edf4ff\", color=\"#7f8ea3\", fontname=\"Consolas\"];",
+                "  edge [color=\"#8a94a6\", fontname=\"Arial\", fontsize=10];",
+            ]
+        )
+        + "\n"
     )
+    for index in range(len(tree)):
+        fields = "\\l".join(_dot_escape(line) for line in tree.lines[index])
+        title = _dot_escape(tree.titles[index])
+        label = title if not fields else f"{{{title}|{fields}\\l}}"
+        out.write(f'  {tree.node_id(index)} [label="{label}"];\n')
+        for child in tree.children[index]:
+            out.write(f'  {tree.node_id(index)} -> {tree.node_id(child)} [label="{_dot_escape(tree.edge_labels[child])}"];\n')
+    out.write("}")
 
 
-def ast_to_svg(root: Any) -> str:
-    tree = _build_tree(root)
-    _measure(tree)
-    _place(tree, 24, 24)
-
-    all_nodes = list(_iter_nodes(tree))
-    max_x = max(node.x + node.width for node in all_nodes) + 24
-    max_y = max(node.y + node.height for node in all_nodes) + 24
-
-    parts = [
-        '<?xml version="1.0" encoding="UTF-8"?>',
-        (
-            f'<svg xmlns="http://www.w3.org/2000/svg" width="{max_x:.0f}" '
-            f'height="{max_y:.0f}" viewBox="0 0 {max_x:.0f} {max_y:.0f}">'
-        ),
-        "<style>",
-        ".edge{fill:none;stroke:#8a94a6;stroke-width:1.4}",
-        ".edge-label{font:12px sans-serif;fill:#566174}",
-        ".node{fill:#ffffff;stroke:#7f8ea3;stroke-width:1.2}",
-        ".header{fill:#edf4ff}",
-        ".title{font:600 13px sans-serif;fill:#172033}",
-        ".field{font:12px ui-monospace,SFMono-Regular,Consolas,monospace;fill:#263142}",
-        "</style>",
-    ]
+def ast_to_dot(root: Any) -> str:
+    out = io.StringIO()
+    write_dot(root, out)
+    return out.getvalue()
 
-    for parent in all_nodes:
-        start_x = parent.x + parent.width / 2
-        start_y = parent.y + parent.height
-        for label, child in parent.children:
-            end_x = child.x + child.width / 2
-            end_y = child.y
-            mid_y = start_y + (_Y_GAP / 2)
-            parts.append(
-                f'<path class="edge" d="M {start_x:.1f} {start_y:.1f} '
-                f'C {start_x:.1f} {mid_y:.1f}, {end_x:.1f} {mid_y:.1f}, '
-                f'{end_x:.1f} {end_y:.1f}"/>'
-            )
-            parts.append(_svg_text(label, (start_x + end_x) / 2 + 5, mid_y - 6, "edge-label"))
 
-    for node in all_nodes:
-        parts.append(
-            f'<rect class="node" x="{node.x:.1f}" y="{node.y:.1f}" '
-            f'width="{node.width:.1f}" height="{node.height:.1f}" rx="6"/>'
-        )
-        parts.append(
-            f'<path class="header" d="M {node.x:.1f} {node.y + 6:.1f} '
-            f'Q {node.x:.1f} {node.y:.1f} {node.x + 6:.1f} {node.y:.1f} '
-            f'H {node.x + node.width - 6:.1f} '
-            f'Q {node.x + node.width:.1f} {node.y:.1f} '
-            f'{node.x + node.width:.1f} {node.y + 6:.1f} '
-            f'V {node.y + _HEADER_HEIGHT:.1f} H {node.x:.1f} Z"/>'
-        )
-        parts.append(_svg_text(node.title, node.x + _PADDING, node.y + 19, "title"))
+# Control-flow graphs (src.utils.cfg) are drawn as one column of blocks in
+# instruction order, like a listing: fall-through edges go straight down, and
+# jumps loop round the right of the column when they go forward and round the
+# left when they go back. Jumps that are in the air at the same height get
+# lanes of their own. Block headers are shaded by the share of the function's
+# estimated cycles spent in the block.
 
-        y = node.y + _HEADER_HEIGHT + _LINE_HEIGHT
-        for line in _field_lines(node.fields):
-            parts.append(_svg_text(line, node.x + _PADDING, y, "field"))
-            y += _LINE_HEIGHT
+_CFG_WIDTH = 340
+_CFG_GAP = 30
+_CFG_LANE = 12
+# Longer blocks and lines are cut short, so no box gets out of hand.
+_CFG_MAX_LINES = 40
+_CFG_LINE_CHARS = 46
 
-    parts.append("</svg>")
-    return "\n".join(parts)
+_COOL = (0xED, 0xF4, 0xFF)
+_HOT = (0xFF, 0xA3, 0x8C)
 
 
-def ast_to_html(root: Any, title: str = "AST Visualization") -> str:
-    svg = ast_to_svg(root)
-    return "\n".join(
-        [
-            "<!doctype html>",
-            '<html lang="en">',
-            "<head>",
-            '<meta charset="utf-8">',
-            f"<title>{html.escape(title)}</title>",
-            "<style>",
-            "body{margin:0;background:#f6f8fb;color:#172033;font-family:system-ui,sans-serif}",
-            "main{padding:24px}",
-            "h1{font-size:18px;font-weight:650;margin:0 0 16px}",
-            ".canvas{overflow:auto;background:white;border:1px solid #d8dee9;border-radius:8px;padding:18px}",
-            "</style>",
-            "</head>",
-            "<body>",
-            "<main>",
-            f"<h1>{html.escape(title)}</h1>",
-            f'<div class="canvas">{svg}</div>',
-            "</main>",
-            "</body>",
-            "</html>",
-        ]
-    )
+def _heat_color(fraction: float) -> str:
+    return "#" + "".join(f"{round(c + (h - c) * fraction):02x}" for c, h in zip(_COOL, _HOT))
 
 
-def ast_to_dot(root: Any) -> str:
-    tree = _build_tree(root)
+def _block_title(index: int, block: Block) -> str:
+    return block.label or f"block {index}"
+
+
+def _block_metrics(block: Block) -> str:
+    text = f"{block.instructions} instr  {block.memory_operands} mem  ~{block.cycles} cycles"
+    return text if block.count is None else f"{text}  ran {block.count}x"
+
+
+def _block_lines(block: Block) -> list[str]:
     lines = [
-        "digraph AST {",
-        "  graph [rankdir=TB, bgcolor=\"transparent\", nodesep=0.45, ranksep=0.75];",
-        "  node [shape=record, style=\"rounded,filled\", fillcolor=\"#edf4ff\", color=\"#7f8ea3\", fontname=\"Consolas\"];",
-        "  edge [color=\"#8a94a6\", fontname=\"Arial\", fontsize=10];",
+        line if len(line) <= _CFG_LINE_CHARS else line[: _CFG_LINE_CHARS - 3] + "..."
+        for line in block.lines[:_CFG_MAX_LINES]
     ]
+    if len(block.lines) > _CFG_MAX_LINES:
+        lines.append(f"... {len(block.lines) - _CFG_MAX_LINES} more")
+    return lines
 
-    def esc(value: str) -> str:
-        return value.replace("\\", "\\\\").replace('"', '\\"').replace("{", "\\{").replace("}", "\\}").replace("|", "\\|")
 
-    for node in _iter_nodes(tree):
-        fields = "\\l".join(esc(line) for line in _field_lines(node.fields))
-        label = esc(node.title) if not fields else f"{{{esc(node.title)}|{fields}\\l}}"
-        lines.append(f'  {node.node_id} [label="{label}"];')
-        for edge_label, child in node.children:
-            lines.append(f'  {node.node_id} -> {child.node_id} [label="{esc(edge_label)}"];')
+def _heats(blocks: list[Block]) -> list[float]:
+    costs = [block_cost(block) for block in blocks]
+    most = max(costs, default=0) or 1
+    return [cost / most for cost in costs]
+
+
+def _assign_lanes(spans: list[tuple[int, int]]) -> tuple[list[int], int]:
+    """The lowest free lane for each (first, last) block span, and the number of lanes used."""
+    lanes = [0] * len(spans)
+    free: list[int] = []
+    busy: list[tuple[int, int]] = []
+    used = 0
+    for edge in sorted(range(len(spans)), key=spans.__getitem__):
+        first, last = spans[edge]
+        while busy and busy[0][0] < first:
+            heapq.heappush(free, heapq.heappop(busy)[1])
+        if free:
+            lanes[edge] = heapq.heappop(free)
+        else:
+            lanes[edge] = used
+            used += 1
+        heapq.heappush(busy, (last, lanes[edge]))
+    return lanes, used
+
+
+def _write_cfg_svg(blocks: list[Block], out: TextIO, xml_declaration: bool = True) -> None:
+    lines = [_block_lines(block) for block in blocks]
+    heights = [_HEADER_HEIGHT + _LINE_HEIGHT * (len(block_lines) + 1) + _PADDING for block_lines in lines]
+    tops: list[float] = []
+    top = 24.0
+    for height in heights:
+        tops.append(top)
+        top += height + _CFG_GAP
+
+    # Jumps, as (from, to, kind); fall-throughs are drawn straight down.
+    jumps = [(i, j, kind) for i, block in enumerate(blocks) for j, kind in block.successors if kind != FALL_THROUGH]
+    forward = [jump for jump in jumps if jump[1] > jump[0]]
+    backward = [jump for jump in jumps if jump[1] <= jump[0]]
+    forward_lanes, right_lanes = _assign_lanes([(i, j) for i, j, _ in forward])
+    backward_lanes, left_lanes = _assign_lanes([(j, i) for i, j, _ in backward])
+
+    left = 24 + _CFG_LANE * (left_lanes + 1)
+    right = left + _CFG_WIDTH
+    width = right + _CFG_LANE * (right_lanes + 1) + 24
+    height = top - _CFG_GAP + 24
+    if xml_declaration:
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    out.write(
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" '
+        f'height="{height:.0f}" viewBox="0 0 {width:.0f} {height:.0f}">\n'
+    )
+    out.write(
+        "\n".join(
+            [
+                "<style>",
+                ".edge{fill:none;stroke-width:1.4}",
+                ".fall{stroke:#8a94a6}",
+                ".jump{stroke:#4a5a78}",
+                ".taken{stroke:#2f855a}",
+                ".node{fill:#ffffff;stroke:#7f8ea3;stroke-width:1.2}",
+                ".title{font:600 13px sans-serif;fill:#172033}",
+                ".metrics{font:12px sans-serif;fill:#566174}",
+                ".field{font:12px ui-monospace,SFMono-Regular,Consolas,monospace;fill:#263142}",
+                "</style>",
+            ]
+        )
+        + "\n"
+    )
+    out.write(
+        f'<defs><path id="block-header" d="M 0 6 Q 0 0 6 0 H {_CFG_WIDTH - 6} '
+        f'Q {_CFG_WIDTH} 0 {_CFG_WIDTH} 6 V {_HEADER_HEIGHT} H 0 Z"/>'
+        '<marker id="arrow" viewBox="0 0 8 8" refX="8" refY="4" markerWidth="8" markerHeight="8" '
+        'orient="auto"><path d="M 0 0 L 8 4 L 0 8 Z" fill="#4a5a78"/></marker></defs>\n'
+    )
 
-    lines.append("}")
-    return "\n".join(lines)
+    middle = left + _CFG_WIDTH / 2
+    for i, block in enumerate(blocks):
+        if any(kind == FALL_THROUGH for _, kind in block.successors):
+            out.write(
+                f'<path class="edge fall" marker-end="url(#arrow)" '
+                f'd="M {middle:.0f} {tops[i] + heights[i]:.0f} V {tops[i + 1]:.0f}"/>\n'
+            )
+    for (i, j, kind), lane in zip(forward, forward_lanes):
+        x = right + _CFG_LANE * (lane + 1)
+        out.write(
+            f'<path class="edge {kind}" marker-end="url(#arrow)" d="M {right} {tops[i] + heights[i] - 10:.0f} '
+            f'H {x} V {tops[j] + 14:.0f} H {right}"/>\n'
+        )
+    for (i, j, kind), lane in zip(backward, backward_lanes):
+        x = left - _CFG_LANE * (lane + 1)
+        out.write(
+            f'<path class="edge {kind}" marker-end="url(#arrow)" d="M {left} {tops[i] + heights[i] - 10:.0f} '
+            f'H {x} V {tops[j] + 14:.0f} H {left}"/>\n'
+        )
+
+    for i, (block, heat) in enumerate(zip(blocks, _heats(blocks))):
+        out.write(
+            f'<g id="b{i}" transform="translate({left} {tops[i]:.0f})">'
+            f'<rect class="node" width="{_CFG_WIDTH}" height="{heights[i]}" rx="6"/>'
+            f'<use href="#block-header" fill="{_heat_color(heat)}"/>'
+            f'{_svg_text(_block_title(i, block), _PADDING, 19, "title")}'
+            f'{_svg_text(_block_metrics(block), _PADDING, _HEADER_HEIGHT + _LINE_HEIGHT, "metrics")}'
+        )
+        line_y = _HEADER_HEIGHT + 2 * _LINE_HEIGHT
+        for line in lines[i]:
+            out.write(_svg_text(line, _PADDING, line_y, "field"))
+            line_y += _LINE_HEIGHT
+        out.write("</g>\n")
+
+    out.write("</svg>")
+
+
+def write_cfg_svg(root: Any, out: TextIO, label_counts: dict[str, int] | None = None) -> None:
+    """Writes an SVG drawing of the control-flow graph of a TACKY or assembly function to `out`."""
+    _write_cfg_svg(function_blocks(root, label_counts), out)
+
+
+def write_cfg_html(
+    root: Any, out: TextIO, title: str = "Control-Flow Graph", label_counts: dict[str, int] | None = None
+) -> None:
+    """Writes an HTML page with the control-flow graph of a TACKY or assembly function to `out`.
+
+    Above the drawing, a table lists the blocks that take the most estimated
+    cycles, with links to them.
+    """
+    blocks = function_blocks(root, label_counts)
+    costs = [block_cost(block) for block in blocks]
+    total = sum(costs) or 1
+    profiled = any(block.count is not None for block in blocks)
+    hottest = sorted(range(len(blocks)), key=lambda i: -costs[i])[:20]
+    out.write(
+        "\n".join(
+            [
+                "<!doctype html>",
+                '<html lang="en">',
+                "<head>",
+                '<meta charset="utf-8">',
+                f"<title>{html.escape(title)}</title>",
+                "<style>",
+                "body{margin:0;background:#f6f8fb;color:#172033;font-family:system-ui,sans-serif}",
+                "main{padding:24px}",
+                "h1{font-size:18px;font-weight:650;margin:0 0 16px}",
+                "table{border-collapse:collapse;background:white;margin:0 0 16px;font-size:13px}",
+                "th,td{border:1px solid #d8dee9;padding:4px 10px;text-align:right}",
+                "th:first-child,td:first-child{text-align:left}",
+                ".canvas{overflow:auto;background:white;border:1px solid #d8dee9;border-radius:8px;padding:18px}",
+                "</style>",
+                "</head>",
+                "<body>",
+                "<main>",
+                f"<h1>{html.escape(title)}</h1>",
+                f"<p>{len(blocks)} blocks, {sum(block.instructions for block in blocks)} instructions, "
+                f"~{sum(costs)} estimated cycles{' by profile count' if profiled else ' per pass'}.</p>",
+                "<table>",
+                "<tr><th>block</th><th>instr</th><th>mem</th><th>cycles</th>"
+                f"{'<th>runs</th>' if profiled else ''}<th>share</th></tr>",
+            ]
+        )
+        + "\n"
+    )
+    for i in hottest:
+        block = blocks[i]
+        runs = f"<td>{'' if block.count is None else block.count}</td>" if profiled else ""
+        out.write(
+            f'<tr><td><a href="#b{i}">{html.escape(_block_title(i, block))}</a></td>'
+            f"<td>{block.instructions}</td><td>{block.memory_operands}</td><td>{block.cycles}</td>"
+            f"{runs}<td>{100 * costs[i] / total:.1f}%</td></tr>\n"
+        )
+    out.write('</table>\n<div class="canvas">\n')
+    _write_cfg_svg(blocks, out, xml_declaration=False)
+    out.write("\n".join(["</div>", "</main>", "</body>", "</html>"]))
+
+
+def _dot_quote(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def write_cfg_dot(root: Any, out: TextIO, label_counts: dict[str, int] | None = None) -> None:
+    """Writes the control-flow graph of a TACKY or assembly function to `out` as a Graphviz digraph."""
+    blocks = function_blocks(root, label_counts)
+    out.write(
+        "\n".join(
+            [
+                "digraph CFG {",
+                "  graph [bgcolor=\"transparent\", nodesep=0.45, ranksep=0.5];",
+                "  node [shape=box, style=\"rounded,filled\", color=\"#7f8ea3\", fontname=\"Consolas\", fontsize=10];",
+                "  edge [color=\"#8a94a6\", fontname=\"Arial\", fontsize=9];",
+            ]
+        )
+        + "\n"
+    )
+    edge_styles = {FALL_THROUGH: "", JUMP: ' [color="#4a5a78"]', TAKEN: ' [label="taken", color="#2f855a"]'}
+    for i, (block, heat) in enumerate(zip(blocks, _heats(blocks))):
+        text = "".join(f"{_dot_quote(line)}\\l" for line in _block_lines(block))
+        label = f"{_dot_quote(_block_title(i, block))}\\n{_dot_quote(_block_metrics(block))}\\n{text}"
+        out.write(f'  b{i} [label="{label}", fillcolor="{_heat_color(heat)}"];\n')
+        for j, kind in block.successors:
+            out.write(f"  b{i} -> b{j}{edge_styles[kind]};\n")
+    out.write("}")
 
 
 def node_label(x: Any) -> str:
@@ -301,52 +804,65 @@ def node_label(x: Any) -> str:
     return x.__class__.__name__
 
 
+def _mermaid_node(x: Any, counter: list[int], lines: list[str]):
+    node_id = _new_id(counter)
+    label = node_label(x).replace('"', '\\"').replace("\\n", "<br/>")
+    lines.append(f'\t{node_id}["{label}"]')
+
+    if is_namedtuple_instance(x):
+        for field_name in x._fields:
+            value = getattr(x, field_name)
+            if is_leaf_value(value):
+                continue
+            if isinstance(value, list):
+                hub = _new_id(counter)
+                lines.append(f'\t{hub}["{field_name}[]"]')
+                lines.append(f"\t{node_id} --> {hub}")
+                for i, item in enumerate(value):
+                    child = yield item
+                    lines.append(f"\t{hub} -->|[{i}]| {child}")
+            else:
+                child = yield value
+                lines.append(f"\t{node_id} -->|{field_name}| {child}")
+    elif isinstance(x, list):
+        for i, item in enumerate(x):
+            child = yield item
+            lines.append(f"\t{node_id} -->|[{i}]| {child}")
+    return node_id
+
+
 def ast_to_mermaid(root: Any) -> str:
     lines = ["graph TD"]
-    counter = [0]
-
-    def visit(x: Any) -> str:
-        node_id = _new_id(counter)
-        label = node_label(x).replace('"', '\\"').replace("\\n", "<br/>")
-        lines.append(f'\t{node_id}["{label}"]')
-
-        if is_namedtuple_instance(x):
-            for field_name in x._fields:
-                value = getattr(x, field_name)
-                if is_leaf_value(value):
-                    continue
-                if isinstance(value, list):
-                    hub = _new_id(counter)
-                    lines.append(f'\t{hub}["{field_name}[]"]')
-                    lines.append(f"\t{node_id} --> {hub}")
-                    for i, item in enumerate(value):
-                        child = visit(item)
-                        lines.append(f"\t{hub} -->|[{i}]| {child}")
-                else:
-                    child = visit(value)
-                    lines.append(f"\t{node_id} -->|{field_name}| {child}")
-        elif isinstance(x, list):
-            for i, item in enumerate(x):
-                child = visit(item)
-                lines.append(f"\t{node_id} -->|[{i}]| {child}")
-        return node_id
-
-    visit(root)
+    fold(root, {}, [0], lines, default=_mermaid_node)
     return "\n".join(lines)
 
 
-def write_visualization(root: Any, output_path: str | Path, fmt: str | None = None) -> Path:
+def write_visualization(
+    root: Any,
+    output_path: str | Path,
+    fmt: str | None = None,
+    title: str | None = None,
+    label_counts: dict[str, int] | None = None,
+) -> Path:
+    """Writes `root` to `output_path` in `fmt`, or the format its suffix names.
+
+    TACKY and assembly are drawn as control-flow graphs, with the profile
+    counts in `label_counts` if given; other IRs as trees. `title` heads an
+    HTML page.
+    """
     path = Path(output_path)
     selected_format = (fmt or path.suffix.lstrip(".")).lower()
-
-    if selected_format == "svg":
-        body = ast_to_svg(root)
-    elif selected_format == "html":
-        body = ast_to_html(root)
-    elif selected_format == "dot":
-        body = ast_to_dot(root)
-    else:
+    if selected_format not in GRAPHICAL_FORMATS:
         raise ValueError(f"Unsupported visualization format: {selected_format!r}")
 
-    path.write_text(body, encoding="utf-8")
+    titled = {} if title is None else {"title": title}
+    with path.open("w", encoding="utf-8") as out:
+        if not is_flat_ir(root):
+            writers = {"svg": write_svg, "html": write_html, "dot": write_dot}
+            writers[selected_format](root, out, **(titled if selected_format == "html" else {}))
+        elif selected_format == "html":
+            write_cfg_html(root, out, label_counts=label_counts, **titled)
+        else:
+            writers = {"svg": write_cfg_svg, "dot": write_cfg_dot}
+            writers[selected_format](root, out, label_counts)
     return path
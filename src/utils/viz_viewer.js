@@ -0,0 +1,173 @@
+// Outline viewer for the trees that src.utils.viz.write_html embeds as JSON.
+//
+// Boxes are numbered in pre-order and "nodes" holds four numbers per box: its
+// title, its edge label, its field lines and the size of its subtree. Only
+// the rows of expanded boxes are listed, and only the rows in view are in the
+// document at any time.
+"use strict";
+(function () {
+  const data = JSON.parse(document.getElementById("tree").textContent);
+  const nodes = data.nodes, strings = data.strings, fields = data.fields;
+  const count = nodes.length / 4;
+  const ROW = 22, INDENT = 16, OVERSCAN = 20;
+  // Browsers stop growing elements somewhere past 10^7 pixels, so taller lists are scrolled in scale.
+  const MAX_HEIGHT = 8000000;
+
+  const view = document.getElementById("view");
+  const container = document.getElementById("rows");
+  const search = document.getElementById("search");
+  const status = document.getElementById("status");
+
+  const size = (i) => nodes[4 * i + 3];
+  const parent = new Int32Array(count).fill(-1);
+  const depth = new Int32Array(count);
+  for (let i = 0; i < count; i++) {
+    // The first child follows its parent and each child is followed by its next sibling after its subtree.
+    for (let child = i + 1, end = i + size(i); child < end; child += size(child)) {
+      parent[child] = i;
+      depth[child] = depth[i] + 1;
+    }
+  }
+
+  const expanded = new Uint8Array(count);
+  for (let i = 0; i < count; i++) expanded[i] = depth[i] < 3 ? 1 : 0;
+  const matched = new Uint8Array(count);
+  let matches = [], current = -1;
+  let rows = [], scale = 1;
+
+  // The listed boxes, in pre-order, skipping the subtrees of collapsed boxes.
+  function rebuild() {
+    rows = [];
+    for (let i = 0; i < count; i += expanded[i] ? 1 : size(i)) rows.push(i);
+    const height = rows.length * ROW;
+    container.style.height = Math.min(height, MAX_HEIGHT) + "px";
+    scale = height > MAX_HEIGHT ? (height - view.clientHeight) / (MAX_HEIGHT - view.clientHeight) : 1;
+  }
+
+  function rowOf(node) {
+    let lo = 0, hi = rows.length - 1;
+    while (lo <= hi) {
+      const mid = (lo + hi) >> 1;
+      if (rows[mid] < node) lo = mid + 1;
+      else if (rows[mid] > node) hi = mid - 1;
+      else return mid;
+    }
+    return -1;
+  }
+
+  function span(className, text) {
+    const element = document.createElement("span");
+    element.className = className;
+    element.textContent = text;
+    return element;
+  }
+
+  function render() {
+    const top = view.scrollTop * scale;
+    const first = Math.max(0, Math.floor(top / ROW) - OVERSCAN);
+    const last = Math.min(rows.length, Math.ceil((top + view.clientHeight) / ROW) + OVERSCAN);
+    const offset = top - view.scrollTop;
+    const fragment = document.createDocumentFragment();
+    for (let r = first; r < last; r++) {
+      const i = rows[r];
+      const row = document.createElement("div");
+      row.className = "row" + (i === matches[current] ? " current" : matched[i] ? " match" : "");
+      row.style.top = r * ROW - offset + "px";
+      row.style.paddingLeft = depth[i] * INDENT + 8 + "px";
+      row.dataset.node = i;
+      row.appendChild(span("toggle", size(i) > 1 ? (expanded[i] ? "▾" : "▸") : ""));
+      const edge = strings[nodes[4 * i + 1]];
+      if (edge) row.appendChild(span("edge", edge + ": "));
+      row.appendChild(span("title", strings[nodes[4 * i]]));
+      const lines = fields[nodes[4 * i + 2]];
+      if (lines.length) row.appendChild(span("field", "  " + lines.map((s) => strings[s]).join("  ")));
+      fragment.appendChild(row);
+    }
+    container.replaceChildren(fragment);
+  }
+
+  function update() {
+    rebuild();
+    render();
+  }
+
+  function scrollTo(node) {
+    const r = rowOf(node);
+    if (r >= 0) view.scrollTop = (r * ROW - view.clientHeight / 2) / scale;
+  }
+
+  function setSubtree(node, value) {
+    expanded.fill(value, node, node + size(node));
+  }
+
+  container.addEventListener("click", (event) => {
+    const row = event.target.closest(".row");
+    if (!row) return;
+    const i = Number(row.dataset.node);
+    if (size(i) === 1) return;
+    // Shift-click opens or closes the whole subtree.
+    if (event.shiftKey) setSubtree(i, expanded[i] ? 0 : 1);
+    else expanded[i] ^= 1;
+    update();
+  });
+
+  function find(query) {
+    matched.fill(0);
+    matches = [];
+    current = -1;
+    query = query.trim().toLowerCase();
+    if (query) {
+      // Each distinct string and set of field lines is tested once.
+      const hit = strings.map((s) => s.toLowerCase().includes(query));
+      const fieldHit = fields.map((lines) => lines.some((s) => hit[s]));
+      for (let i = 0; i < count; i++) {
+        if (hit[nodes[4 * i]] || fieldHit[nodes[4 * i + 2]]) {
+          matched[i] = 1;
+          matches.push(i);
+        }
+      }
+    }
+    step(1);
+  }
+
+  function step(direction) {
+    if (!matches.length) {
+      status.textContent = search.value.trim() ? "no matches" : "";
+      render();
+      return;
+    }
+    current = (current + direction + matches.length) % matches.length;
+    const node = matches[current];
+    for (let p = parent[node]; p >= 0; p = parent[p]) expanded[p] = 1;
+    status.textContent = current + 1 + " / " + matches.length;
+    rebuild();
+    scrollTo(node);
+    render();
+  }
+
+  let pending = 0;
+  search.addEventListener("input", () => {
+    clearTimeout(pending);
+    pending = setTimeout(() => find(search.value), 200);
+  });
+  search.addEventListener("keydown", (event) => {
+    if (event.key !== "Enter") return;
+    clearTimeout(pending);
+    if (matches.length) step(event.shiftKey ? -1 : 1);
+    else find(search.value);
+  });
+  document.getElementById("next").addEventListener("click", () => step(1));
+  document.getElementById("prev").addEventListener("click", () => step(-1));
+  document.getElementById("expand").addEventListener("click", () => {
+    expanded.fill(1);
+    update();
+  });
+  document.getElementById("collapse").addEventListener("click", () => {
+    expanded.fill(0);
+    if (count) expanded[0] = 1;
+    update();
+  });
+  view.addEventListener("scroll", render, { passive: true });
+  window.addEventListener("resize", update);
+  update();
+})();
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from types import GeneratorType
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+# Shared traversal for the IR passes. Everything here keeps its own stack, so
+# tree depth is limited by memory rather than by the interpreter's recursion
+# limit, and no Python frame is pushed per node.
+#
+# fold() dispatches on the node's exact type. A handler is either a plain
+# function, which returns the node's result directly, or a generator function.
+# A generator yields the children it wants visited and receives each child's
+# result back from the yield, so the code before the first yield runs in
+# pre-order, the code after the last yield in post-order, and anything in
+# between (e.g. the jumps of a short-circuit operator) between two children:
+#
+#     def _binary(node, instructions):
+#         left = yield node.l_exp
+#         right = yield node.r_exp
+#         return combine(left, right)
+#
+# Children are visited with the same extra arguments as their parent unless the
+# handler yields Visit(child, *args).
+
+Handler = Callable[..., Any]
+
+
+class Visit:
+    """Asks fold() to visit `node` with different extra arguments."""
+
+    __slots__ = ("node", "args")
+
+    def __init__(self, node: Any, *args: Any) -> None:
+        self.node = node
+        self.args = args
+
+
+def fold(root: Any, handlers: Dict[type, Handler], *args: Any, default: Handler | None = None) -> Any:
+    """Visits `root` with the handler registered for its type and returns its result."""
+    get = handlers.get
+    # One (generator, args) entry per node whose children are being visited.
+    stack: List[Tuple[Any, tuple]] = []
+    node = root
+    node_args = args
+
+    while True:
+        handler = get(type(node), default)
+        if handler is None:
+            raise NotImplementedError(f"No handler for {type(node).__name__}")
+        result = handler(node, *node_args)
+
+        if type(result) is GeneratorType:
+            stack.append((result, node_args))
+            value = None
+        elif stack:
+            value = result
+        else:
+            return result
+
+        # Resume the innermost pending handler until one asks for another child.
+        while True:
+            generator, generator_args = stack[-1]
+            try:
+                child = generator.send(value)
+                break
+            except StopIteration as done:
+                stack.pop()
+                if not stack:
+                    return done.value
+                value = done.value
+
+        if type(child) is Visit:
+            node, node_args = child.node, child.args
+        else:
+            node, node_args = child, generator_args
+
+
+def is_ir_node(x: Any) -> bool:
+    return isinstance(x, tuple) and hasattr(x, "_fields")
+
+
+def ir_children(node: Any) -> Iterable[Any]:
+    """Child nodes of an IR node: NamedTuple fields and list items that are not leaf values."""
+    if isinstance(node, list):
+        return [item for item in node if isinstance(item, (tuple, list))]
+    if is_ir_node(node):
+        return [value for value in node if isinstance(value, (tuple, list))]
+    return ()
+
+
+def preorder(root: Any, children: Callable[[Any], Iterable[Any]] = ir_children) -> Iterator[Any]:
+    """Yields every node before its children, children in order."""
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(list(children(node))))
+
+
+def postorder(root: Any, children: Callable[[Any], Iterable[Any]] = ir_children) -> Iterator[Any]:
+    """Yields every node after all of its children, children in order."""
+    # (node, children already pushed)
+    stack: List[Tuple[Any, bool]] = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            yield node
+            continue
+        stack.append((node, True))
+        stack.extend((child, False) for child in reversed(list(children(node))))
+
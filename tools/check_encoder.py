@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Compares objects written by the in-process encoder with `gcc -c` on the emitted assembly."""
+
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.backend.codegen import emit_assembly
+from src.backend.elf import build_elf_object
+from src.backend.encoder import encode_program
+from src.backend.tacky2asm import convert_TACKY_to_assembly
+from src.backend.target import ELF
+from src.frontend.lexer import lex
+from src.frontend.parser import parse_program
+from src.middle.tacky import convert_AST_to_TACKY
+
+DEFAULT_TESTS = PROJECT_ROOT / "writing-a-c-compiler-tests" / "tests"
+
+
+def _chapter_sources(tests: Path, chapter: int) -> list[Path]:
+    sources: list[Path] = []
+    for n in range(1, chapter + 1):
+        sources.extend(sorted((tests / f"chapter_{n}" / "valid").rglob("*.c")))
+    return sources
+
+
+def _gcc_object(assembly: str, workdir: Path) -> bytes:
+    asm_path = workdir / "expected.s"
+    obj_path = workdir / "expected.o"
+    asm_path.write_text(assembly)
+    subprocess.run(["gcc", "-c", str(asm_path), "-o", str(obj_path)], check=True, capture_output=True)
+    return obj_path.read_bytes()
+
+
+def check(source: Path, workdir: Path) -> str | None:
+    """Returns a description of the mismatch, or None when the objects are identical."""
+    asm_ir = convert_TACKY_to_assembly(convert_AST_to_TACKY(parse_program(lex(source.read_text()))))
+    try:
+        actual = build_elf_object(encode_program(asm_ir, ELF.local_label_prefix), note_gnu_stack=ELF.note_gnu_stack)
+    except NotImplementedError as exc:
+        return f"not encodable: {exc}"
+
+    expected = _gcc_object("\n".join(emit_assembly(asm_ir, ELF)) + "\n", workdir)
+    if actual == expected:
+        return None
+    if len(actual) != len(expected):
+        return f"size differs: {len(actual)} != {len(expected)} bytes"
+    first = next(i for i, (a, b) in enumerate(zip(actual, expected)) if a != b)
+    return f"first difference at byte {first:#x}"
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("files", nargs="*", type=Path, help="C sources (default: the book's valid tests)")
+    parser.add_argument("--tests", type=Path, default=DEFAULT_TESTS)
+    parser.add_argument("--chapter", type=int, default=int((PROJECT_ROOT / "CHAPTER").read_text()))
+    args = parser.parse_args(argv)
+
+    sources = args.files or _chapter_sources(args.tests, args.chapter)
+    if not sources:
+        print(f"No sources found under {args.tests}", file=sys.stderr)
+        return 2
+
+    failures = 0
+    skipped = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for source in sources:
+            try:
+                problem = check(source, Path(tmp))
+            except Exception as exc:
+                # Programs the front end cannot compile yet say nothing about the encoder.
+                skipped += 1
+                print(f"SKIP {source}: {type(exc).__name__}: {exc}")
+                continue
+            if problem is not None:
+                failures += 1
+                print(f"FAIL {source}: {problem}")
+
+    checked = len(sources) - skipped
+    print(f"{checked - failures}/{checked} objects identical to gcc -c ({skipped} skipped)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Compares the TACKY interpreter's result for each program with the exit status of the gcc-built program.
+
+Also checks that the programs --evaluate and --value-ranges produce give the same result, and
+runs the same three on REGRESSIONS, whose results gcc does not give.
+"""
+
+from __future__ import annotations
+
+import argparse
+import signal
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.frontend.lexer import lex
+from src.frontend.parser import parse_program
+from src.middle.interpreter import StepLimitExceeded, evaluate_program, run_program
+from src.middle.ranges import simplify_program
+from src.middle.tacky import convert_AST_to_TACKY, reset_counters
+
+DEFAULT_TESTS = PROJECT_ROOT / "writing-a-c-compiler-tests" / "tests"
+
+# (source, exit status) of programs that rely on int being the only type: gcc
+# reads these constants as longs, while this compiler reduces them to 32 bits.
+REGRESSIONS = [
+    ("int main(void){ return (4294967295 == -1) + 2 * (2147483648 < 0); }", 3),
+]
+
+
+def _chapter_sources(tests: Path, chapter: int) -> list[Path]:
+    sources: list[Path] = []
+    for n in range(1, chapter + 1):
+        sources.extend(sorted((tests / f"chapter_{n}" / "valid").rglob("*.c")))
+    return sources
+
+
+def _gcc_status(source: Path, workdir: Path) -> int:
+    exe = workdir / "expected"
+    subprocess.run(["gcc", str(source), "-o", str(exe)], check=True, capture_output=True)
+    return subprocess.run([str(exe)], check=False).returncode
+
+
+def _interpreted_status(prog, max_steps: int) -> int:
+    try:
+        value = run_program(prog, max_steps)
+    except ArithmeticError:
+        return -signal.SIGFPE
+    return value & 0xFF
+
+
+def _check_transforms(tacky, actual: int, max_steps: int) -> str | None:
+    folded = _interpreted_status(evaluate_program(tacky, max_steps), max_steps)
+    if folded != actual:
+        return f"evaluated program gives {folded}, original {actual}"
+    simplified = _interpreted_status(simplify_program(tacky)[0], max_steps)
+    if simplified != actual:
+        return f"program simplified for value ranges gives {simplified}, original {actual}"
+    return None
+
+
+def _to_tacky(text: str):
+    reset_counters()
+    return convert_AST_to_TACKY(parse_program(lex(text)))
+
+
+def check(source: Path, workdir: Path, max_steps: int) -> str | None:
+    """Returns a description of the mismatch, or None when the interpreter agrees with gcc."""
+    tacky = _to_tacky(source.read_text())
+    try:
+        actual = _interpreted_status(tacky, max_steps)
+    except StepLimitExceeded:
+        return f"no result within {max_steps} steps"
+    expected = _gcc_status(source, workdir)
+    if actual != expected:
+        return f"interpreter gives {actual}, gcc-built program {expected}"
+    return _check_transforms(tacky, actual, max_steps)
+
+
+def check_regression(text: str, expected: int, max_steps: int) -> str | None:
+    """Returns a description of the mismatch, or None when the interpreter gives `expected`."""
+    tacky = _to_tacky(text)
+    actual = _interpreted_status(tacky, max_steps)
+    if actual != expected:
+        return f"interpreter gives {actual}, expected {expected}"
+    return _check_transforms(tacky, actual, max_steps)
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("files", nargs="*", type=Path, help="C sources (default: the book's valid tests)")
+    parser.add_argument("--tests", type=Path, default=DEFAULT_TESTS)
+    parser.add_argument("--chapter", type=int, default=int((PROJECT_ROOT / "CHAPTER").read_text()))
+    parser.add_argument("--max-steps", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+
+    sources = args.files or _chapter_sources(args.tests, args.chapter)
+    if not sources:
+        print(f"No sources found under {args.tests}", file=sys.stderr)
+        return 2
+
+    failures = 0
+    skipped = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for source in sources:
+            try:
+                problem = check(source, Path(tmp), args.max_steps)
+            except Exception as exc:
+                # Programs the front end cannot compile yet say nothing about the interpreter.
+                skipped += 1
+                print(f"SKIP {source}: {type(exc).__name__}: {exc}")
+                continue
+            if problem is not None:
+                failures += 1
+                print(f"FAIL {source}: {problem}")
+
+    for text, expected in REGRESSIONS:
+        problem = check_regression(text, expected, args.max_steps)
+        if problem is not None:
+            failures += 1
+            print(f"FAIL {text!r}: {problem}")
+
+    checked = len(sources) + len(REGRESSIONS) - skipped
+    print(f"{checked - failures}/{checked} results identical to the gcc-built programs ({skipped} skipped)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""Searches for cheaper x86 sequences for TACKY binary operations with a constant operand.
+
+For each pattern `dst = x <op> c` (or `dst = c <op> x`), candidates start with
+a `mov` into dst and continue with up to --max-length instructions from the
+backend's vocabulary: AssemblyBinaryOp with an immediate, x or dst as source,
+AssemblyUnary, and compare + AssemblySetConditionCode. A search over test
+vectors finds the cheapest candidate that matches the pattern, pruning
+candidates that compute the same values as a cheaper one. The winner is then
+checked on every 17-bit input, every single-bit pattern and random 32-bit
+values before it is written to src/backend/rewrite_rules.py. The backend
+applies the rules when it selects instructions.
+"""
+
+from __future__ import annotations
+
+import argparse
+import pprint
+import random
+import sys
+import time
+from operator import eq
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.backend import rewrite_rules
+from src.backend.assembly_ir import AssemblyBinaryOpType, AssemblyConditionCode, AssemblyUnaryOpType
+from src.backend.tacky2asm import RULE_TABLE_VERSION
+from src.middle.interpreter import BINARY_OPS, INT_MIN, wrap32
+from src.middle.tacky_ir import TACKYBinaryOpType
+
+RULES_PATH = PROJECT_ROOT / "src" / "backend" / "rewrite_rules.py"
+INT_MAX = 2**31 - 1
+
+# What the emitted code does, per instruction, on 32-bit values.
+ASM_BINARY: Dict[AssemblyBinaryOpType, Callable[[int, int], int]] = {
+    AssemblyBinaryOpType.ADD: lambda d, s: wrap32(d + s),
+    AssemblyBinaryOpType.SUBTRACT: lambda d, s: wrap32(d - s),
+    AssemblyBinaryOpType.MULTIPLY: lambda d, s: wrap32(d * s),
+    AssemblyBinaryOpType.BITWISE_AND: lambda d, s: d & s,
+    AssemblyBinaryOpType.BITWISE_OR: lambda d, s: d | s,
+    AssemblyBinaryOpType.BITWISE_XOR: lambda d, s: d ^ s,
+    AssemblyBinaryOpType.L_SHIFT: lambda d, s: wrap32(d << (s & 31)),
+    AssemblyBinaryOpType.R_SHIFT: lambda d, s: d >> (s & 31),
+}
+ASM_UNARY: Dict[AssemblyUnaryOpType, Callable[[int], int]] = {
+    AssemblyUnaryOpType.NEGATION: lambda d: wrap32(-d),
+    AssemblyUnaryOpType.COMPLEMENT: lambda d: ~d,
+}
+# setcc after `cmp $k, dst`.
+ASM_CONDITIONS: Dict[AssemblyConditionCode, Callable[[int, int], int]] = {
+    AssemblyConditionCode.E: lambda d, k: int(d == k),
+    AssemblyConditionCode.NE: lambda d, k: int(d != k),
+    AssemblyConditionCode.G: lambda d, k: int(d > k),
+    AssemblyConditionCode.GE: lambda d, k: int(d >= k),
+    AssemblyConditionCode.L: lambda d, k: int(d < k),
+    AssemblyConditionCode.LE: lambda d, k: int(d <= k),
+}
+
+# Cost model: instructions after tacky2asm's fixup, where every pseudoregister
+# lives on the stack. Memory-to-memory forms need an extra mov through %r10,
+# imul on a memory destination goes through %r11 (two extra movs), and imul and
+# idiv are weighted by their latency.
+IMUL_COST = 3
+IDIV_COST = 26
+SETCC_COST = 3  # cmp, mov $0, setcc
+
+
+def _mov_cost(src: Any) -> int:
+    return 2 if src == "x" else 1
+
+
+def _binary_cost(op: AssemblyBinaryOpType, src: Any) -> int:
+    memory_src = src in ("x", "dst")
+    if op is AssemblyBinaryOpType.MULTIPLY:
+        return IMUL_COST + 2 + memory_src
+    return 1 + memory_src
+
+
+_ALU = {
+    TACKYBinaryOpType.ADD: AssemblyBinaryOpType.ADD,
+    TACKYBinaryOpType.SUBTRACT: AssemblyBinaryOpType.SUBTRACT,
+    TACKYBinaryOpType.MULTIPLY: AssemblyBinaryOpType.MULTIPLY,
+    TACKYBinaryOpType.BITWISE_AND: AssemblyBinaryOpType.BITWISE_AND,
+    TACKYBinaryOpType.BITWISE_OR: AssemblyBinaryOpType.BITWISE_OR,
+    TACKYBinaryOpType.BITWISE_XOR: AssemblyBinaryOpType.BITWISE_XOR,
+    TACKYBinaryOpType.L_SHIFT: AssemblyBinaryOpType.L_SHIFT,
+    TACKYBinaryOpType.R_SHIFT: AssemblyBinaryOpType.R_SHIFT,
+}
+_COMPARISONS = {
+    TACKYBinaryOpType.EQUAL,
+    TACKYBinaryOpType.NOT_EQUAL,
+    TACKYBinaryOpType.LESS_THAN,
+    TACKYBinaryOpType.LESS_THAN_OR_EQUAL,
+    TACKYBinaryOpType.GREATER_THAN,
+    TACKYBinaryOpType.GREATER_THAN_OR_EQUAL,
+}
+
+
+def lowering_cost(op: TACKYBinaryOpType, position: int) -> int | None:
+    """Cost of what tacky2asm emits for the pattern, or None if it has no valid lowering."""
+    # position is the operand that holds the constant; the other one is x, in memory.
+    if op in _ALU:
+        asm_op = _ALU[op]
+        if position == 1 and asm_op in (AssemblyBinaryOpType.L_SHIFT, AssemblyBinaryOpType.R_SHIFT):
+            return None  # A shift count in memory is not encodable.
+        src1, src2 = ("x", 0) if position == 2 else (0, "x")
+        return _mov_cost(src1) + _binary_cost(asm_op, src2)
+    if op in (TACKYBinaryOpType.DIVIDE, TACKYBinaryOpType.REMAINDER):
+        # mov s1, %eax; cdq; [mov $c, %r10;] idiv; mov %eax/%edx, dst
+        return 1 + 1 + (position == 2) + IDIV_COST + 1
+    if op in _COMPARISONS:
+        # cmp s2, s1 needs %r11 when s1 is the immediate.
+        return SETCC_COST + (position == 1)
+    return None
+
+
+Template = Tuple[Any, ...]
+
+
+def _vocabulary(immediates: List[int]) -> List[Tuple[Template, int, Callable[[int, int], int]]]:
+    """(template, cost, lane function of (dst, x)) for every instruction a candidate may append."""
+    items = []
+    for op, fn in ASM_BINARY.items():
+        if op in (AssemblyBinaryOpType.L_SHIFT, AssemblyBinaryOpType.R_SHIFT):
+            # Counts other than an immediate would have to be in %cl.
+            sources: List[Any] = [k for k in immediates if 0 <= k < 32]
+        else:
+            sources = [*immediates, "dst", "x"]
+        for src in sources:
+            if src == "x":
+                lane = lambda d, x, fn=fn: fn(d, x)
+            elif src == "dst":
+                lane = lambda d, x, fn=fn: fn(d, d)
+            else:
+                lane = lambda d, x, fn=fn, k=src: fn(d, k)
+            items.append(((op.name, src), _binary_cost(op, src), lane))
+    for op, fn in ASM_UNARY.items():
+        items.append(((op.name,), 1, lambda d, x, fn=fn: fn(d)))
+    for cc, fn in ASM_CONDITIONS.items():
+        items.append((("SET_CC", cc.name, 0), SETCC_COST, lambda d, x, fn=fn: fn(d, 0)))
+    return items
+
+
+def _immediates(constant: int) -> List[int]:
+    values = {0, 1, -1, 31, constant, wrap32(constant - 1), wrap32(-constant), ~constant}
+    if constant > 0 and constant & (constant - 1) == 0:
+        values.add(constant.bit_length() - 1)
+    return sorted(values)
+
+
+def search(
+    target: Tuple[int, ...], xs: Tuple[int, ...], immediates: List[int], max_length: int, budget: int
+) -> Tuple[int, Tuple[Template, ...]] | None:
+    """Cheapest candidate below `budget` whose values on `xs` are `target`."""
+    items = _vocabulary(immediates)
+    best: Tuple[int, Tuple[Template, ...]] | None = None
+    # Values computed so far -> cheapest (cost, templates) computing them.
+    frontier: Dict[Tuple[int, ...], Tuple[int, Tuple[Template, ...]]] = {}
+    for src in ["x", *immediates]:
+        values = xs if src == "x" else (src,) * len(xs)
+        candidate = (_mov_cost(src), (("MOV", src),))
+        if values == target:
+            if candidate[0] < (best[0] if best is not None else budget):
+                best = candidate
+        elif values not in frontier or candidate[0] < frontier[values][0]:
+            frontier[values] = candidate
+    seen = {values: cost for values, (cost, _) in frontier.items()}
+
+    for depth in range(1, max_length + 1):
+        last = depth == max_length
+        following: Dict[Tuple[int, ...], Tuple[int, Tuple[Template, ...]]] = {}
+        for values, (cost, templates) in frontier.items():
+            for template, item_cost, lane in items:
+                total = cost + item_cost
+                if total >= (best[0] if best is not None else budget):
+                    continue
+                if last:
+                    # Compared lane by lane, so most candidates fail after one or two lanes.
+                    if all(map(eq, map(lane, values, xs), target)):
+                        best = (total, templates + (template,))
+                    continue
+                result = tuple(map(lane, values, xs))
+                if result == target:
+                    best = (total, templates + (template,))
+                elif seen.get(result, budget) > total:
+                    seen[result] = total
+                    following[result] = (total, templates + (template,))
+        frontier = following
+    return best
+
+
+def run_templates(templates: Tuple[Template, ...], x: int) -> int:
+    """The value a rule leaves in dst for input x."""
+    d = 0
+    for name, *args in templates:
+        if name == "SET_CC":
+            d = ASM_CONDITIONS[AssemblyConditionCode[args[0]]](d, args[1])
+            continue
+        src = args[0] if args else None
+        value = x if src == "x" else d if src == "dst" else src
+        if name == "MOV":
+            d = value
+        elif name in AssemblyBinaryOpType.__members__:
+            d = ASM_BINARY[AssemblyBinaryOpType[name]](d, value)
+        else:
+            d = ASM_UNARY[AssemblyUnaryOpType[name]](d)
+    return d
+
+
+def verification_inputs(rng: random.Random, samples: int) -> Iterator[int]:
+    yield from range(-(2**16), 2**16)
+    for bit in range(32):
+        for value in (1 << bit, -(1 << bit), ~(1 << bit), (1 << bit) - 1):
+            yield wrap32(value)
+    for _ in range(samples):
+        yield rng.randrange(INT_MIN, INT_MAX + 1)
+
+
+def verify(templates: Tuple[Template, ...], reference: Callable[[int], int], rng: random.Random, samples: int) -> int | None:
+    """First input on which the rule differs from `reference`, or None."""
+    for x in verification_inputs(rng, samples):
+        try:
+            expected = reference(x)
+        except ArithmeticError:
+            return x
+        if run_templates(templates, x) != expected:
+            return x
+    return None
+
+
+def _search_inputs(rng: random.Random) -> Tuple[int, ...]:
+    corners = [0, 1, -1, 2, -2, 3, -3, 7, -7, 100, -100, 0x5555, INT_MIN, INT_MIN + 1, INT_MAX, INT_MAX - 1]
+    return tuple(corners + [rng.randrange(INT_MIN, INT_MAX + 1) for _ in range(8)])
+
+
+DEFAULT_CONSTANTS = [0, 1, -1, 2, 3, 4, 8, 16, 32, 64, 256, 1024, 65536, INT_MIN, INT_MAX]
+DEFAULT_OPERATORS = [op.name for op in TACKYBinaryOpType if op in _ALU or op in _COMPARISONS] + ["DIVIDE", "REMAINDER"]
+
+
+def _format_rule(key: Tuple[str, int, int], value: Tuple[int, int, Tuple[Template, ...]]) -> str:
+    op, position, constant = key
+    operands = f"x {op} {constant}" if position == 2 else f"{constant} {op} x"
+    steps = "; ".join(" ".join(str(part) for part in template) for template in value[2])
+    return f"    # {operands}: {steps} (cost {value[0]}, was {value[1]})\n    {key!r}: {pprint.pformat(value, width=200)},\n"
+
+
+def write_table(rules: Dict[Tuple[str, int, int], Tuple[int, int, Tuple[Template, ...]]], path: Path) -> None:
+    lines = [
+        "# Generated by tools/superopt.py; rerun it rather than editing by hand.\n",
+        "#\n",
+        "# (TACKY operator, position of the constant operand, constant) ->\n",
+        "#     (cost, cost of the default lowering, instruction templates)\n",
+        "#\n",
+        "# The templates compute dst from the other operand x. Each one is\n",
+        "# (\"MOV\", src), (binary operator, src), (unary operator,) or\n",
+        "# (\"SET_CC\", condition, k) for cmp $k, dst; mov $0, dst; set<cc> dst, where\n",
+        "# src is \"x\", \"dst\" or an immediate.\n",
+        "\n",
+        f"VERSION = {RULE_TABLE_VERSION}\n",
+        "\n",
+        "RULES = {\n",
+        *(_format_rule(key, rules[key]) for key in sorted(rules)),
+        "}\n",
+    ]
+    path.write_text("".join(lines))
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--operators", nargs="+", choices=DEFAULT_OPERATORS, default=DEFAULT_OPERATORS)
+    parser.add_argument("--constants", type=int, nargs="+", default=DEFAULT_CONSTANTS)
+    parser.add_argument("--max-length", type=int, default=3, help="instructions after the initial mov")
+    parser.add_argument("--samples", type=int, default=200_000, help="random inputs each winner is checked on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fresh", action="store_true", help="discard the existing table instead of extending it")
+    parser.add_argument("--dry-run", action="store_true", help="print the rules without writing the table")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    xs = _search_inputs(rng)
+    rules: Dict[Tuple[str, int, int], Tuple[int, int, Tuple[Template, ...]]] = {}
+    if not args.fresh and rewrite_rules.VERSION == RULE_TABLE_VERSION:
+        rules.update(rewrite_rules.RULES)
+
+    found = 0
+    for name in args.operators:
+        op = TACKYBinaryOpType[name]
+        fn = BINARY_OPS[op]
+        for position in (2, 1):
+            budget = lowering_cost(op, position)
+            if budget is None:
+                continue
+            for constant in args.constants:
+                constant = wrap32(constant)
+                key = (name, position, constant)
+                reference = (lambda x, c=constant: fn(x, c)) if position == 2 else (lambda x, c=constant: fn(c, x))
+                try:
+                    target = tuple(map(reference, xs))
+                except ArithmeticError:
+                    continue  # Traps for some x; only idiv reproduces that.
+                if key in rules:
+                    budget = min(budget, rules[key][0])
+                start = time.perf_counter()
+                best = search(target, xs, _immediates(constant), args.max_length, budget)
+                if best is None:
+                    continue
+                cost, templates = best
+                counterexample = verify(templates, reference, rng, args.samples)
+                elapsed = time.perf_counter() - start
+                label = f"x {name} {constant}" if position == 2 else f"{constant} {name} x"
+                if counterexample is not None:
+                    print(f"{label:<36} rejected, differs at x = {counterexample}")
+                    continue
+                found += 1
+                rules[key] = (cost, lowering_cost(op, position), templates)
+                print(f"{label:<36} cost {cost} (was {rules[key][1]}) in {elapsed:.1f}s: {templates}")
+
+    print(f"{found} new or cheaper rule(s), {len(rules)} in the table")
+    if not args.dry_run:
+        write_table(rules, RULES_PATH)
+        print(f"wrote {RULES_PATH.relative_to(PROJECT_ROOT)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))